@@ -4,10 +4,19 @@ import pytest
 
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 
 from pledges.models import Action, EnergyPledge, FoodPledge, Pledge
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Start every test with empty caches.
+    """
+    for cache in caches.all():
+        cache.clear()
+
+
 @pytest.fixture
 def action():
     """Add a test action.
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'do_nation.settings')
 
 application = get_asgi_application()
+
+if settings.PLEDGES_WARMUP:
+    from pledges.warmup import warmup_on_load
+
+    warmup_on_load()
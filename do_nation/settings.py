@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pledges.middleware.ServerTimingMiddleware',
+    'pledges.routers.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,12 +54,21 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'do_nation.urls'
 
+# Templates are compiled once and kept in memory. Set PLEDGES_TEMPLATE_RELOAD=1 while editing
+# templates to read them from disk on every render instead.
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if os.environ.get('PLEDGES_TEMPLATE_RELOAD') != '1':
+    template_loaders = [('django.template.loaders.cached.Loader', template_loaders)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, "templates")],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -70,6 +81,34 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'do_nation.wsgi.application'
 
+# Log the Server-Timing data of every request as a JSON line to the ``pledges.timing`` logger.
+PLEDGES_TIMING_LOG = os.environ.get('PLEDGES_TIMING_LOG') == '1'
+
+# Serve the home page and search with their async views, for deployments on ASGI.
+PLEDGES_ASYNC_VIEWS = os.environ.get('PLEDGES_ASYNC_VIEWS') == '1'
+
+# Queue the recalculation of the savings when an action changes, for the recompute_savings
+# command to run, instead of recalculating them during the request.
+PLEDGES_BACKGROUND_RECOMPUTE = os.environ.get('PLEDGES_BACKGROUND_RECOMPUTE') == '1'
+
+# The number of rows the pledge totals and every savings rollup are spread over, so
+# concurrent pledges update different rows. Run the compact_totals command periodically to
+# fold them together.
+PLEDGES_TOTALS_SHARDS = int(os.environ.get('PLEDGES_TOTALS_SHARDS', 8))
+PLEDGES_ROLLUP_SHARDS = int(os.environ.get('PLEDGES_ROLLUP_SHARDS', 8))
+
+# Serve the home page from a snapshot that is rendered and compressed in the background
+# PLEDGES_SNAPSHOT_DELAY seconds after the totals change. The snapshot is written to
+# PLEDGES_SNAPSHOT_DIR.
+PLEDGES_STATIC_HOME = os.environ.get('PLEDGES_STATIC_HOME') == '1'
+
+PLEDGES_SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+PLEDGES_SNAPSHOT_DELAY = float(os.environ.get('PLEDGES_SNAPSHOT_DELAY', 1))
+
+# Warm up the URLs, templates, database connections and formulas when a WSGI or ASGI worker
+# starts. /ready/ reports the worker as ready only once this is done.
+PLEDGES_WARMUP = os.environ.get('PLEDGES_WARMUP') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
@@ -81,6 +120,71 @@ DATABASES = {
     }
 }
 
+# An optional read replica for the reporting views and the export. Locally a copy of the
+# database file can stand in for it, e.g. PLEDGES_REPLICA_DB=db-replica.sqlite3.
+if os.environ.get('PLEDGES_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['PLEDGES_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['pledges.routers.ReplicaRouter']
+
+PLEDGES_REPLICA = 'replica'
+
+# How many seconds a client that made a write keeps reading from the primary.
+PLEDGES_REPLICA_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# The pages cached from the pledges are invalidated through a data version kept in the
+# PLEDGES_CACHE, so every process that changes or serves pledges must share that cache.
+# Set PLEDGES_CACHE_DIR to share a file based cache, the local memory cache is only seen by
+# the process that holds it (see the pledges.W001 check).
+if os.environ.get('PLEDGES_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['PLEDGES_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# The cache used for the home page and other data derived from the pledges.
+PLEDGES_CACHE = 'default'
+
+
+# Logging
+# https://docs.djangoproject.com/en/3.1/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'pledges.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'pledges.warmup': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -1,8 +1,158 @@
+"""Admin of the pledges.
+
+The pledges and answers tables grow to millions of rows, so their changelists select the
+related objects of a page with joins, and the forms pick users, actions and pledges with
+autocomplete or raw id widgets instead of dropdowns holding every row. Counting every row of
+an unfiltered large table is replaced with the estimate the database keeps.
+"""
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from .models import (
+    SAVINGS_FORMULAS,
+    Action,
+    Answer,
+    EnergyPledge,
+    FoodPledge,
+    Pledge,
+    RecomputeJob,
+    prefetch_answers,
+)
+
+# Unfiltered tables estimated to hold more rows than this are not counted.
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimate_count(model):
+    """Return an estimate of the number of rows of a model's table without counting them.
+
+    PostgreSQL and MySQL keep an estimate in their statistics. SQLite does not, so the
+    largest primary key is used, which is read from the end of the table's index.
+
+    :param model: The model.
+    :ptype model: class:`django.db.models.Model`.
+
+    :return: The estimated number of rows, ``None`` if it is not known.
+    :rtype: int.
+    """
+    alias = router.db_for_read(model)
+    connection = connections[alias]
+    table = model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    elif connection.vendor == "mysql":
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+    else:
+        return model._default_manager.using(alias).aggregate(last=Max("pk"))["last"]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """A paginator that estimates the number of rows of an unfiltered large table."""
+
+    @cached_property
+    def count(self):
+        """Return the estimated number of rows of a large unfiltered table, else count them."""
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return queryset.count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin of a model whose table holds too many rows to count or sort on every page."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ["-pk"]
+
+
+class PledgeChangeList(ChangeList):
+    """Changelist of the pledges that loads the answers of a page with one query."""
+
+    def get_results(self, request):
+        """Load the page and the answers of the pledges on it that have no stored savings."""
+        super().get_results(request)
+        prefetch_answers(self.result_list)
+
+
+def _saving_column(saving):
+    """Return a changelist column showing one of the savings of a pledge."""
+
+    def column(self, pledge):
+        return pledge.get_savings()[saving]
+
+    column.short_description = saving.replace("_", " ").replace("co2", "CO2").capitalize()
+    column.__name__ = saving
+    return column
+
+
+@admin.register(Pledge)
+class PledgeAdmin(LargeTableAdmin):
+    """Admin of the pledges, showing their stored savings."""
+
+    list_display = ["pk", "user", "action", "version", "created", *SAVINGS_FORMULAS]
+    list_select_related = ["user", "action", "savings"]
+    list_filter = ["action"]
+    search_fields = ["^user__username"]
+    autocomplete_fields = ["user", "action"]
+
+    co2_saving, water_saving, waste_saving = (_saving_column(s) for s in SAVINGS_FORMULAS)
+
+    def version(self, pledge):
+        """Return the version of the action of a pledge."""
+        return pledge.action.version
+
+    def get_changelist(self, request, **kwargs):
+        """Return the changelist that loads the answers of a page in bulk."""
+        return PledgeChangeList
+
+
+@admin.register(Action)
+class ActionAdmin(admin.ModelAdmin):
+    """Admin of the actions."""
+
+    list_display = ["action", "version", "co2_formula", "water_formula", "waste_formula"]
+    search_fields = ["action", "version"]
+    raw_id_fields = ["answers_pledge"]
+
+
+@admin.register(Answer)
+class AnswerAdmin(LargeTableAdmin):
+    """Admin of the answers."""
+
+    list_display = ["pledge_id", "question", "value"]
+    search_fields = ["=pledge__id"]
+    raw_id_fields = ["pledge"]
+
+
+@admin.register(FoodPledge, EnergyPledge)
+class LegacyAnswersAdmin(admin.ModelAdmin):
+    """Admin of the answers stored in the older per action tables."""
+
+    list_display = ["__str__", "pledge_id"]
+    list_select_related = ["pledge_id"]
+    raw_id_fields = ["pledge_id"]
+
 
-from .models import Action, FoodPledge, EnergyPledge, Pledge
+@admin.register(RecomputeJob)
+class RecomputeJobAdmin(admin.ModelAdmin):
+    """Admin of the background jobs recalculating the savings."""
 
-admin.site.register(Action)
-admin.site.register(FoodPledge)
-admin.site.register(EnergyPledge)
-admin.site.register(Pledge)
+    list_display = ["action", "status", "progress", "processed", "total", "updated"]
+    list_select_related = ["action"]
+    list_filter = ["status"]
+    readonly_fields = ["total", "processed", "last_pledge", "error", "created", "updated"]
+    raw_id_fields = ["action"]
@@ -0,0 +1,202 @@
+"""The questions asked when a user pledges towards an action, and the storage of the answers.
+
+Every action's questions are registered here under the model of its ``content_type``, so the
+actions of every name and version pointing to ``FoodPledge`` objects share the food
+questions. The answers are stored in the ``Answer`` table, keyed by pledge and question, so
+adding an action only needs its questions to be registered under the name of the action,
+not a new table and migration::
+
+    register("cycling", Question("days_per_week", int, choices=range(8)))
+
+Older actions keep their answers in ``FoodPledge`` and ``EnergyPledge`` objects. The answers
+of the object an action's ``content_object`` points to are copied to the ``Answer`` table
+whenever the object or the action is saved, and are shared by the pledges towards the action
+that have no answers of their own.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .cache import data_changed
+from .models import Action, Answer, EnergyPledge, FoodPledge, Pledge
+from .savings import refresh_savings
+
+
+class Question:
+    """A question of an action, answered with a number.
+
+    :param name: The name the formulas use for the answer.
+    :ptype name: str.
+    :param kind: ``int`` or ``Decimal``, the type of the answer.
+    :ptype kind: type.
+    :param choices: The allowed answers, any answer is allowed if not given.
+    :ptype choices: iterable.
+    """
+
+    __slots__ = ("name", "kind", "choices")
+
+    def __init__(self, name, kind=Decimal, choices=None):
+        self.name = name
+        self.kind = kind
+        self.choices = None if choices is None else {self.kind(str(c)) for c in choices}
+
+    def __repr__(self):
+        return f"<Question {self.name!r}>"
+
+    def to_python(self, value):
+        """Convert an answer to the type of the question.
+
+        :param value: The answer as given by the user.
+        :ptype value: str, int, float or Decimal.
+
+        :return: The converted answer.
+        :rtype: int or Decimal.
+
+        :raises django.core.exceptions.ValidationError: If the answer is not a valid choice.
+        """
+        try:
+            value = self.kind(str(value))
+        except (ValueError, InvalidOperation):
+            raise ValidationError({self.name: f"{value!r} is not a number."})
+        if self.choices is not None and value not in self.choices:
+            raise ValidationError({self.name: f"{value} is not a valid choice."})
+        return value
+
+
+_registry = {}
+
+
+def register(key, *questions):
+    """Register the questions of the actions of a model or a name.
+
+    :param key: The model the ``content_type`` of the actions points to, or the name of an
+        action without a ``content_type``, shared by all its versions.
+    :ptype key: class:`django.db.models.Model` or str.
+    :param questions: The questions of the actions.
+    :ptype questions: class:`pledges.answers.Question`.
+    """
+    _registry[key] = {question.name: question for question in questions}
+
+
+def get_questions(action):
+    """Return the questions of an action.
+
+    :param action: The action.
+    :ptype action: class:`pledges.models.Action`.
+
+    :return: The questions by name, empty if none are registered.
+    :rtype: dict.
+    """
+    if action.content_type_id is None:
+        return _registry.get(action.action, {})
+    model = ContentType.objects.get_for_id(action.content_type_id).model_class()
+    return _registry.get(model, {})
+
+
+def clean_answers(action, answers):
+    """Convert the answers to the questions of an action to the type of their question.
+
+    :param action: The action the answers are for.
+    :ptype action: class:`pledges.models.Action`.
+    :param answers: The answers by question.
+    :ptype answers: dict.
+
+    :return: The converted answers by question.
+    :rtype: dict.
+
+    :raises django.core.exceptions.ValidationError: Keyed by the invalid answers.
+    """
+    questions = get_questions(action)
+    cleaned = {}
+    errors = {}
+    for name, value in answers.items():
+        if name not in questions:
+            errors[name] = f"{action.action} has no question {name!r}."
+            continue
+        try:
+            cleaned[name] = questions[name].to_python(value)
+        except ValidationError as error:
+            errors.update(error.message_dict)
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def save_answers(pledge, answers):
+    """Validate and store the answers of a pledge and refresh its savings.
+
+    Answers should always be stored through this function, so the savings and the cached
+    data derived from them stay up to date.
+
+    :param pledge: The pledge the answers belong to.
+    :ptype pledge: class:`pledges.models.Pledge`.
+    :param answers: The answers by question.
+    :ptype answers: dict.
+
+    :raises django.core.exceptions.ValidationError: Keyed by the invalid answers.
+    """
+    answers = clean_answers(pledge.action, answers)
+    with transaction.atomic():
+        Answer.objects.replace(pledge.pk, answers)
+        refresh_answer_savings([pledge.pk])
+    data_changed()
+
+
+def refresh_answer_savings(pledge_ids):
+    """Recalculate the existing savings of every pledge that uses the answers of some pledges.
+
+    :param pledge_ids: The ids of the pledges whose answers changed.
+    :ptype pledge_ids: iterable of int.
+    """
+    pledge_ids = list(pledge_ids)
+    refresh_savings(
+        Pledge.objects.filter(Q(pk__in=pledge_ids) | Q(action__answers_pledge__in=pledge_ids)),
+        create=False,
+    )
+
+
+def sync_legacy_answers(answers, deleted=False):
+    """Copy the answers of a ``FoodPledge`` or ``EnergyPledge`` to the ``Answer`` table.
+
+    Only the answers of objects that an action's ``content_object`` points to are copied, as
+    only those are used for savings. The savings of the pledges using them are refreshed.
+
+    :param answers: The ``FoodPledge`` or ``EnergyPledge``.
+    :ptype answers: class:`django.db.models.Model`.
+    :param deleted: Whether the object was deleted, which deletes the copied answers.
+    :ptype deleted: bool.
+    """
+    actions = Action.objects.filter(
+        content_type=ContentType.objects.get_for_model(answers), object_id=answers.pk
+    )
+    if not actions.exists():
+        return
+
+    pledge_id = answers.pledge_id_id
+    with transaction.atomic():
+        if deleted:
+            Answer.objects.filter(pledge_id=pledge_id, question__in=answers.answers).delete()
+        else:
+            Answer.objects.replace(pledge_id, answers.answers)
+            actions.update(answers_pledge=pledge_id)
+        refresh_answer_savings([pledge_id])
+
+
+register(
+    FoodPledge,
+    Question("current_meals", int),
+    Question("vegetarian_meals", choices=[value for value, _ in FoodPledge.CHOICES]),
+)
+register(
+    EnergyPledge,
+    Question(
+        "energy_supplier", choices=[value for value, _ in EnergyPledge.ENERGY_SUPPLIER_CHOICES]
+    ),
+    Question("number_of_people", int),
+    Question(
+        "heating_source", choices=[value for value, _ in EnergyPledge.HEATING_SOURCE_CHOICES]
+    ),
+)
@@ -0,0 +1,138 @@
+"""Read only JSON API for the totals, the per action totals, the savings trends and the
+pledges of a user.
+
+The ``ETag`` of every endpoint is based on the data version of ``pledges.cache``, which is
+bumped whenever a pledge, action, answer or username changes, and on the latest ``updated``
+date of the ``PledgeTotals`` shards, which every change to the stored savings moves, even
+when made by a process that does not share the cache. Conditional requests from polling
+clients and caches are answered with ``304 Not Modified`` before any data is read. No
+``Last-Modified`` date is sent, as its one second resolution would hide changes made within
+the same second.
+"""
+import hashlib
+from datetime import date
+
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+from .cache import get_data_version
+from .models import SAVINGS_FORMULAS, Action, Pledge, PledgeTotals, SavingsRollup, prefetch_answers
+from .routers import use_replica
+from .views import SEARCH_PAGE_SIZE, pledge_row
+
+API_MAX_AGE = 60
+
+
+def _etag(request, *args, **kwargs):
+    """Return an ETag that changes whenever the response of the endpoint could change."""
+    updated = PledgeTotals.objects.last_updated()
+    version = f"{get_data_version()}:{updated.isoformat() if updated else ''}"
+    return hashlib.md5(f"{request.get_full_path()}:{version}".encode()).hexdigest()
+
+
+def api_view(view):
+    """Make a view read from the replica, answer conditional ``GET`` and ``HEAD`` requests
+    and allow caching.
+    """
+    view = condition(etag_func=_etag)(view)
+    view = cache_control(public=True, max_age=API_MAX_AGE)(view)
+    return require_safe(use_replica(view))
+
+
+@api_view
+def totals_api_view(request):
+    """The number of pledges and their total savings.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+
+    :return: JsonResponse object.
+    :rtype: class:`django.http.response.JsonResponse`.
+    """
+    return JsonResponse(PledgeTotals.objects.get_totals())
+
+
+@api_view
+def actions_api_view(request):
+    """The number of pledges and their total savings for every action and version.
+
+    The totals are summed from the monthly ``SavingsRollup`` rows rather than the pledges.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+
+    :return: JsonResponse object.
+    :rtype: class:`django.http.response.JsonResponse`.
+    """
+    return JsonResponse({"actions": SavingsRollup.objects.by_action()})
+
+
+@api_view
+def trends_api_view(request):
+    """The number of pledges made and their savings per day, week or month.
+
+    The ``period`` parameter is ``day``, ``week`` (the default) or ``month``. The trend can be
+    limited to the pledges towards one action with the ``action`` parameter and to the
+    periods starting on or after a date with the ``since`` parameter.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+
+    :return: JsonResponse object.
+    :rtype: class:`django.http.response.JsonResponse`.
+    """
+    period = request.GET.get("period", "week")
+    if period not in dict(SavingsRollup.PERIODS):
+        return HttpResponseBadRequest("Unknown period.")
+    try:
+        action = request.GET.get("action")
+        action = Action.objects.get(pk=int(action)) if action else None
+        since = request.GET.get("since")
+        since = date.fromisoformat(since) if since else None
+    except (ValueError, Action.DoesNotExist):
+        return HttpResponseBadRequest("Invalid action or date.")
+
+    trend = [
+        {
+            "start": row["start"].isoformat(),
+            "amount_of_pledges": row["amount_of_pledges"],
+            **{key: round(row[key], 3) for key in SAVINGS_FORMULAS},
+        }
+        for row in SavingsRollup.objects.trend(period, action=action, since=since)
+    ]
+    return JsonResponse({"period": period, "trend": trend})
+
+
+@api_view
+def user_pledges_api_view(request, username):
+    """The pledges of a user with their savings.
+
+    The pledges are paginated with a cursor: the ``after`` parameter holds the ``next``
+    value of the previous page.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+    :param username: The username of the user.
+    :ptype username: str.
+
+    :return: JsonResponse object.
+    :rtype: class:`django.http.response.JsonResponse`.
+    """
+    try:
+        after = int(request.GET.get("after", 0))
+    except ValueError:
+        after = 0
+
+    pledges = Pledge.objects.filter(user__username=username, pk__gt=after)
+    page = list(pledges.with_savings().order_by("pk")[:SEARCH_PAGE_SIZE + 1])
+    next_cursor = page[SEARCH_PAGE_SIZE - 1].pk if len(page) > SEARCH_PAGE_SIZE else None
+    page = page[:SEARCH_PAGE_SIZE]
+    prefetch_answers(page)
+
+    rows = []
+    for pledge in page:
+        row = pledge_row(pledge)
+        row["version"] = pledge.action.version
+        rows.append(row)
+    return JsonResponse({"pledges": rows, "next": next_cursor})
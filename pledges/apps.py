@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PledgesConfig(AppConfig):
     name = 'pledges'
+
+    def ready(self):
+        """Connect the signal receivers and register the system checks."""
+        from . import checks, signals, snapshot  # noqa: F401
@@ -0,0 +1,261 @@
+"""Benchmarks for the views and the formula evaluation.
+
+``seed`` fills the database with users pledging towards a food and an energy action and with
+one large account, and
+``run_benchmarks`` measures the latency and number of queries of the views as well as the
+throughput of ``Pledge.calculate_savings``. The ``benchmark`` command runs them against a
+throwaway test database for several dataset sizes and checks the results against thresholds.
+"""
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .cache import get_cache
+from .models import (
+    Action,
+    EnergyPledge,
+    FoodPledge,
+    Pledge,
+    PledgeSavings,
+    PledgeTotals,
+    SavingsRollup,
+    UserSavings,
+    load_answers,
+)
+from .savings import calculate_action_savings
+
+SEED_BATCH_SIZE = 5000
+
+SEED_DAYS = 730
+
+# The most pledges the large account gets, it gets a tenth of the seeded pledges up to this.
+LARGE_ACCOUNT_PLEDGES = 1000
+
+LARGE_ACCOUNT_USERNAME = "benchmark_large_account"
+
+
+def seed(size):
+    """Add ``size`` pledges, most of them towards a food action and an energy action.
+
+    A tenth of the pledges, up to ``LARGE_ACCOUNT_PLEDGES``, belong to a single user pledging
+    towards as many versions of the food action, so the search is measured on a large
+    account. Every other user pledges towards both actions. The pledges and their stored
+    savings are bulk created, so seeding a million pledges only takes a few hundred queries.
+    The savings of the pledges towards an action are identical, as they all share the
+    action's answers. The pledges are spread over the last two years.
+
+    :param size: The number of pledges to add.
+    :ptype size: int.
+
+    :return: The username of the large account.
+    :rtype: str.
+    """
+    with transaction.atomic():
+        actions = _seed_actions()
+        now = timezone.now()
+        savings = {action.pk: calculate_action_savings(action) for action in actions}
+
+        large_account = min(LARGE_ACCOUNT_PLEDGES, size // 10)
+        _seed_large_account(actions[0], large_account, now, savings[actions[0].pk])
+        size -= large_account
+
+        for start in range(0, (size + 1) // 2, SEED_BATCH_SIZE):
+            stop = min(start + SEED_BATCH_SIZE, (size + 1) // 2)
+            usernames = [f"benchmark_user_{index}" for index in range(start, stop)]
+            User.objects.bulk_create(
+                User(username=username, password=make_password(None)) for username in usernames
+            )
+            users = User.objects.filter(username__in=usernames).values_list("pk", flat=True)
+
+            pledges = [
+                Pledge(user_id=user, action=action, created=now - timedelta(days=user % SEED_DAYS))
+                for user in users
+                for action in actions
+            ][:size - 2 * start]
+            Pledge.objects.bulk_create(pledges)
+            created = Pledge.objects.filter(user_id__in=users).values_list("pk", "action_id")
+            PledgeSavings.objects.bulk_create(
+                PledgeSavings(pledge_id=pk, **savings[action_id]) for pk, action_id in created
+            )
+
+        PledgeTotals.objects.rebuild()
+        SavingsRollup.objects.rebuild()
+        UserSavings.objects.rebuild()
+    return LARGE_ACCOUNT_USERNAME
+
+
+def _seed_large_account(action, count, now, savings):
+    """Add a user pledging towards ``count`` copies of an action, one per version."""
+    fields = [
+        field.attname
+        for field in Action._meta.concrete_fields
+        if not field.primary_key and field.name != "version"
+    ]
+    Action.objects.bulk_create(
+        Action(**{name: getattr(action, name) for name in fields}, version=f"large {index}")
+        for index in range(count)
+    )
+    copies = Action.objects.filter(action=action.action, version__startswith="large ")
+    user = User.objects.create(username=LARGE_ACCOUNT_USERNAME, password=make_password(None))
+    Pledge.objects.bulk_create(
+        Pledge(user=user, action_id=pk, created=now - timedelta(days=index % SEED_DAYS))
+        for index, pk in enumerate(copies.values_list("pk", flat=True))
+    )
+    PledgeSavings.objects.bulk_create(
+        PledgeSavings(pledge_id=pk, **savings)
+        for pk in Pledge.objects.filter(user=user).values_list("pk", flat=True)
+    )
+
+
+def _seed_actions():
+    """Add the food and energy actions together with the answers they use.
+
+    The answers belong to a pledge of their own, which is not counted in the seeded size.
+    """
+    food_action = _action(
+        "food", "0.8 * vegetarian_meals * 0.5", "0.4 * current_meals", FoodPledge
+    )
+    energy_action = _action(
+        "energy", "energy_supplier * number_of_people * heating_source", "0", EnergyPledge
+    )
+    owner = Pledge.objects.create(
+        user=User.objects.create(username="benchmark_owner"), action=food_action
+    )
+
+    food_action.object_id = FoodPledge.objects.create(
+        question_id="food pledge",
+        pledge_id=owner,
+        current_meals=5,
+        vegetarian_meals=Decimal("3"),
+    ).pk
+    energy_action.object_id = EnergyPledge.objects.create(
+        question_id="energy pledge",
+        pledge_id=owner,
+        energy_supplier=Decimal("0.5"),
+        number_of_people=2,
+        heating_source=Decimal("3"),
+    ).pk
+    food_action.save()
+    energy_action.save()
+    return [food_action, energy_action]
+
+
+def _action(name, co2_formula, water_formula, model):
+    """Add an action whose answers are not created yet."""
+    return Action.objects.create(
+        action=name,
+        question_text=f"Benchmark {name} question",
+        co2_formula=co2_formula,
+        water_formula=water_formula,
+        waste_formula="0",
+        version="benchmark",
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=0,
+    )
+
+
+def _measure_request(client, path, repeat, clear_cache=False):
+    """Return the latency in milliseconds and the number of queries of a request.
+
+    The queries are counted on every database, as the views read from the replica if there
+    is one.
+    """
+    timings = []
+    for _ in range(repeat):
+        if clear_cache:
+            get_cache().clear()
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = [query for capture in captured for query in capture]
+        assert response.status_code == 200, f"{path} returned {response.status_code}"
+
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "queries": len(queries),
+    }
+
+
+def _measure_calculate_savings(sample):
+    """Return how many formulas ``Pledge.calculate_savings`` evaluates per second."""
+    pledges = list(Pledge.objects.select_related("action").order_by("pk")[:sample])
+    load_answers(pledges)
+    start = time.perf_counter()
+    for pledge in pledges:
+        pledge.__dict__.pop("_calculated_savings", None)
+        for formula in ("co2_formula", "water_formula", "waste_formula"):
+            pledge.calculate_savings(formula)
+    elapsed = time.perf_counter() - start
+    evaluations = len(pledges) * 3
+    return {
+        "evaluations": evaluations,
+        "per_second": round(evaluations / elapsed) if elapsed else None,
+    }
+
+
+def run_benchmarks(username, repeat=20, sample=10000):
+    """Measure the views and the formula evaluation on the current database.
+
+    :param username: The user to search for.
+    :ptype username: str.
+    :param repeat: How often each request is made.
+    :ptype repeat: int.
+    :param sample: How many pledges ``Pledge.calculate_savings`` is measured on.
+    :ptype sample: int.
+
+    :return: The results by benchmark.
+    :rtype: dict.
+    """
+    client = Client()
+    return {
+        "home_view_uncached": _measure_request(client, "/", repeat, clear_cache=True),
+        "home_view_cached": _measure_request(client, "/", repeat),
+        "search_view": _measure_request(client, f"/search/?user={username}", repeat),
+        "calculate_savings": _measure_calculate_savings(sample),
+    }
+
+
+def check_thresholds(results, thresholds):
+    """Compare benchmark results with their thresholds.
+
+    :param results: The results by dataset size, as written by the ``benchmark`` command.
+    :ptype results: dict.
+    :param thresholds: The thresholds by ``"<size>.<benchmark>.<metric>"`` or by
+        ``"*.<benchmark>.<metric>"`` for every size. Metrics named ``per_second`` are minimums,
+        all other metrics are maximums.
+    :ptype thresholds: dict.
+
+    :return: A description of every threshold that was not met.
+    :rtype: list.
+    """
+    failures = []
+    for size, benchmarks in results.items():
+        for benchmark, metrics in benchmarks.items():
+            for metric, value in metrics.items():
+                limit = thresholds.get(f"{size}.{benchmark}.{metric}")
+                if limit is None:
+                    limit = thresholds.get(f"*.{benchmark}.{metric}")
+                if limit is None or value is None:
+                    continue
+                if metric == "per_second" and value < limit:
+                    failures.append(f"{size} {benchmark} {metric}: {value} < {limit}")
+                elif metric != "per_second" and value > limit:
+                    failures.append(f"{size} {benchmark} {metric}: {value} > {limit}")
+    return failures
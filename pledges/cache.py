@@ -0,0 +1,119 @@
+"""Versioned caching of data derived from the pledges.
+
+Cached values are stored under a key that includes a data version. ``data_changed`` bumps
+the version whenever a ``Pledge``, ``Action``, ``FoodPledge`` or ``EnergyPledge`` is saved or
+deleted and in the commands that rewrite the stored savings or the aggregates built on them,
+so a change makes every cached value unreachable without having to know which keys exist.
+The stale values are left to expire.
+
+Only ``get``, ``set``, ``add`` and ``incr`` are used, so this works with every Django cache
+backend, including the local memory, file based and database backends. The cache used is
+the one named by the ``PLEDGES_CACHE`` setting, ``"default"`` by default. A version bumped by
+one process only reaches the others through a cache they share, so the local memory backend
+is only suitable for a single process, which the ``pledges.W001`` system check warns about.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import Signal
+
+VERSION_KEY = "pledges:data-version"
+HITS_KEY = "pledges:cache-hits"
+MISSES_KEY = "pledges:cache-misses"
+CACHE_TIMEOUT = 60 * 60
+
+# Sent by ``data_changed`` after the data version was bumped.
+data_version_bumped = Signal()
+
+
+def get_cache():
+    """Return the cache used for the pledges data."""
+    return caches[getattr(settings, "PLEDGES_CACHE", "default")]
+
+
+def _increment(key):
+    """Increment a counter that never expires, creating it if needed."""
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The counter starts from the current time in milliseconds so that a version which
+        # was evicted from the cache never repeats a version that was used before.
+        start = int(time.time() * 1000) if key == VERSION_KEY else 1
+        cache.add(key, start, timeout=None)
+        return cache.get(key, start)
+
+
+def get_data_version():
+    """Return the current data version.
+
+    :return: The data version.
+    :rtype: int.
+    """
+    version = get_cache().get(VERSION_KEY)
+    if version is None:
+        version = _increment(VERSION_KEY)
+    return version
+
+
+def _bump():
+    """Move to a new data version."""
+    _increment(VERSION_KEY)
+
+
+def bump_data_version():
+    """Make every value cached so far unreachable.
+
+    The version is bumped once the current transaction is committed, so a value computed
+    from the old rows by a reader running before the commit is never cached under the
+    version that follows the change. Inside a transaction it is also bumped straight away,
+    so the transaction itself does not read the values cached before the change.
+    """
+    if transaction.get_connection().in_atomic_block:
+        _bump()
+    transaction.on_commit(_bump)
+
+
+def data_changed():
+    """Record a change to the pledges, their answers or the aggregates built on them.
+
+    Bumps the data version and sends ``data_version_bumped``, whose receivers update the data
+    derived from the pledges outside the cache, e.g. the snapshot of the home page.
+    """
+    bump_data_version()
+    data_version_bumped.send(sender=data_changed)
+
+
+def cached(name, compute):
+    """Return a value from the cache, computing and storing it if it is missing.
+
+    :param name: The name of the value.
+    :ptype name: str.
+    :param compute: Called without arguments to compute the value on a cache miss.
+    :ptype compute: callable.
+
+    :return: The cached or computed value.
+    """
+    cache = get_cache()
+    key = f"pledges:{name}:{get_data_version()}"
+    value = cache.get(key)
+    if value is not None:
+        _increment(HITS_KEY)
+        return value
+
+    _increment(MISSES_KEY)
+    value = compute()
+    cache.set(key, value, CACHE_TIMEOUT)
+    return value
+
+
+def cache_stats():
+    """Return the number of cache hits and misses.
+
+    :return: A dict holding the ``hits`` and ``misses``.
+    :rtype: dict.
+    """
+    cache = get_cache()
+    return {"hits": cache.get(HITS_KEY, 0), "misses": cache.get(MISSES_KEY, 0)}
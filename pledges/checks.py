@@ -0,0 +1,32 @@
+"""System checks of the settings of the pledges app."""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Cache backends whose values, and so whose data version, are not shared between processes.
+PROCESS_LOCAL_CACHES = {"django.core.cache.backends.locmem.LocMemCache"}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when the data version is kept in a cache that is not shared by the processes.
+
+    The cached pages and the home page snapshot are only invalidated in the process whose
+    ``PLEDGES_CACHE`` holds the data version that was bumped. With a cache local to every
+    process, a change made by a management command or another worker is not seen by the
+    web workers, which keep serving what they cached for up to ``CACHE_TIMEOUT``.
+    """
+    alias = getattr(settings, "PLEDGES_CACHE", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "The PLEDGES_CACHE is not shared by the processes.",
+            hint=(
+                f"The {alias!r} cache uses {backend}, so changes made by other processes, "
+                "e.g. the management commands, are not seen by the cached pages and the "
+                "snapshot. Use e.g. the database, file based or memcached backend."
+            ),
+            id="pledges.W001",
+        )
+    ]
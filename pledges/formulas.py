@@ -0,0 +1,186 @@
+"""Compilation and caching of the savings formulas stored on an ``Action``.
+
+A formula is a whitespace separated sequence of operands and operators, for example
+``"0.8 * vegetarian_meals * 0.5"``. Operands are either numeric constants or the name
+of a question whose answer is substituted when the formula is evaluated.
+
+Formulas are evaluated from right to left, rounding every intermediate result to three
+decimal places, so ``"6 / 3 * 2"`` is ``6 / (3 * 2)``. This matches the behaviour of
+``Pledge.execute_formula``.
+
+Compiling a formula parses it once into a ``CompiledFormula``. Compiled formulas are kept
+in a process wide cache keyed by ``(action id, version, formula field)`` and are dropped
+when the ``Action`` is saved or deleted.
+"""
+import operator
+import threading
+
+from django.core.exceptions import ValidationError
+
+FORMULA_FIELDS = ("co2_formula", "water_formula", "waste_formula")
+
+OPERATORS = {
+    "*": operator.mul,
+    "/": operator.truediv,
+    "+": operator.add,
+    "-": operator.sub,
+}
+
+
+class FormulaError(ValueError):
+    """Raised when a formula cannot be compiled or evaluated."""
+
+
+class CompiledFormula:
+    """A formula parsed into its operands and operators.
+
+    ``operands`` holds a ``float`` for every constant and a ``str`` for every question name.
+    ``operators`` holds the operator functions that sit between consecutive operands.
+    """
+
+    __slots__ = ("source", "operands", "operators", "variables")
+
+    def __init__(self, source, operands, operators):
+        self.source = source
+        self.operands = tuple(operands)
+        self.operators = tuple(operators)
+        self.variables = frozenset(o for o in self.operands if isinstance(o, str))
+
+    def __repr__(self):
+        return f"<CompiledFormula {self.source!r}>"
+
+    def evaluate(self, answers):
+        """Evaluate the formula with the answers a user gave.
+
+        :param answers: A mapping of question names to answers.
+        :ptype answers: dict.
+
+        :return: The result of the formula rounded to a maximum of three decimal places.
+        :rtype: float.
+        """
+        values = [self._value(operand, answers) for operand in self.operands]
+        result = values[-1]
+        for index in range(len(self.operators) - 1, -1, -1):
+            result = round(self.operators[index](values[index], result), 3)
+        return result
+
+    @staticmethod
+    def _value(operand, answers):
+        """Return the numeric value of a single operand."""
+        if not isinstance(operand, str):
+            return operand
+        try:
+            return float(str(answers[operand]))
+        except KeyError:
+            raise FormulaError(f"No answer given for {operand!r}.")
+
+
+def _parse_operand(token):
+    """Turn a token into a ``float`` constant or a question name."""
+    try:
+        return float(token)
+    except ValueError:
+        if not token.isidentifier():
+            raise FormulaError(f"Invalid operand {token!r}.")
+        return token
+
+
+def compile_formula(source):
+    """Parse a formula into a ``CompiledFormula``.
+
+    :param source: The formula as it is stored in the database.
+    :ptype source: str.
+
+    :return: The compiled formula.
+    :rtype: class:`pledges.formulas.CompiledFormula`.
+
+    :raises FormulaError: If the formula is not a valid sequence of operands and operators.
+    """
+    tokens = source.split()
+    if len(tokens) % 2 == 0:
+        raise FormulaError(f"Incomplete formula {source!r}.")
+
+    operands = []
+    operators = []
+    for index, token in enumerate(tokens):
+        if index % 2:
+            if token not in OPERATORS:
+                raise FormulaError(f"Invalid operator {token!r}.")
+            operators.append(OPERATORS[token])
+        else:
+            operands.append(_parse_operand(token))
+
+    return CompiledFormula(source, operands, operators)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_compiled_formula(action, field, source=None):
+    """Return the compiled version of one of an action's formulas.
+
+    The compiled formula is cached for the lifetime of the process. The cached entry is
+    recompiled if the formula stored on ``action`` no longer matches the cached source, so
+    a stale entry is never used even if the invalidation signal was missed.
+
+    :param action: The action the formula belongs to.
+    :ptype action: class:`pledges.models.Action`.
+    :param field: The name of the formula field, e.g. ``"co2_formula"``.
+    :ptype field: str.
+    :param source: The formula to compile, defaults to the formula stored on ``action``.
+    :ptype source: str.
+
+    :return: The compiled formula, or ``None`` if the action has no such formula.
+    :rtype: class:`pledges.formulas.CompiledFormula` or None.
+    """
+    if source is None:
+        source = getattr(action, field, None)
+    if not source:
+        return None
+
+    key = (action.pk, action.version, field)
+    compiled = _cache.get(key)
+    if compiled is None or compiled.source != source:
+        compiled = compile_formula(source)
+        if action.pk is not None:
+            with _cache_lock:
+                _cache[key] = compiled
+    return compiled
+
+
+def invalidate(action_id):
+    """Drop every cached formula that belongs to an action.
+
+    :param action_id: The primary key of the action.
+    :ptype action_id: int.
+    """
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == action_id]:
+            del _cache[key]
+
+
+def clear_cache():
+    """Drop every cached formula."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def validate_formulas(action):
+    """Check that every formula of an action can be compiled.
+
+    :param action: The action to validate.
+    :ptype action: class:`pledges.models.Action`.
+
+    :raises django.core.exceptions.ValidationError: Keyed by the invalid formula fields.
+    """
+    errors = {}
+    for field in FORMULA_FIELDS:
+        source = getattr(action, field, None)
+        if source:
+            try:
+                compile_formula(source)
+            except FormulaError as error:
+                errors[field] = str(error)
+    if errors:
+        raise ValidationError(errors)
@@ -0,0 +1,64 @@
+"""Per request counters of the time spent on queries, savings calculations and templates.
+
+``ServerTimingMiddleware`` starts a ``RequestStats`` for every request. Code that should be
+measured wraps itself in ``timed``, which does nothing when no request is being measured.
+The stats are kept in a context variable, so they follow the request into the threads used
+by ``sync_to_async``.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+_stats = contextvars.ContextVar("pledges_request_stats", default=None)
+
+
+class RequestStats:
+    """The number of calls to, and the time spent in, each measured part of a request."""
+
+    def __init__(self):
+        self.counts = {}
+        self.durations = {}
+
+    def record(self, name, duration):
+        """Record one call that took ``duration`` seconds."""
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+
+def start():
+    """Start measuring the current request.
+
+    :return: The stats of the request and the token to pass to ``stop``.
+    :rtype: tuple.
+    """
+    stats = RequestStats()
+    return stats, _stats.set(stats)
+
+
+def stop(token):
+    """Stop measuring the current request."""
+    _stats.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Measure a block of code as a call of ``name`` if a request is being measured.
+
+    :param name: The name of the measured part, e.g. ``"savings"``.
+    :ptype name: str.
+    """
+    stats = _stats.get()
+    if stats is None:
+        yield
+        return
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.record(name, time.perf_counter() - begin)
+
+
+def time_query(execute, sql, params, many, context):
+    """A database ``execute_wrapper`` that measures every query as a call of ``"db"``."""
+    with timed("db"):
+        return execute(sql, params, many, context)
@@ -0,0 +1,225 @@
+"""Background recalculation of the stored savings after an action's formulas changed.
+
+With ``PLEDGES_BACKGROUND_RECOMPUTE`` enabled, saving an ``Action`` only queues a
+``RecomputeJob`` instead of recalculating the savings of every pledge towards it during the
+request. The ``recompute_savings`` command runs the queued jobs: the pledges of the action
+are split into chunks of consecutive ids, which a local pool of threads recalculates in
+parallel. The database is the queue, so no message broker is needed.
+
+A job records the id up to which every pledge has been recalculated after each chunk, so
+an interrupted job can be resumed from there with ``recompute_savings --resume``. While a
+job runs, a heartbeat thread refreshes its ``updated`` date every ``HEARTBEAT_INTERVAL``,
+however long its chunks take: a running job is only taken over once it has not been updated
+for ``STALE_AFTER``.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from django.db import DatabaseError, connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .cache import data_changed
+from .models import Pledge, RecomputeJob
+from .savings import refresh_savings
+
+CHUNK_SIZE = 5000
+
+# How long a running job goes without a heartbeat before its worker is presumed stopped.
+STALE_AFTER = timedelta(minutes=10)
+
+# How often the worker of a running job refreshes its ``updated`` date.
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+logger = logging.getLogger("pledges.jobs")
+
+_sqlite_write_lock = threading.Lock()
+
+
+def enqueue_recompute(action):
+    """Queue the recalculation of the savings of the pledges towards an action.
+
+    A job that is still pending already uses the current formulas when it runs, so no
+    second job is queued for the action.
+
+    :param action: The action whose formulas or answers changed.
+    :ptype action: class:`pledges.models.Action`.
+
+    :return: The pending job of the action.
+    :rtype: class:`pledges.models.RecomputeJob`.
+    """
+    job = RecomputeJob.objects.filter(action=action, status=RecomputeJob.PENDING).first()
+    if job is None:
+        job = RecomputeJob.objects.create(action=action)
+    return job
+
+
+def claim_job(resume=False, stale_after=STALE_AFTER, exclude=()):
+    """Take the oldest job that is waiting to run.
+
+    The job is claimed with a conditional update, so several workers never run the same job.
+
+    :param resume: Whether to also take jobs that failed or were left running by a stopped
+        worker. They continue after the last chunk they finished.
+    :ptype resume: bool.
+    :param stale_after: How long a running job must not have been updated for its worker to
+        be presumed stopped.
+    :ptype stale_after: class:`datetime.timedelta`.
+    :param exclude: The ids of jobs not to take, e.g. the ones that already failed.
+    :ptype exclude: iterable of int.
+
+    :return: The claimed job, or ``None`` if there is none.
+    :rtype: class:`pledges.models.RecomputeJob`.
+    """
+    waiting = Q(status=RecomputeJob.PENDING)
+    if resume:
+        waiting |= Q(status=RecomputeJob.FAILED)
+        waiting |= Q(status=RecomputeJob.RUNNING, updated__lt=timezone.now() - stale_after)
+    jobs = RecomputeJob.objects.filter(waiting).exclude(pk__in=exclude).order_by("created")
+    for job in jobs:
+        claimed = RecomputeJob.objects.filter(
+            pk=job.pk, status=job.status, updated=job.updated
+        ).update(status=RecomputeJob.RUNNING, updated=timezone.now())
+        if claimed:
+            job.status = RecomputeJob.RUNNING
+            return job
+    return None
+
+
+def _chunks(action, after, chunk_size):
+    """Yield ``(after, last)`` id bounds of the chunks of the pledges towards an action."""
+    pledges = Pledge.objects.filter(action=action).order_by("pk").values_list("pk", flat=True)
+    while True:
+        remaining = pledges.filter(pk__gt=after)
+        last = next(iter(remaining[chunk_size - 1:chunk_size]), None)
+        if last is None:
+            last = remaining.aggregate(last=Max("pk"))["last"]
+            if last is not None:
+                yield after, last
+            return
+        yield after, last
+        after = last
+
+
+def _recompute_chunk(action, after, last):
+    """Recalculate the savings of a chunk of pledges and return the number of pledges."""
+    pledges = Pledge.objects.filter(action=action, pk__gt=after, pk__lte=last)
+    refresh_savings(pledges, create=False)
+    data_changed()
+    return pledges.count()
+
+
+def _recompute_chunk_in_thread(action, after, last):
+    """Recalculate a chunk in a worker thread, closing the thread's database connection."""
+    try:
+        with _write_lock():
+            return _recompute_chunk(action, after, last)
+    finally:
+        connection.close()
+
+
+def _write_lock():
+    """Return the lock the threads of a job hold while they write.
+
+    SQLite only allows a single writer and fails transactions that would wait for another
+    one, so with SQLite the chunks and the progress are written one at a time. Other
+    databases do not need the lock.
+    """
+    return _sqlite_write_lock if connection.vendor == "sqlite" else nullcontext()
+
+
+def _run_chunks(action, chunks, workers, done):
+    """Recalculate the chunks of a job, calling ``done`` with every chunk in order."""
+    if not workers:
+        for after, last in chunks:
+            done(last, _recompute_chunk(action, after, last))
+        return
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        for after, last in chunks:
+            future = pool.submit(_recompute_chunk_in_thread, action, after, last)
+            pending.append((last, future))
+            if len(pending) >= workers * 2:
+                last_done, future = pending.popleft()
+                done(last_done, future.result())
+        while pending:
+            last_done, future = pending.popleft()
+            done(last_done, future.result())
+
+
+@contextmanager
+def _heartbeat(job):
+    """Refresh the ``updated`` date of a running job from a thread until the block exits."""
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(HEARTBEAT_INTERVAL.total_seconds()):
+                try:
+                    RecomputeJob.objects.filter(pk=job.pk, status=RecomputeJob.RUNNING).update(
+                        updated=timezone.now()
+                    )
+                except DatabaseError:
+                    logger.warning("Heartbeat of %s failed.", job, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(job, workers=4, chunk_size=CHUNK_SIZE, progress=None):
+    """Recalculate the savings of the pledges of a claimed job.
+
+    At most two chunks per worker are in flight. The job's ``last_pledge`` and ``processed``
+    are only moved past a chunk once every chunk before it is done as well.
+
+    :param job: A job returned by ``claim_job``.
+    :ptype job: class:`pledges.models.RecomputeJob`.
+    :param workers: The number of threads, ``0`` recalculates in this thread.
+    :ptype workers: int.
+    :param chunk_size: The number of pledges per chunk.
+    :ptype chunk_size: int.
+    :param progress: Called with the job after every chunk.
+    :ptype progress: callable.
+    """
+    action = job.action
+    remaining = Pledge.objects.filter(action=action, pk__gt=job.last_pledge).count()
+    job.total = job.processed + remaining
+    RecomputeJob.objects.filter(pk=job.pk).update(total=job.total, updated=timezone.now())
+
+    def done(last, count):
+        job.last_pledge = last
+        job.processed += count
+        job.updated = timezone.now()
+        with _write_lock():
+            RecomputeJob.objects.filter(pk=job.pk).update(
+                last_pledge=job.last_pledge, processed=job.processed, updated=job.updated
+            )
+        if progress:
+            progress(job)
+
+    chunks = _chunks(action, job.last_pledge, chunk_size)
+    try:
+        with _heartbeat(job):
+            _run_chunks(action, chunks, workers, done)
+    except Exception as error:
+        RecomputeJob.objects.filter(pk=job.pk).update(
+            status=RecomputeJob.FAILED, error=repr(error), updated=timezone.now()
+        )
+        job.status = RecomputeJob.FAILED
+        raise
+
+    job.status = RecomputeJob.DONE
+    RecomputeJob.objects.filter(pk=job.pk).update(status=job.status, updated=timezone.now())
+
@@ -0,0 +1,230 @@
+"""Concurrent load generation against the home page and the search.
+
+``run_load`` sends a mix of requests from a fixed number of threads, each sending its next
+request as soon as the previous one is answered, and ``summarize`` reports the throughput,
+the latency percentiles and the number of queries of the requests. The requests either go
+through Django's test client, so the WSGI application runs in this process, or over HTTP to
+a running server. The number of queries of a request is read from its ``Server-Timing``
+header, which ``ServerTimingMiddleware`` adds in both cases.
+
+The ``loadtest`` command runs it against the configured database, so configurations, e.g.
+with the cache on or off, another SQLite journal mode or the async views, can be compared
+on the same machine.
+"""
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+
+PATHS = {
+    "home": lambda username: "/",
+    "search": lambda username: f"/search/?user={quote(username)}",
+}
+
+PERCENTILES = (50, 95, 99)
+
+Sample = namedtuple("Sample", ["kind", "status", "ms", "queries"])
+
+_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+def parse_mix(value):
+    """Parse the weights of the kinds of requests, e.g. ``"home=4,search=1"``.
+
+    :param value: The weights by kind, separated by commas.
+    :ptype value: str.
+
+    :return: The weights by kind.
+    :rtype: dict.
+
+    :raises ValueError: If a kind is unknown or a weight is not a positive number.
+    """
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in PATHS:
+            raise ValueError(f"Unknown request {kind!r}, expected one of {', '.join(PATHS)}.")
+        try:
+            mix[kind] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight {weight!r} for {kind}.")
+        if mix[kind] < 0:
+            raise ValueError(f"Invalid weight {weight!r} for {kind}.")
+    if not any(mix.values()):
+        raise ValueError("At least one request needs a positive weight.")
+    return mix
+
+
+def request_paths(mix, usernames, count, seed=0):
+    """Return the kinds and paths of the requests to send, drawn from the mix.
+
+    :param mix: The weights by kind of request.
+    :ptype mix: dict.
+    :param usernames: The users to search for, in turn.
+    :ptype usernames: list.
+    :param count: The number of requests.
+    :ptype count: int.
+    :param seed: The seed of the random draw, so runs send the same requests.
+    :ptype seed: int.
+
+    :return: ``(kind, path)`` for every request.
+    :rtype: list.
+    """
+    kinds = random.Random(seed).choices(list(mix), weights=list(mix.values()), k=count)
+    return [
+        (kind, PATHS[kind](usernames[index % len(usernames)] if usernames else ""))
+        for index, kind in enumerate(kinds)
+    ]
+
+
+def server_timing_queries(header):
+    """Return the number of queries reported in a ``Server-Timing`` header, if any."""
+    match = _QUERIES.search(header or "")
+    return int(match.group(1)) if match else None
+
+
+def _allowed_host():
+    """Return a host name the ``ALLOWED_HOSTS`` setting accepts."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*":
+            return host.lstrip(".")
+    return "localhost"
+
+
+def client_transport():
+    """Return a function sending a request through the test client of the calling thread.
+
+    :return: A function of a path returning the status and the ``Server-Timing`` header.
+    :rtype: callable.
+    """
+    local = threading.local()
+
+    def get(path):
+        if not hasattr(local, "client"):
+            local.client = Client(raise_request_exception=False, SERVER_NAME=_allowed_host())
+        response = local.client.get(path)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code, response.get("Server-Timing", "")
+
+    return get
+
+
+def http_transport(base_url, timeout=60):
+    """Return a function sending a request to a running server.
+
+    :param base_url: The URL of the server, e.g. ``"http://127.0.0.1:8000"``.
+    :ptype base_url: str.
+    :param timeout: The timeout of a request in seconds.
+    :ptype timeout: float.
+
+    :return: A function of a path returning the status and the ``Server-Timing`` header.
+    :rtype: callable.
+    """
+    base_url = base_url.rstrip("/")
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+                response.read()
+                return response.status, response.headers.get("Server-Timing", "")
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get("Server-Timing", "")
+
+    return get
+
+
+def run_load(get, requests, concurrency):
+    """Send requests from a number of threads and measure every one of them.
+
+    :param get: The transport, returned by ``client_transport`` or ``http_transport``.
+    :ptype get: callable.
+    :param requests: ``(kind, path)`` for every request, as returned by ``request_paths``.
+    :ptype requests: list.
+    :param concurrency: The number of requests in flight at any time.
+    :ptype concurrency: int.
+
+    :return: A ``Sample`` for every request and the seconds the run took.
+    :rtype: tuple.
+    """
+    samples = []
+    pending = iter(requests)
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                kind, path = request
+                start = time.perf_counter()
+                try:
+                    status, timing = get(path)
+                except Exception:
+                    status, timing = None, ""
+                elapsed = (time.perf_counter() - start) * 1000
+                samples.append(Sample(kind, status, elapsed, server_timing_queries(timing)))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - begin
+
+
+def percentile(values, percent):
+    """Return the nearest rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(len(values) * percent / 100) - 1))]
+
+
+def summarize(samples, elapsed):
+    """Summarize the samples of a run, for all requests and for every kind of request.
+
+    :param samples: The samples returned by ``run_load``.
+    :ptype samples: list.
+    :param elapsed: The seconds the run took.
+    :ptype elapsed: float.
+
+    :return: By ``"all"`` and by kind, the number of ``requests`` and ``errors``, the
+        ``throughput_rps``, the latency percentiles ``p50_ms``, ``p95_ms`` and ``p99_ms`` and
+        the ``mean_queries`` and ``max_queries`` of the requests.
+    :rtype: dict.
+    """
+    groups = {"all": samples}
+    for sample in samples:
+        groups.setdefault(sample.kind, []).append(sample)
+
+    summary = {}
+    for kind, group in groups.items():
+        timings = sorted(sample.ms for sample in group)
+        queries = [sample.queries for sample in group if sample.queries is not None]
+        summary[kind] = {
+            "requests": len(group),
+            "errors": sum(1 for sample in group if sample.status != 200),
+            "throughput_rps": round(len(group) / elapsed, 1) if elapsed else None,
+            **{
+                f"p{percent}_ms": round(percentile(timings, percent), 3) if timings else None
+                for percent in PERCENTILES
+            },
+            "mean_queries": round(sum(queries) / len(queries), 2) if queries else None,
+            "max_queries": max(queries) if queries else None,
+        }
+    return summary
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from pledges.benchmarks import check_thresholds, run_benchmarks, seed
+
+
+class Command(BaseCommand):
+    """Benchmark the views and the formula evaluation on seeded datasets.
+
+    The benchmarks run in Django's test environment, with ``DEBUG`` off, against throwaway
+    test databases, which are created before and destroyed after the run, so the databases in
+    the settings are never touched. A read replica mirrors the test database, as it does in
+    the tests. The results are written as JSON and compared with the thresholds, if a
+    thresholds file is given.
+    """
+
+    help = "Benchmark the views on seeded datasets and check the results against thresholds."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1000, 100000, 1000000],
+            help="The numbers of pledges to seed.",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per view.")
+        parser.add_argument("--output", default="bench_output.json", help="The results file.")
+        parser.add_argument("--thresholds", help="A JSON file with the regression thresholds.")
+
+    def handle(self, *args, **options):
+        thresholds = {}
+        if options["thresholds"]:
+            with open(options["thresholds"]) as thresholds_file:
+                thresholds = json.load(thresholds_file)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+        try:
+            results = {}
+            for size in options["sizes"]:
+                call_command("flush", interactive=False, verbosity=0)
+                self.stdout.write(f"Seeding {size} pledges...")
+                username = seed(size)
+                results[str(size)] = run_benchmarks(username, repeat=options["repeat"])
+                self.stdout.write(json.dumps(results[str(size)], indent=2))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        with open(options["output"], "w") as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(f"Wrote the results to {options['output']}.")
+
+        failures = check_thresholds(results, thresholds)
+        if failures:
+            raise CommandError("Benchmark thresholds not met:\n" + "\n".join(failures))
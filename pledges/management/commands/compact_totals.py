@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from pledges.models import PledgeTotals, SavingsRollup
+
+
+class Command(BaseCommand):
+    """Fold the shards of the ``PledgeTotals`` and ``SavingsRollup`` rows into one row each.
+
+    Writers spread the totals over ``PLEDGES_TOTALS_SHARDS`` rows and every rollup over
+    ``PLEDGES_ROLLUP_SHARDS`` rows, which readers have to sum. Running this periodically
+    keeps the number of rows down while no pledges are written.
+    """
+
+    help = "Fold the shards of the pledge totals and savings rollups into one row each."
+
+    def handle(self, *args, **options):
+        folded = PledgeTotals.objects.compact()
+        self.stdout.write(f"Folded {folded} shards into the pledge totals.")
+        folded = SavingsRollup.objects.compact()
+        self.stdout.write(f"Folded {folded} shards into the savings rollups.")
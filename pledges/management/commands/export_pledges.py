@@ -0,0 +1,169 @@
+import csv
+import gzip
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from pledges.formulas import FormulaError, compile_formula
+from pledges.models import SAVINGS_FORMULAS, Action, Answer, Pledge
+from pledges.routers import replica
+
+COLUMNS = ["pledge_id", "username", "action", "version", *SAVINGS_FORMULAS]
+
+# The actions of the export, set in every worker process by ``_init_worker``.
+_actions = {}
+
+
+def _init_worker(actions):
+    """Compile the formulas of every action once per worker process.
+
+    :param actions: The name, version, formulas and answers of every action by action id.
+    :ptype actions: dict.
+    """
+    _actions.clear()
+    for pk, (name, version, formulas, answers) in actions.items():
+        compiled = {}
+        for saving, source in formulas.items():
+            try:
+                compiled[saving] = compile_formula(source) if source else None
+            except FormulaError:
+                compiled[saving] = None
+        _actions[pk] = (name, version, compiled, answers)
+
+
+def _serialize(answers):
+    """Return answers with their values as strings, or ``None`` if there are none."""
+    return {key: str(value) for key, value in answers.items()} if answers else None
+
+
+def _export_chunk(pledges):
+    """Calculate the savings of a chunk of pledges.
+
+    :param pledges: The ``(id, username, action id, answers)`` of every pledge in the chunk,
+        where the answers are ``None`` for pledges that use the answers of their action.
+    :ptype pledges: list.
+
+    :return: A CSV row for every pledge.
+    :rtype: list.
+    """
+    rows = []
+    for pk, username, action_id, own_answers in pledges:
+        name, version, compiled, answers = _actions[action_id]
+        if own_answers is not None:
+            answers = own_answers
+        savings = []
+        for saving in SAVINGS_FORMULAS:
+            value = None
+            if compiled[saving] and answers is not None:
+                try:
+                    value = compiled[saving].evaluate(answers)
+                except (FormulaError, ArithmeticError):
+                    pass
+            savings.append(value)
+        rows.append([pk, username, name, version, *savings])
+    return rows
+
+
+class Command(BaseCommand):
+    """Export every pledge with its user, action, version and calculated savings.
+
+    The pledges are read from the read replica, if one is configured.
+
+    The pledges are read in chunks of consecutive ids and the savings of each chunk are
+    calculated in a pool of worker processes. At most two chunks per worker are in flight and
+    the rows are written as soon as their chunk is done, in id order, so memory use does not
+    grow with the number of pledges.
+    """
+
+    help = "Export pledges with their savings as CSV, gzip compressed if the file ends in .gz."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="The file to write, '-' writes to stdout.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=10000, help="The number of ids per chunk."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="The number of worker processes, 0 calculates in this process.",
+        )
+
+    def handle(self, *args, **options):
+        with replica():
+            self.export(options)
+
+    def export(self, options):
+        """Write the export, reading the pledges from the replica if there is one."""
+        actions = self.get_actions()
+        chunks = self.read_chunks(options["chunk_size"])
+
+        if options["file"] == "-":
+            stream = sys.stdout
+        elif options["file"].endswith(".gz"):
+            stream = gzip.open(options["file"], "wt", newline="")
+        else:
+            stream = open(options["file"], "w", newline="")
+
+        try:
+            writer = csv.writer(stream)
+            writer.writerow(COLUMNS)
+            exported = 0
+            for rows in self.export_chunks(chunks, actions, options["workers"]):
+                writer.writerows(rows)
+                exported += len(rows)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        self.stderr.write(f"Exported {exported} pledges.")
+
+    def get_actions(self):
+        """Return the name, version, formulas and shared answers of every action by action id."""
+        actions = list(Action.objects.all())
+        shared = {action.answers_pledge_id for action in actions} - {None}
+        answers = Answer.objects.by_pledge(shared)
+        return {
+            action.pk: (
+                action.action,
+                action.version,
+                {saving: getattr(action, formula) for saving, formula in SAVINGS_FORMULAS.items()},
+                _serialize(answers.get(action.answers_pledge_id)),
+            )
+            for action in actions
+        }
+
+    def read_chunks(self, chunk_size):
+        """Yield the pledges in chunks of consecutive ids."""
+        bounds = Pledge.objects.aggregate(first=Min("pk"), last=Max("pk"))
+        if bounds["first"] is None:
+            return
+        for start in range(bounds["first"], bounds["last"] + 1, chunk_size):
+            pledges = Pledge.objects.filter(pk__gte=start, pk__lt=start + chunk_size)
+            chunk = list(pledges.order_by("pk").values_list("pk", "user__username", "action_id"))
+            if chunk:
+                answers = Answer.objects.by_pledge(pledges)
+                yield [
+                    (pk, username, action_id, _serialize(answers.get(pk)))
+                    for pk, username, action_id in chunk
+                ]
+
+    def export_chunks(self, chunks, actions, workers):
+        """Yield the rows of every chunk in order, calculated by the worker processes."""
+        if not workers:
+            _init_worker(actions)
+            yield from map(_export_chunk, chunks)
+            return
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(actions,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_export_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,200 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from pledges.answers import clean_answers
+from pledges.cache import data_changed
+from pledges.models import Action, Answer, Pledge
+from pledges.savings import refresh_savings
+from pledges.search import index_usernames
+
+PLEDGE_FIELDS = {"username", "action", "version", "created", "question_id", "answers"}
+
+
+class Command(BaseCommand):
+    """Import users, pledges and their answers from a JSON lines or CSV file.
+
+    Every row holds the ``username`` of the user, the ``action`` and ``version`` of the action
+    that is pledged towards and, optionally, the ISO 8601 date and time the pledge was
+    ``created`` at and the answers to the action's questions. In JSON
+    lines files the answers are either an ``answers`` object or extra keys, in CSV files they
+    are extra columns. The answers are validated against the questions registered for the
+    action in ``pledges.answers`` and stored as the pledge's ``Answer`` rows, which its
+    savings are calculated from. The ``question_id`` column older files held for the
+    ``FoodPledge`` and ``EnergyPledge`` objects is ignored.
+
+    The rows are read as a stream and imported in chunks. Each chunk is inserted with
+    ``bulk_create`` in its own transaction, so memory use is bounded by the chunk size and an
+    error only rolls back the chunk it occurs in. Existing users and pledges are reused.
+    """
+
+    help = "Import pledges from a JSON lines or CSV file, '-' reads from stdin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="The file to import.")
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="The format of the file, by default guessed from its extension.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000, help="The number of rows per transaction."
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or ("csv" if options["file"].endswith(".csv") else "jsonl")
+        self.actions = {
+            (action.action, action.version): action
+            for action in Action.objects.all()
+        }
+
+        stream = sys.stdin if options["file"] == "-" else open(options["file"], newline="")
+        try:
+            rows = self.read_rows(stream, file_format)
+            self.import_rows(rows, options["chunk_size"])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def read_rows(self, stream, file_format):
+        """Yield every row of the file as a dict."""
+        if file_format == "csv":
+            yield from csv.DictReader(stream)
+            return
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+    def import_rows(self, rows, chunk_size):
+        """Import the rows in chunks and report the progress."""
+        start = time.monotonic()
+        imported = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                self.import_chunk(chunk, imported)
+            imported += len(chunk)
+            self.report(imported, start)
+
+        data_changed()
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} rows."))
+
+    def report(self, imported, start):
+        """Write the number of rows imported so far and the import speed."""
+        elapsed = time.monotonic() - start
+        speed = imported / elapsed if elapsed else 0
+        self.stdout.write(f"{imported} rows imported, {speed:.0f} rows/sec")
+
+    def import_chunk(self, chunk, offset):
+        """Import one chunk of rows."""
+        actions = [self.get_action(row, offset + index) for index, row in enumerate(chunk, 1)]
+        users = self.get_users({row["username"] for row in chunk})
+
+        created = {}
+        for line, (row, action) in enumerate(zip(chunk, actions), offset + 1):
+            pair = (users[row["username"]].pk, action.pk)
+            created[pair] = self.get_created(row, line) or created.get(pair) or timezone.now()
+        existing = self.get_pledges(set(created))
+        Pledge.objects.bulk_create(
+            Pledge(user_id=user_id, action_id=action_id, created=created[user_id, action_id])
+            for user_id, action_id in set(created) - set(existing)
+        )
+        pledges = self.get_pledges(set(created))
+
+        answers = {}
+        for line, (row, action) in enumerate(zip(chunk, actions), offset + 1):
+            values = self.get_answers(row)
+            if not values:
+                continue
+            pledge_id = pledges[(users[row["username"]].pk, action.pk)]
+            try:
+                values = clean_answers(action, values)
+            except ValidationError as error:
+                messages = (
+                    f"{name}: {message}"
+                    for name, field_messages in error.message_dict.items()
+                    for message in field_messages
+                )
+                raise CommandError(f"Row {line}: {' '.join(messages)}")
+            answers.setdefault(pledge_id, {}).update(values)
+        Answer.objects.filter(pledge_id__in=answers).delete()
+        Answer.objects.bulk_create(
+            Answer(pledge_id=pledge_id, question=question, value=value)
+            for pledge_id, values in answers.items()
+            for question, value in values.items()
+        )
+
+        new_pledges = [pk for pair, pk in pledges.items() if pair not in existing]
+        refresh_savings(Pledge.objects.filter(pk__in=[*new_pledges, *answers]))
+
+    def get_action(self, row, line):
+        """Return the action a row pledges towards."""
+        try:
+            return self.actions[(row["action"], row["version"])]
+        except KeyError:
+            raise CommandError(
+                f"Row {line}: unknown action {row.get('action')!r} {row.get('version')!r}."
+            )
+
+    def get_created(self, row, line):
+        """Return the date and time a row's pledge was created at, if it has one."""
+        value = row.get("created")
+        if not value:
+            return None
+        try:
+            created = parse_datetime(value)
+        except ValueError:
+            created = None
+        if created is None:
+            raise CommandError(f"Row {line}: invalid created {value!r}.")
+        if timezone.is_naive(created):
+            created = timezone.make_aware(created)
+        return created
+
+    def get_answers(self, row):
+        """Return the answers given in a row."""
+        answers = dict(row.get("answers") or {})
+        answers.update(
+            (key, value)
+            for key, value in row.items()
+            if key not in PLEDGE_FIELDS and value not in (None, "")
+        )
+        return answers
+
+    def get_users(self, usernames):
+        """Return the users with the given usernames by username, creating missing ones."""
+        users = User.objects.in_bulk(usernames, field_name="username")
+        missing = usernames - set(users)
+        if missing:
+            User.objects.bulk_create(
+                User(username=username, password=make_password(None)) for username in missing
+            )
+            created = User.objects.in_bulk(missing, field_name="username")
+            index_usernames(list(created.values()))
+            users.update(created)
+        return users
+
+    def get_pledges(self, pairs):
+        """Return the ids of the existing pledges by ``(user id, action id)``."""
+        pledges = Pledge.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            action_id__in={action_id for _, action_id in pairs},
+        ).values_list("user_id", "action_id", "pk")
+        return {
+            (user_id, action_id): pk
+            for user_id, action_id, pk in pledges
+            if (user_id, action_id) in pairs
+        }
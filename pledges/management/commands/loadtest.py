@@ -0,0 +1,153 @@
+import json
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from pledges.loadtest import (
+    PERCENTILES,
+    client_transport,
+    http_transport,
+    parse_mix,
+    request_paths,
+    run_load,
+    summarize,
+)
+from pledges.models import UserSavings
+
+JOURNAL_MODES = ["delete", "truncate", "persist", "memory", "wal", "off"]
+
+
+class Command(BaseCommand):
+    """Send a concurrent mix of home page and search requests and report their latency.
+
+    By default the requests go through Django's test client, so the WSGI application runs in
+    this process against the configured database. With ``--url`` they are sent to a running
+    server instead, and ``--no-cache`` and ``--journal-mode`` have no effect on it.
+
+    The ``wal`` journal mode is stored in the database file, so the journal mode the database
+    had is restored once the requests are sent.
+    """
+
+    help = "Measure the throughput and latency of the views under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Requests to send.")
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="The number of requests in flight."
+        )
+        parser.add_argument(
+            "--mix",
+            default="home=4,search=1",
+            help="The weights of the requests, e.g. home=4,search=1.",
+        )
+        parser.add_argument(
+            "--user",
+            nargs="+",
+            dest="users",
+            default=[],
+            help="The users to search for, by default up to 100 users with pledges.",
+        )
+        parser.add_argument("--warmup", type=int, default=0, help="Unmeasured requests first.")
+        parser.add_argument("--seed", type=int, default=0, help="The seed of the request mix.")
+        parser.add_argument("--url", help="Send the requests to a running server instead.")
+        parser.add_argument(
+            "--no-cache", action="store_true", help="Compute the cached pages on every request."
+        )
+        parser.add_argument(
+            "--journal-mode", choices=JOURNAL_MODES, help="The SQLite journal mode to use."
+        )
+        parser.add_argument("--output", help="Also write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+
+        users = options["users"]
+        if not users and mix.get("search"):
+            users = list(UserSavings.objects.values_list("user__username", flat=True)[:100])
+            if not users:
+                raise CommandError("No users with pledges to search for, pass --user.")
+
+        with ExitStack() as stack:
+            if options["url"]:
+                get = http_transport(options["url"])
+            else:
+                get = client_transport()
+                if options["no_cache"]:
+                    stack.enter_context(self.without_cache())
+                if options["journal_mode"]:
+                    original = self.set_journal_mode(options["journal_mode"])
+                    stack.callback(self.restore_journal_mode, original)
+
+            if options["warmup"]:
+                run_load(get, request_paths(mix, users, options["warmup"], seed=-1), 1)
+            requests = request_paths(mix, users, options["requests"], seed=options["seed"])
+            samples, elapsed = run_load(get, requests, options["concurrency"])
+
+        summary = summarize(samples, elapsed)
+        self.report(summary, elapsed)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(summary, output, indent=2)
+            self.stdout.write(f"Wrote the results to {options['output']}.")
+
+    def without_cache(self):
+        """Return a context in which the pages are computed on every request."""
+        return override_settings(
+            CACHES={
+                **settings.CACHES,
+                "loadtest": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            },
+            PLEDGES_CACHE="loadtest",
+        )
+
+    def set_journal_mode(self, mode):
+        """Use a SQLite journal mode on this connection and every connection opened later.
+
+        :return: The journal mode every SQLite database had before, by alias.
+        :rtype: dict.
+        """
+
+        def receiver(sender, connection, **kwargs):
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute(f"PRAGMA journal_mode = {mode}")
+
+        original = {}
+        for connection in connections.all():
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    original[connection.alias] = cursor.fetchone()[0]
+                receiver(None, connection)
+        self.journal_mode_receiver = receiver
+        connection_created.connect(receiver)
+        return original
+
+    def restore_journal_mode(self, original):
+        """Stop setting the journal mode of new connections and restore the original modes."""
+        connection_created.disconnect(self.journal_mode_receiver)
+        for alias, mode in original.items():
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f"PRAGMA journal_mode = {mode}")
+
+    def report(self, summary, elapsed):
+        """Write a table of the results."""
+        columns = ["requests", "errors", "throughput_rps"]
+        columns += [f"p{percent}_ms" for percent in PERCENTILES]
+        columns += ["mean_queries", "max_queries"]
+        self.stdout.write(f"Sent {summary['all']['requests']} requests in {elapsed:.2f}s.")
+        self.stdout.write(" ".join([f"{'':<8}", *(f"{column:>14}" for column in columns)]))
+        for kind, results in summary.items():
+            values = (
+                "-" if results[column] is None else str(results[column]) for column in columns
+            )
+            self.stdout.write(" ".join([f"{kind:<8}", *(f"{value:>14}" for value in values)]))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from pledges.snapshot import publish_home, snapshot_dir
+
+
+class Command(BaseCommand):
+    """Render the home page and write it and its compressed variants to disk."""
+
+    help = "Publish the pre-rendered snapshot of the home page."
+
+    def handle(self, *args, **options):
+        manifest = publish_home()
+        encodings = ", ".join(manifest["encodings"]) or "no"
+        self.stdout.write(
+            f"Published the home page to {snapshot_dir()} with {encodings} compressed variants."
+        )
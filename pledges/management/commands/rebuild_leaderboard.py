@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from pledges.cache import data_changed
+from pledges.models import UserSavings
+
+
+class Command(BaseCommand):
+    """Rebuild the ``UserSavings`` shown on the leaderboard from the stored savings."""
+
+    help = "Rebuild the savings of every user from the stored savings of their pledges."
+
+    def handle(self, *args, **options):
+        UserSavings.objects.rebuild()
+        data_changed()
+        self.stdout.write(f"Rebuilt the savings of {UserSavings.objects.count()} users.")
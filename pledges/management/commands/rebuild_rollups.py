@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from pledges.cache import data_changed
+from pledges.models import SavingsRollup
+
+
+class Command(BaseCommand):
+    """Rebuild the daily, weekly and monthly ``SavingsRollup`` from the stored savings."""
+
+    help = "Rebuild the savings rollups from the stored savings of every pledge."
+
+    def handle(self, *args, **options):
+        SavingsRollup.objects.rebuild()
+        data_changed()
+        self.stdout.write(f"Rebuilt {SavingsRollup.objects.count()} savings rollups.")
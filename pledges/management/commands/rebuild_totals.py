@@ -0,0 +1,41 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pledges.cache import data_changed
+from pledges.models import SAVINGS_FORMULAS, Pledge, PledgeTotals
+
+
+class Command(BaseCommand):
+    """Rebuild the ``PledgeTotals`` from the stored savings of every pledge.
+
+    ``--check`` compares the totals with the same sums of the stored savings that a rebuild
+    would write, so pledges whose savings are not stored yet are not reported as drift.
+    """
+
+    help = "Rebuild the pledge totals, or check them for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the totals with the stored savings and fail if they drifted.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            PledgeTotals.objects.rebuild()
+            data_changed()
+            self.stdout.write("Rebuilt the pledge totals.")
+            return
+
+        expected = Pledge.objects.stored_savings()
+        actual = PledgeTotals.objects.get_totals()
+        drift = [
+            f"{key}: stored {actual[key]}, expected {expected[key]}"
+            for key in ["amount_of_pledges", *SAVINGS_FORMULAS]
+            if not math.isclose(actual[key], expected[key], rel_tol=1e-9, abs_tol=1e-3)
+        ]
+        if drift:
+            raise CommandError("The pledge totals drifted:\n" + "\n".join(drift))
+        self.stdout.write("The pledge totals are correct.")
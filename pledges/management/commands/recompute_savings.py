@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pledges.jobs import CHUNK_SIZE, STALE_AFTER, claim_job, enqueue_recompute, run_job
+from pledges.models import Action
+
+
+class Command(BaseCommand):
+    """Run the queued jobs recalculating the stored savings of the pledges towards an action.
+
+    Jobs are queued when an action is saved with ``PLEDGES_BACKGROUND_RECOMPUTE`` enabled, or
+    with ``--enqueue``. Every job is split into chunks of pledges that are recalculated by a
+    pool of threads, and its progress is reported after every chunk. A job that fails is
+    marked as failed and reported, and the command carries on with the other jobs; without
+    ``--poll`` it then exits with an error.
+    """
+
+    help = "Run the queued savings recalculation jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--enqueue", nargs="+", type=int, default=[], help="Queue jobs for these action ids."
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="The number of threads, 0 runs in this thread."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE, help="The number of pledges per chunk."
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Also continue jobs that failed or whose worker stopped.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=STALE_AFTER.total_seconds(),
+            help="Seconds without a heartbeat after which --resume takes over a running job.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            help="Keep waiting for new jobs, checking every POLL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        for action in Action.objects.filter(pk__in=options["enqueue"]):
+            enqueue_recompute(action)
+
+        resume = options["resume"]
+        stale_after = timedelta(seconds=options["stale_after"])
+        failed = []
+        while True:
+            job = claim_job(resume=resume, stale_after=stale_after, exclude=failed)
+            if job is None:
+                if options["poll"] is None:
+                    break
+                time.sleep(options["poll"])
+                continue
+            try:
+                run_job(job, options["workers"], options["chunk_size"], progress=self.report)
+            except Exception as error:
+                failed.append(job.pk)
+                self.stderr.write(f"Failed to recalculate the savings of {job.action}: {error!r}")
+                continue
+            self.stdout.write(self.style.SUCCESS(f"Recalculated the savings of {job.action}."))
+
+        if failed:
+            raise CommandError(f"{len(failed)} jobs failed, retry them with --resume.")
+
+    def report(self, job):
+        """Write the progress of a job."""
+        self.stdout.write(f"{job.action}: {job.processed}/{job.total} pledges ({job.progress}%)")
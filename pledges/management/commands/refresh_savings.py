@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from pledges.cache import data_changed
+from pledges.models import Action
+from pledges.savings import refresh_action_savings
+
+
+class Command(BaseCommand):
+    """Recalculate the stored savings of every pledge.
+
+    The stored savings are normally kept up to date when pledges, actions or answers are
+    saved. This command is needed for pledges that were written without triggering the model
+    signals, e.g. with ``bulk_create`` or before the savings were stored.
+    """
+
+    help = "Recalculate the stored savings of every pledge, or of the given actions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "actions", nargs="*", type=int, help="Only refresh pledges towards these action ids."
+        )
+
+    def handle(self, *args, **options):
+        actions = Action.objects.all()
+        if options["actions"]:
+            actions = actions.filter(pk__in=options["actions"])
+
+        for action in actions:
+            refresh_action_savings([action])
+            self.stdout.write(f"Refreshed savings for {action} ({action.version}).")
+        data_changed()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import instrumentation
+
+logger = logging.getLogger("pledges.timing")
+
+TIMINGS = [
+    ("db", "queries"),
+    ("savings", "savings calculations"),
+    ("template", "templates"),
+]
+
+
+def _measure_queries(sender, connection, **kwargs):
+    """Measure every query of a new connection while a request is being measured."""
+    if instrumentation.time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(instrumentation.time_query)
+
+
+class ServerTimingMiddleware:
+    """Report where a request spent its time in a ``Server-Timing`` header.
+
+    The header holds the number of queries and the time spent on them, the number of
+    ``calculate_savings`` calls and the time spent in them, the time spent rendering templates
+    and the total time of the request. If the ``PLEDGES_TIMING_LOG`` setting is enabled the
+    same data is also logged as a JSON line to the ``pledges.timing`` logger.
+
+    For streaming responses only the work done before the response is returned is measured.
+
+    Under ASGI the queries run in the threads of ``sync_to_async`` rather than the thread of
+    the request, so every connection opened from then on measures its queries, which does
+    nothing outside a measured request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Let Django see the middleware as a coroutine function, like MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            connection_created.connect(_measure_queries, dispatch_uid="pledges_server_timing")
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats, token = instrumentation.start()
+        begin = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    if instrumentation.time_query not in connection.execute_wrappers:
+                        stack.enter_context(
+                            connection.execute_wrapper(instrumentation.time_query)
+                        )
+                response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self.add_timings(request, response, stats, time.perf_counter() - begin)
+
+    async def __acall__(self, request):
+        stats, token = instrumentation.start()
+        begin = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self.add_timings(request, response, stats, time.perf_counter() - begin)
+
+    def add_timings(self, request, response, stats, total):
+        """Add the ``Server-Timing`` header to a response and log the timings if enabled."""
+        metrics = []
+        for name, description in TIMINGS:
+            count = stats.counts.get(name, 0)
+            duration = stats.durations.get(name, 0) * 1000
+            metrics.append(f'{name};dur={duration:.2f};desc="{count} {description}"')
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        response["Server-Timing"] = ", ".join(metrics)
+
+        if getattr(settings, "PLEDGES_TIMING_LOG", False):
+            logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 2),
+                **{f"{name}_count": stats.counts.get(name, 0) for name, _ in TIMINGS},
+                **{
+                    f"{name}_ms": round(stats.durations.get(name, 0) * 1000, 2)
+                    for name, _ in TIMINGS
+                },
+            }))
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.7 on 2026-10-17 01:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pledges', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PledgeSavings',
+            fields=[
+                ('pledge', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='savings', serialize=False, to='pledges.pledge')),
+                ('co2_saving', models.FloatField(null=True)),
+                ('water_saving', models.FloatField(null=True)),
+                ('waste_saving', models.FloatField(null=True)),
+            ],
+        ),
+    ]
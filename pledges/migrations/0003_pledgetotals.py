@@ -0,0 +1,41 @@
+# Generated by Django 3.1.7 on 2026-10-17 01:55
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.utils.timezone
+
+
+def build_totals(apps, schema_editor):
+    """Build the totals from the savings stored so far."""
+    PledgeSavings = apps.get_model("pledges", "PledgeSavings")
+    PledgeTotals = apps.get_model("pledges", "PledgeTotals")
+
+    savings = PledgeSavings.objects.aggregate(
+        amount_of_pledges=Count("pk"),
+        co2_saving=Sum("co2_saving"),
+        water_saving=Sum("water_saving"),
+        waste_saving=Sum("waste_saving"),
+    )
+    PledgeTotals.objects.create(pk=1, **{key: value or 0 for key, value in savings.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pledges', '0002_pledgesavings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PledgeTotals',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_of_pledges', models.IntegerField(default=0)),
+                ('co2_saving', models.FloatField(default=0)),
+                ('water_saving', models.FloatField(default=0)),
+                ('waste_saving', models.FloatField(default=0)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(build_totals, migrations.RunPython.noop),
+    ]
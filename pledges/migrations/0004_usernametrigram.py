@@ -0,0 +1,44 @@
+# Generated by Django 3.1.7 on 2026-10-17 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_usernames(apps, schema_editor):
+    """Store the trigrams of every existing username."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    UsernameTrigram = apps.get_model("pledges", "UsernameTrigram")
+
+    trigrams = []
+    for pk, username in User.objects.values_list("pk", "username").iterator():
+        padded = f"  {username.lower()} "
+        trigrams.extend(
+            UsernameTrigram(user_id=pk, trigram=trigram)
+            for trigram in {padded[index:index + 3] for index in range(len(padded) - 2)}
+        )
+    UsernameTrigram.objects.bulk_create(trigrams, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pledges', '0003_pledgetotals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsernameTrigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usernametrigram',
+            index=models.Index(fields=['trigram', 'user'], name='pledges_use_trigram_61edb3_idx'),
+        ),
+        migrations.RunPython(index_usernames, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.1.7 on 2026-10-17 02:06
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+import django.utils.timezone
+
+TOTALS = ["amount_of_pledges", "co2_saving", "water_saving", "waste_saving"]
+
+
+def build_rollups(apps, schema_editor):
+    """Build the rollups from the savings stored so far."""
+    PledgeSavings = apps.get_model("pledges", "PledgeSavings")
+    SavingsRollup = apps.get_model("pledges", "SavingsRollup")
+
+    rows = (
+        PledgeSavings.objects.annotate(action_id=F("pledge__action"), day=TruncDate("pledge__created"))
+        .values("action_id", "day")
+        .annotate(
+            amount_of_pledges=Count("pk"),
+            co2_saving=Sum("co2_saving"),
+            water_saving=Sum("water_saving"),
+            waste_saving=Sum("waste_saving"),
+        )
+        .order_by()
+    )
+    buckets = {}
+    for row in rows:
+        day = row["day"]
+        for period, start in [
+            ("day", day),
+            ("week", day - timedelta(days=day.weekday())),
+            ("month", day.replace(day=1)),
+        ]:
+            bucket = buckets.setdefault((row["action_id"], period, start), Counter())
+            bucket.update({key: row[key] or 0 for key in TOTALS})
+
+    SavingsRollup.objects.bulk_create(
+        SavingsRollup(action_id=action_id, period=period, start=start, **savings)
+        for (action_id, period, start), savings in buckets.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pledges', '0004_usernametrigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pledge',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='SavingsRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('amount_of_pledges', models.IntegerField(default=0)),
+                ('co2_saving', models.FloatField(default=0)),
+                ('water_saving', models.FloatField(default=0)),
+                ('waste_saving', models.FloatField(default=0)),
+                ('action', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pledges.action')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='savingsrollup',
+            index=models.Index(fields=['period', 'start'], name='pledges_sav_period_551eba_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='savingsrollup',
+            unique_together={('action', 'period', 'start')},
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.1.7 on 2026-10-17 02:09
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+import django.db.models.deletion
+
+
+def build_user_savings(apps, schema_editor):
+    """Build the savings of every user from the savings stored so far."""
+    PledgeSavings = apps.get_model("pledges", "PledgeSavings")
+    UserSavings = apps.get_model("pledges", "UserSavings")
+
+    rows = (
+        PledgeSavings.objects.annotate(user_id=F("pledge__user"))
+        .values("user_id")
+        .annotate(
+            amount_of_pledges=Count("pk"),
+            co2_saving=Sum("co2_saving"),
+            water_saving=Sum("water_saving"),
+            waste_saving=Sum("waste_saving"),
+        )
+        .order_by()
+    )
+    UserSavings.objects.bulk_create(
+        UserSavings(**{key: value or 0 for key, value in row.items()}) for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('pledges', '0005_savingsrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSavings',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='savings', serialize=False, to='auth.user')),
+                ('amount_of_pledges', models.IntegerField(default=0)),
+                ('co2_saving', models.FloatField(default=0)),
+                ('water_saving', models.FloatField(default=0)),
+                ('waste_saving', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usersavings',
+            index=models.Index(fields=['-co2_saving', 'user'], name='pledges_use_co2_sav_a033ec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersavings',
+            index=models.Index(fields=['-water_saving', 'user'], name='pledges_use_water_s_8e7be0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersavings',
+            index=models.Index(fields=['-waste_saving', 'user'], name='pledges_use_waste_s_99992c_idx'),
+        ),
+        migrations.RunPython(build_user_savings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.1.7 on 2026-10-17 02:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The questions answered by the fields of the models that held the answers so far.
+LEGACY_QUESTIONS = {
+    "foodpledge": ["current_meals", "vegetarian_meals"],
+    "energypledge": ["energy_supplier", "number_of_people", "heating_source"],
+}
+
+
+def copy_answers(apps, schema_editor):
+    """Copy the answers that actions point to into the ``Answer`` table."""
+    Action = apps.get_model("pledges", "Action")
+    Answer = apps.get_model("pledges", "Answer")
+
+    answers = {}
+    for action in Action.objects.select_related("content_type"):
+        questions = LEGACY_QUESTIONS.get(action.content_type.model)
+        if action.content_type.app_label != "pledges" or questions is None:
+            continue
+        model = apps.get_model("pledges", action.content_type.model)
+        legacy = model.objects.filter(pk=action.object_id).first()
+        if legacy is None:
+            continue
+        action.answers_pledge_id = legacy.pledge_id_id
+        action.save(update_fields=["answers_pledge"])
+        for question in questions:
+            answers[(legacy.pledge_id_id, question)] = getattr(legacy, question)
+
+    Answer.objects.bulk_create(
+        Answer(pledge_id=pledge_id, question=question, value=value)
+        for (pledge_id, question), value in answers.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('pledges', '0006_usersavings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='answers_pledge',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pledges.pledge'),
+        ),
+        migrations.AlterField(
+            model_name='action',
+            name='content_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AlterField(
+            model_name='action',
+            name='object_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Answer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.CharField(max_length=64)),
+                ('value', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('pledge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='pledges.pledge')),
+            ],
+            options={
+                'unique_together': {('pledge', 'question')},
+            },
+        ),
+        migrations.RunPython(copy_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.7 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pledges', '0008_recomputejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savingsrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterUniqueTogether(
+            name='savingsrollup',
+            unique_together={('action', 'period', 'start', 'shard')},
+        ),
+    ]
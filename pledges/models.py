@@ -1,13 +1,43 @@
-from django.db import models
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, FloatField, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.utils import timezone
+
+from .formulas import compile_formula, get_compiled_formula, validate_formulas
+from .instrumentation import timed
+
+SAVINGS_FORMULAS = {
+    "co2_saving": "co2_formula",
+    "water_saving": "water_formula",
+    "waste_saving": "waste_formula",
+}
+
+SAVINGS_TOTALS = ["amount_of_pledges", *SAVINGS_FORMULAS]
+
+# The number of rows the totals are spread over, unless ``PLEDGES_TOTALS_SHARDS`` is set.
+TOTALS_SHARDS = 8
+
+# The number of rows every rollup is spread over, unless ``PLEDGES_ROLLUP_SHARDS`` is set.
+ROLLUP_SHARDS = 8
 
 
 class Action(models.Model):
     """Action model.
 
     The corresponding table stores data for the available actions that can be pledged.
+
+    The questions of an action are described in ``pledges.answers``. Pledges towards the
+    action without answers of their own share the answers of the ``answers_pledge``. For
+    actions whose answers live in a ``FoodPledge`` or ``EnergyPledge`` that is the pledge of
+    the ``content_object``.
     """
 
     class Meta:
@@ -26,14 +56,189 @@ class Action(models.Model):
     water_formula = models.CharField(max_length=512, null=True)
     waste_formula = models.CharField(max_length=512, null=True)
     version = models.CharField(max_length=128)
-    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
-    object_id = models.PositiveIntegerField()
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    object_id = models.PositiveIntegerField(null=True, blank=True)
     content_object = GenericForeignKey("content_type", "object_id")
+    answers_pledge = models.ForeignKey(
+        "Pledge",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
 
     def __str__(self):
         """String representation of the model."""
         return self.action
 
+    def clean(self):
+        """Validate the formulas so that invalid ones are reported by model forms."""
+        validate_formulas(self)
+
+    def save(self, *args, **kwargs):
+        """Validate the formulas before the action is saved.
+
+        Formulas are only ever parsed when an action is saved or when they are first
+        evaluated, after which the compiled formula is served from the cache in
+        ``pledges.formulas``. The answers of the object the ``content_object`` points to are
+        copied to the ``Answer`` table by a ``post_save`` receiver, in the same transaction as
+        the action, so they are left alone when the save fails.
+
+        :raises django.core.exceptions.ValidationError: If a formula cannot be compiled.
+        """
+        validate_formulas(self)
+        if self.content_type_id is not None:
+            legacy = self.content_object
+            self.answers_pledge_id = legacy.pledge_id_id if hasattr(legacy, "answers") else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def shared_answers(self):
+        """Return the answers shared by the pledges towards this action without answers.
+
+        :return: The answers by question, or ``None`` if the action has no shared answers.
+        :rtype: dict.
+        """
+        if self.answers_pledge_id is None:
+            return None
+        return Answer.objects.by_pledge([self.answers_pledge_id]).get(self.answers_pledge_id)
+
+    def calculate_savings(self, answers=None):
+        """Calculate the savings of a single pledge towards this action.
+
+        Pledges towards an action with the same answers have the same savings, so the
+        formulas only have to be evaluated once per set of answers.
+
+        :param answers: The answers of the pledge, by default the shared answers.
+        :ptype answers: dict.
+
+        :return: The ``co2_saving``, ``water_saving`` and ``waste_saving`` of one pledge,
+            with missing formulas counting as ``0``.
+        :rtype: dict.
+        """
+        with timed("savings"):
+            if answers is None:
+                answers = self.shared_answers() or {}
+            savings = {}
+            for saving, formula in SAVINGS_FORMULAS.items():
+                compiled = get_compiled_formula(self, formula)
+                savings[saving] = (compiled.evaluate(answers) if compiled else None) or 0
+            return savings
+
+
+class PledgeQuerySet(models.QuerySet):
+    """Batch operations over many pledges."""
+
+    def delete(self):
+        """Delete the pledges, removing their savings from the aggregates in a few queries.
+
+        Deleting an action or user removes the savings of its pledges in a ``pre_delete``
+        receiver instead, see ``pledges.signals``.
+        """
+        # The savings module imports the models.
+        from .savings import remove_savings
+
+        with transaction.atomic(using=self.db):
+            remove_savings(self)
+            return super().delete()
+
+    def _sum_savings(self):
+        """Return the aggregates summing the stored savings of the pledges."""
+        aggregates = {"amount_of_pledges": Count("id")}
+        for saving in SAVINGS_FORMULAS:
+            aggregates[saving] = Coalesce(
+                Sum(f"savings__{saving}"), Value(0), output_field=FloatField()
+            )
+        return aggregates
+
+    def total_savings(self):
+        """Sum the number of pledges and their stored savings straight from the pledges.
+
+        The pages read the maintained ``PledgeTotals`` instead, this is what they are checked
+        against.
+
+        :return: A dict holding the ``amount_of_pledges`` and the ``co2_saving``,
+            ``water_saving`` and ``waste_saving`` of all the pledges.
+        :rtype: dict.
+        """
+        totals = self.order_by().aggregate(**self._sum_savings())
+        for saving in SAVINGS_FORMULAS:
+            totals[saving] = round(totals[saving], 3)
+        return totals
+
+    def stored_savings(self):
+        """Sum the stored savings of the pledges that have them, without rounding.
+
+        :return: A dict holding the ``amount_of_pledges`` with stored savings and the
+            ``co2_saving``, ``water_saving`` and ``waste_saving`` of those pledges.
+        :rtype: dict.
+        """
+        aggregates = self._sum_savings()
+        aggregates["amount_of_pledges"] = Count("savings")
+        return self.order_by().aggregate(**aggregates)
+
+    def stored_savings_by(self, *fields, **expressions):
+        """Sum the stored savings of the pledges that have them in groups, without rounding.
+
+        :param fields: The fields to group by.
+        :ptype fields: str.
+        :param expressions: The expressions to group by, by the name they are returned under.
+        :ptype expressions: dict.
+
+        :return: The groups, each holding its values, the ``amount_of_pledges`` and the
+            ``co2_saving``, ``water_saving`` and ``waste_saving``.
+        :rtype: class:`django.db.models.QuerySet`.
+        """
+        aggregates = self._sum_savings()
+        aggregates["amount_of_pledges"] = Count("savings")
+        return (
+            self.order_by()
+            .filter(savings__isnull=False)
+            .annotate(**expressions)
+            .values(*fields, *expressions)
+            .annotate(**aggregates)
+        )
+
+    def with_savings(self):
+        """Load the users, actions and stored savings of the pledges with joins.
+
+        Use ``Pledge.get_savings`` on the loaded pledges, preferably after
+        ``prefetch_answers``, to read their savings without further queries per pledge.
+
+        :return: The pledges with their related objects selected.
+        :rtype: class:`pledges.models.PledgeQuerySet`.
+        """
+        return self.select_related("user", "action", "savings")
+
+
+def load_answers(pledges):
+    """Load the answers of some pledges with a single query, whatever their actions.
+
+    Every pledge gets its own answers or, if it has none, the answers its action shares,
+    which ``Pledge.get_answers`` then returns without further queries. The answers are read
+    from the database the pledges were loaded from.
+
+    :param pledges: Pledges loaded with their actions.
+    :ptype pledges: list of class:`pledges.models.Pledge`.
+    """
+    shared = {pledge.action.answers_pledge_id for pledge in pledges} - {None}
+    pledge_ids = {pledge.pk for pledge in pledges} | shared
+    answers = Answer.objects.db_manager(pledges[0]._state.db).by_pledge(pledge_ids)
+    for pledge in pledges:
+        pledge._answers = answers.get(pledge.pk) or answers.get(pledge.action.answers_pledge_id)
+
+
+def prefetch_answers(pledges):
+    """Load the answers of the loaded pledges that have no stored savings.
+
+    :param pledges: Pledges loaded with ``PledgeQuerySet.with_savings``.
+    :ptype pledges: list of class:`pledges.models.Pledge`.
+    """
+    missing = [pledge for pledge in pledges if not hasattr(pledge, "savings")]
+    if missing:
+        load_answers(missing)
+
 
 class Pledge(models.Model):
     """Pledge model.
@@ -42,7 +247,7 @@ class Pledge(models.Model):
     The pledge table links a user to an action.
 
     The users responses to the questions for the action are available
-    through the action's ``content_object`` attribute.
+    through the ``get_answers`` method.
     """
 
     class Meta:
@@ -58,6 +263,18 @@ class Pledge(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.ForeignKey(Action, on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = PledgeQuerySet.as_manager()
+
+    def delete(self, *args, **kwargs):
+        """Delete the pledge, removing its savings from the aggregates first."""
+        # The savings module imports the models.
+        from .savings import remove_savings
+
+        with transaction.atomic():
+            remove_savings(Pledge.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
 
     def get_formula(self, formula):
         """Get the string representation of a formula as it is stored in the database.
@@ -70,11 +287,23 @@ class Pledge(models.Model):
         """
         return getattr(self.action, formula, None)
 
+    def get_answers(self):
+        """Return the answers of this pledge, or the answers its action shares if it has none.
+
+        Use ``load_answers`` to load the answers of many pledges at once.
+
+        :return: The answers by question, or ``None`` if there are none.
+        :rtype: dict.
+        """
+        if "_answers" not in self.__dict__:
+            load_answers([self])
+        return self._answers
+
     def execute_formula(self, formula):
         """Calculate the result of the formula.
 
-        This method recursively executes the formula and returns a float rounded to a maximum
-        of three decimal places.
+        The formula is executed from right to left and the result is a float rounded to a
+        maximum of three decimal places.
 
         :param formula: The formula split into a list.
         :ptype formula: list.
@@ -82,34 +311,44 @@ class Pledge(models.Model):
         :return: The result of executing the formula.
         :rtype: float.
         """
-        if len(formula) == 1:
-            return float(formula[0])
-        else:
-            if formula[1] == "*":
-                return round(float(formula[0]) * self.execute_formula(formula[2:]), 3)
-            elif formula[1] == "/":
-                return round(float(formula[0]) / self.execute_formula(formula[2:]), 3)
-            elif formula[1] == "+":
-                return round(float(formula[0]) + self.execute_formula(formula[2:]), 3)
-            elif formula[1] == "-":
-                return round(float(formula[0]) - self.execute_formula(formula[2:]), 3)
+        return compile_formula(" ".join(formula)).evaluate({})
 
     def calculate_savings(self, formula):
         """Execute the formula returned from the ``get_formula`` method.
 
+        The formula is compiled once per action and version and then evaluated with the
+        answers returned by ``get_answers``. The result is memoized on the pledge, so
+        reading a saving more than once only evaluates the formula once.
+
         :param formula: The formula returned by the ``get_formula`` method.
         :ptype formula: str.
 
         :return: The result of executing the formula.
         :rtype: float.
         """
-        formula = self.get_formula(formula)
-        if formula:
-            for question, answer in self.action.content_object.answers.items():
-                if question in formula:
-                    formula = formula.replace(question, str(answer))
+        with timed("savings"):
+            compiled = get_compiled_formula(self.action, formula, self.get_formula(formula))
+            if compiled:
+                calculated = self.__dict__.setdefault("_calculated_savings", {})
+                key = (self.action_id, compiled.source)
+                if key not in calculated:
+                    calculated[key] = compiled.evaluate(self.get_answers() or {})
+                return calculated[key]
+
+    def get_savings(self):
+        """Return the savings of this pledge.
 
-            return self.execute_formula(formula.split())
+        The stored savings are used when they exist, otherwise the savings are calculated.
+
+        :return: The ``co2_saving``, ``water_saving`` and ``waste_saving`` of this pledge,
+            with savings that cannot be calculated counting as ``0``.
+        :rtype: dict.
+        """
+        try:
+            stored = self.savings
+        except PledgeSavings.DoesNotExist:
+            return {saving: getattr(self, saving) or 0 for saving in SAVINGS_FORMULAS}
+        return {saving: getattr(stored, saving) or 0 for saving in SAVINGS_FORMULAS}
 
     @property
     def co2_saving(self):
@@ -149,6 +388,590 @@ class Pledge(models.Model):
         return self.action.version
 
 
+class AnswerQuerySet(models.QuerySet):
+    """Batch operations over many answers."""
+
+    def by_pledge(self, pledges):
+        """Return the answers of some pledges with a single query.
+
+        :param pledges: The pledges or their ids.
+        :ptype pledges: iterable or class:`pledges.models.PledgeQuerySet`.
+
+        :return: The answers by question of every pledge with answers, by pledge id.
+        :rtype: dict.
+        """
+        answers = {}
+        rows = self.filter(pledge__in=pledges).values_list("pledge_id", "question", "value")
+        for pledge_id, question, value in rows:
+            answers.setdefault(pledge_id, {})[question] = value
+        return answers
+
+    def replace(self, pledge_id, answers):
+        """Store answers of a pledge, replacing its previous answers to the same questions.
+
+        :param pledge_id: The id of the pledge.
+        :ptype pledge_id: int.
+        :param answers: The answers by question.
+        :ptype answers: dict.
+        """
+        self.filter(pledge_id=pledge_id, question__in=answers).delete()
+        self.bulk_create(
+            Answer(pledge_id=pledge_id, question=question, value=value)
+            for question, value in answers.items()
+        )
+
+
+class Answer(models.Model):
+    """The answer a user gave to one of the questions of an action when they pledged.
+
+    The corresponding table holds the answers of every action, so adding an action only
+    needs its questions to be registered in ``pledges.answers``. The answers are numbers,
+    converted to the type of their question when they are stored.
+    """
+
+    class Meta:
+        """Meta class for the ``Answer`` model.
+
+        The ``unique_together`` attribute enforces a single answer per question and pledge
+        and indexes the answers of a pledge.
+        """
+
+        unique_together = ["pledge", "question"]
+
+    pledge = models.ForeignKey(Pledge, on_delete=models.CASCADE, related_name="answers")
+    question = models.CharField(max_length=64)
+    value = models.DecimalField(max_digits=12, decimal_places=4)
+
+    objects = AnswerQuerySet.as_manager()
+
+    def __str__(self):
+        """String representation of the model."""
+        return f"{self.question}: {self.value}"
+
+
+class PledgeSavings(models.Model):
+    """The stored savings of a pledge.
+
+    The corresponding table holds the result of evaluating the action's formulas for a pledge.
+    It is kept up to date by ``pledges.savings.refresh_savings`` whenever the pledge, its action
+    or the action's answers change, so reading savings never has to evaluate a formula.
+
+    A saving is ``None`` when it cannot be calculated, e.g. because the action has no answers.
+    """
+
+    pledge = models.OneToOneField(
+        Pledge, on_delete=models.CASCADE, primary_key=True, related_name="savings"
+    )
+    co2_saving = models.FloatField(null=True)
+    water_saving = models.FloatField(null=True)
+    waste_saving = models.FloatField(null=True)
+
+    def __str__(self):
+        """String representation of the model."""
+        return f"Savings of pledge {self.pledge_id}"
+
+
+class PledgeTotalsManager(models.Manager):
+    """Manager for the ``PledgeTotals`` model."""
+
+    def shards(self):
+        """Return the number of rows the totals are spread over.
+
+        :return: The ``PLEDGES_TOTALS_SHARDS`` setting, at least ``1``.
+        :rtype: int.
+        """
+        return max(1, getattr(settings, "PLEDGES_TOTALS_SHARDS", TOTALS_SHARDS))
+
+    def contribute(self, savings, sign=1):
+        """Add the savings of some pledges to a random shard of the totals, or remove them.
+
+        :param savings: The ``amount_of_pledges`` and the savings to add, as returned by
+            ``PledgeQuerySet.stored_savings``.
+        :ptype savings: dict.
+        :param sign: ``1`` to add the pledges, ``-1`` to remove them.
+        :ptype sign: int.
+        """
+        if not savings["amount_of_pledges"]:
+            return
+        pk = random.randint(1, self.shards())
+        updates = {key: F(key) + sign * (savings[key] or 0) for key in SAVINGS_TOTALS}
+        if not self.filter(pk=pk).update(**updates, updated=timezone.now()):
+            self.get_or_create(pk=pk)
+            self.filter(pk=pk).update(**updates, updated=timezone.now())
+
+    def get_totals(self):
+        """Return the totals in the same form as ``PledgeQuerySet.total_savings``.
+
+        :return: A dict holding the ``amount_of_pledges`` and the ``co2_saving``,
+            ``water_saving`` and ``waste_saving`` of all the pledges.
+        :rtype: dict.
+        """
+        totals = self.aggregate(**{key: Sum(key) for key in SAVINGS_TOTALS})
+        if totals["amount_of_pledges"] is None:
+            return dict.fromkeys(SAVINGS_TOTALS, 0)
+        for saving in SAVINGS_FORMULAS:
+            totals[saving] = round(totals[saving], 3)
+        return totals
+
+    def last_updated(self):
+        """Return when the totals last changed, ``None`` if they never did.
+
+        :rtype: class:`datetime.datetime`.
+        """
+        return self.aggregate(updated=Max("updated"))["updated"]
+
+    def compact(self):
+        """Fold every shard into the first one and delete the shards left empty.
+
+        The values read from a shard are subtracted from it rather than the shard being
+        overwritten, so pledges written to it in the meantime are kept.
+
+        :return: The number of shards that were folded into the first one.
+        :rtype: int.
+        """
+        folded = 0
+        with transaction.atomic():
+            shards = list(self.exclude(pk=1).values("pk", "updated", *SAVINGS_TOTALS))
+            if shards:
+                self.get_or_create(pk=1, defaults={"updated": shards[0]["updated"]})
+            for shard in shards:
+                pk, updated = shard.pop("pk"), shard.pop("updated")
+                self.filter(pk=pk).update(**{key: F(key) - value for key, value in shard.items()})
+                updated = Value(updated, output_field=models.DateTimeField())
+                self.filter(pk=1).update(
+                    **{key: F(key) + value for key, value in shard.items()},
+                    updated=Greatest("updated", updated),
+                )
+                folded += 1
+            self.exclude(pk=1).filter(**dict.fromkeys(SAVINGS_TOTALS, 0)).delete()
+        return folded
+
+    def rebuild(self):
+        """Recalculate the totals from the stored savings of every pledge."""
+        savings = Pledge.objects.stored_savings()
+        with transaction.atomic():
+            self.exclude(pk=1).delete()
+            self.update_or_create(pk=1, defaults={**savings, "updated": timezone.now()})
+
+
+class PledgeTotals(models.Model):
+    """The number of pledges and their combined savings.
+
+    The corresponding table holds the totals spread over up to ``PLEDGES_TOTALS_SHARDS``
+    rows. Whenever stored savings are added, changed or removed, a random row is updated
+    incrementally, so concurrent pledges do not all wait for the lock of a single totals row,
+    and the totals are the sum of the rows. The rows are folded into one by the
+    ``compact_totals`` command and can be rebuilt with the ``rebuild_totals`` command.
+
+    The ``SavingsRollup`` rows of an action's day, week and month are sharded the same way.
+    """
+
+    amount_of_pledges = models.IntegerField(default=0)
+    co2_saving = models.FloatField(default=0)
+    water_saving = models.FloatField(default=0)
+    waste_saving = models.FloatField(default=0)
+    updated = models.DateTimeField(default=timezone.now)
+
+    objects = PledgeTotalsManager()
+
+    def __str__(self):
+        """String representation of the model."""
+        return f"Totals of {self.amount_of_pledges} pledges"
+
+
+def _add_savings(manager, summaries, sign):
+    """Add savings to the rows that summarise them, or remove them.
+
+    :param manager: The manager of the summary model.
+    :ptype manager: class:`django.db.models.Manager`.
+    :param summaries: ``(lookup, savings)`` pairs, where ``lookup`` identifies a row and
+        ``savings`` holds the ``amount_of_pledges`` and the savings to add to it. Missing
+        rows are created. When two transactions create the same row at once, the one that
+        loses adds its savings to the row of the other.
+    :ptype summaries: iterable.
+    :param sign: ``1`` to add the savings, ``-1`` to remove them.
+    :ptype sign: int.
+    """
+    for lookup, savings in summaries:
+        updates = {key: F(key) + sign * (savings[key] or 0) for key in SAVINGS_TOTALS}
+        if manager.filter(**lookup).update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                manager.create(
+                    **lookup, **{key: sign * (savings[key] or 0) for key in SAVINGS_TOTALS}
+                )
+        except IntegrityError:
+            manager.filter(**lookup).update(**updates)
+
+
+class SavingsRollupManager(models.Manager):
+    """Manager for the ``SavingsRollup`` model."""
+
+    def shards(self):
+        """Return the number of rows every rollup is spread over.
+
+        :return: The ``PLEDGES_ROLLUP_SHARDS`` setting, at least ``1``.
+        :rtype: int.
+        """
+        return max(1, getattr(settings, "PLEDGES_ROLLUP_SHARDS", ROLLUP_SHARDS))
+
+    def contribute(self, pledges, sign=1, shard=None):
+        """Add the stored savings of some pledges to a random shard of the rollups, or remove
+        them.
+
+        The savings are summed per action and day in a single grouped query, and the daily
+        sums are then combined into weekly and monthly ones. A removal can leave a shard
+        below zero, so shards are only deleted by ``compact``, and the readers skip the
+        rollups whose shards sum to no pledges.
+
+        :param pledges: The pledges to add or remove. Pledges without stored savings are
+            ignored.
+        :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+        :param sign: ``1`` to add the pledges, ``-1`` to remove them.
+        :ptype sign: int.
+        :param shard: The shard to update, a random one by default.
+        :ptype shard: int.
+        """
+        rows = pledges.stored_savings_by("action_id", day=TruncDate("created"))
+        self.contribute_rows(rows, sign, shard)
+
+    def contribute_rows(self, rows, sign=1, shard=None):
+        """Add savings that were already summed per action and day to the rollups, or remove
+        them.
+
+        :param rows: The ``action_id`` and ``day`` of every group of pledges with their
+            ``amount_of_pledges`` and savings, as returned by
+            ``PledgeQuerySet.stored_savings_by``.
+        :ptype rows: iterable of dict.
+        :param sign: ``1`` to add the pledges, ``-1`` to remove them.
+        :ptype sign: int.
+        :param shard: The shard to update, a random one by default.
+        :ptype shard: int.
+        """
+        buckets = {}
+        for row in rows:
+            for period, start in SavingsRollup.period_starts(row["day"]):
+                bucket = buckets.setdefault((row["action_id"], period, start), Counter())
+                bucket.update({key: row[key] or 0 for key in SAVINGS_TOTALS})
+
+        shard = shard or random.randint(1, self.shards())
+        _add_savings(
+            self,
+            (
+                (
+                    {"action_id": action_id, "period": period, "start": start, "shard": shard},
+                    savings,
+                )
+                for (action_id, period, start), savings in buckets.items()
+            ),
+            sign,
+        )
+
+    def compact(self):
+        """Fold the shards of every rollup into the first one and delete the empty rows.
+
+        As for ``PledgeTotalsManager.compact``, the values read from a shard are subtracted
+        from it, so pledges written to it in the meantime are kept.
+
+        :return: The number of shards that were folded into the first ones.
+        :rtype: int.
+        """
+        folded = 0
+        with transaction.atomic():
+            shards = self.exclude(shard=1).values(
+                "pk", "action_id", "period", "start", *SAVINGS_TOTALS
+            )
+            for row in list(shards):
+                pk = row.pop("pk")
+                lookup = {key: row.pop(key) for key in ("action_id", "period", "start")}
+                self.filter(pk=pk).update(**{key: F(key) - value for key, value in row.items()})
+                _add_savings(self, [({**lookup, "shard": 1}, row)], 1)
+                folded += 1
+            self.exclude(shard=1).filter(**dict.fromkeys(SAVINGS_TOTALS, 0)).delete()
+            self.filter(shard=1, amount_of_pledges=0).exclude(
+                action__in=self.exclude(shard=1).values("action")
+            ).delete()
+        return folded
+
+    def trend(self, period, action=None, since=None):
+        """Return the number of pledges made and their savings per period.
+
+        :param period: ``"day"``, ``"week"`` or ``"month"``.
+        :ptype period: str.
+        :param action: Only include pledges towards this action.
+        :ptype action: class:`pledges.models.Action`.
+        :param since: Only include periods starting on or after this date.
+        :ptype since: class:`datetime.date`.
+
+        :return: The ``start`` of every period with its ``amount_of_pledges`` and savings.
+        :rtype: class:`django.db.models.QuerySet`.
+        """
+        rollups = self.filter(period=period)
+        if action is not None:
+            rollups = rollups.filter(action=action)
+        if since is not None:
+            rollups = rollups.filter(start__gte=since)
+        return (
+            rollups.order_by("start")
+            .values("start")
+            .annotate(**{key: Sum(key) for key in SAVINGS_TOTALS})
+            .filter(amount_of_pledges__gt=0)
+        )
+
+    def by_action(self):
+        """Return the number of pledges and their savings for every action and version.
+
+        The monthly rollups are summed per action in a single grouped query, so the cost
+        grows with the number of actions and months rather than with the number of pledges.
+
+        :return: The ``action`` and ``version`` of every action with pledges, with their
+            ``amount_of_pledges`` and savings rounded to three decimal places.
+        :rtype: list.
+        """
+        rows = (
+            self.filter(period="month")
+            .order_by("action__action", "action__version", "action")
+            .values("action", action_name=F("action__action"), version=F("action__version"))
+            .annotate(**{key: Sum(key) for key in SAVINGS_TOTALS})
+            .filter(amount_of_pledges__gt=0)
+        )
+        return [
+            {
+                "action": row["action_name"],
+                "version": row["version"],
+                "amount_of_pledges": row["amount_of_pledges"],
+                **{key: round(row[key], 3) for key in SAVINGS_FORMULAS},
+            }
+            for row in rows
+        ]
+
+    def rebuild(self):
+        """Recalculate every rollup from the stored savings of the pledges."""
+        with transaction.atomic():
+            self.all().delete()
+            self.contribute(Pledge.objects.all(), shard=1)
+
+
+class SavingsRollup(models.Model):
+    """The number of pledges made towards an action and their savings during a period.
+
+    The corresponding table holds a row per action and day, week and month in which pledges
+    were made, spread over up to ``PLEDGES_ROLLUP_SHARDS`` shards like ``PledgeTotals`` so
+    concurrent pledges towards the same action rarely update the same row. The rows are
+    updated incrementally together with ``PledgeTotals``, can be compacted with the
+    ``compact_totals`` command and can be rebuilt with the ``rebuild_rollups`` command.
+    """
+
+    class Meta:
+        """Meta class for the ``SavingsRollup`` model.
+
+        The ``unique_together`` attribute enforces one row per ``action``, ``period``,
+        ``start`` and ``shard``, which also indexes the rollups of an action. The extra index
+        lets a trend over every action read the periods in order.
+        """
+
+        unique_together = ["action", "period", "start", "shard"]
+        indexes = [models.Index(fields=["period", "start"])]
+
+    PERIODS = [("day", "Day"), ("week", "Week"), ("month", "Month")]
+
+    action = models.ForeignKey(Action, on_delete=models.CASCADE)
+    period = models.CharField(max_length=5, choices=PERIODS)
+    start = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=1)
+    amount_of_pledges = models.IntegerField(default=0)
+    co2_saving = models.FloatField(default=0)
+    water_saving = models.FloatField(default=0)
+    waste_saving = models.FloatField(default=0)
+
+    objects = SavingsRollupManager()
+
+    def __str__(self):
+        """String representation of the model."""
+        return f"{self.action} {self.period} of {self.start}"
+
+    @staticmethod
+    def period_starts(day):
+        """Return the start of the day, week and month a day belongs to.
+
+        Weeks start on Monday.
+
+        :param day: The day.
+        :ptype day: class:`datetime.date`.
+
+        :return: ``(period, start)`` for every period.
+        :rtype: list.
+        """
+        return [
+            ("day", day),
+            ("week", day - timedelta(days=day.weekday())),
+            ("month", day.replace(day=1)),
+        ]
+
+
+class UserSavingsManager(models.Manager):
+    """Manager for the ``UserSavings`` model."""
+
+    def contribute(self, pledges, sign=1):
+        """Add the stored savings of some pledges to the savings of their users, or remove them.
+
+        Users left without pledges are removed from the summaries.
+
+        :param pledges: The pledges to add or remove. Pledges without stored savings are
+            ignored.
+        :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+        :param sign: ``1`` to add the pledges, ``-1`` to remove them.
+        :ptype sign: int.
+        """
+        self.contribute_rows(pledges.stored_savings_by("user_id"), sign)
+
+    def contribute_rows(self, rows, sign=1):
+        """Add savings that were already summed per user to the savings of the users, or
+        remove them.
+
+        :param rows: The ``user_id`` of every group of pledges with their
+            ``amount_of_pledges`` and savings, as returned by
+            ``PledgeQuerySet.stored_savings_by``.
+        :ptype rows: iterable of dict.
+        :param sign: ``1`` to add the pledges, ``-1`` to remove them.
+        :ptype sign: int.
+        """
+        users = {}
+        for row in rows:
+            users.setdefault(row["user_id"], Counter()).update(
+                {key: row[key] or 0 for key in SAVINGS_TOTALS}
+            )
+        _add_savings(self, (({"user_id": user_id}, row) for user_id, row in users.items()), sign)
+        if sign < 0 and users:
+            self.filter(user_id__in=users, amount_of_pledges__lte=0).delete()
+
+    def top(self, saving, limit=10):
+        """Return the users that saved the most.
+
+        :param saving: ``"co2_saving"``, ``"water_saving"`` or ``"waste_saving"``.
+        :ptype saving: str.
+        :param limit: The number of users to return.
+        :ptype limit: int.
+
+        :return: The savings of the users, with the users selected.
+        :rtype: class:`django.db.models.QuerySet`.
+        """
+        return self.select_related("user").order_by(f"-{saving}", "user")[:limit]
+
+    def rebuild(self):
+        """Recalculate the savings of every user from the stored savings of their pledges."""
+        with transaction.atomic():
+            self.all().delete()
+            self.contribute(Pledge.objects.all())
+
+
+class UserSavings(models.Model):
+    """The number of pledges of a user and their combined savings.
+
+    The corresponding table holds a row per user with stored savings, which is updated
+    incrementally together with ``PledgeTotals``. Only pledges of the same user update the
+    same row, so unlike the totals and rollups the rows are not sharded, which keeps a
+    single row per user to read from the indexes. Every saving is indexed so the users that
+    saved the most can be read straight from the index for the leaderboard. The rows can
+    be rebuilt with the ``rebuild_leaderboard`` command.
+    """
+
+    class Meta:
+        """Meta class for the ``UserSavings`` model."""
+
+        indexes = [
+            models.Index(fields=["-co2_saving", "user"]),
+            models.Index(fields=["-water_saving", "user"]),
+            models.Index(fields=["-waste_saving", "user"]),
+        ]
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="savings"
+    )
+    amount_of_pledges = models.IntegerField(default=0)
+    co2_saving = models.FloatField(default=0)
+    water_saving = models.FloatField(default=0)
+    waste_saving = models.FloatField(default=0)
+
+    objects = UserSavingsManager()
+
+    def __str__(self):
+        """String representation of the model."""
+        return f"Savings of {self.user}"
+
+
+class UsernameTrigram(models.Model):
+    """A trigram of a username.
+
+    The corresponding table is an index for the typo tolerant user search in
+    ``pledges.search``. It is kept in sync with ``auth_user`` whenever a user is saved.
+    """
+
+    class Meta:
+        """Meta class for the ``UsernameTrigram`` model.
+
+        The index on ``trigram`` and ``user`` lets the search count the trigrams a username
+        shares with the query without reading the ``auth_user`` table.
+        """
+
+        indexes = [models.Index(fields=["trigram", "user"])]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    trigram = models.CharField(max_length=3)
+
+    def __str__(self):
+        """String representation of the model."""
+        return self.trigram
+
+
+class RecomputeJob(models.Model):
+    """A background job recalculating the stored savings of the pledges towards an action.
+
+    The corresponding table is the queue of ``pledges.jobs``. A job records how far it got,
+    the pledges up to ``last_pledge`` have been recalculated, so a job that was interrupted
+    can be resumed where it stopped.
+    """
+
+    class Meta:
+        """Meta class for the ``RecomputeJob`` model.
+
+        The index on ``status`` lets the workers find the jobs to run.
+        """
+
+        indexes = [models.Index(fields=["status", "created"])]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    action = models.ForeignKey(Action, on_delete=models.CASCADE)
+    status = models.CharField(max_length=7, choices=STATUSES, default=PENDING)
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    last_pledge = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        """String representation of the model."""
+        return f"Recompute {self.action} ({self.status}, {self.progress}%)"
+
+    @property
+    def progress(self):
+        """Return the percentage of the pledges that have been recalculated.
+
+        :return: The percentage, ``100`` for a job without pledges.
+        :rtype: int.
+        """
+        if not self.total:
+            return 100 if self.status == self.DONE else 0
+        return min(100, self.processed * 100 // self.total)
+
+
 class FoodPledge(models.Model):
     """User data for a pledge that aims to replace meat based food with vegetarian based food.
 
@@ -0,0 +1,143 @@
+"""Routing of the reporting reads to a read replica.
+
+Reads are only sent to the replica inside ``use_replica``, which wraps the reporting views
+and the export. Everything else, including every write, uses the primary ``default``
+database. The replica is the database named by the ``PLEDGES_REPLICA`` setting; if it is not
+configured in ``DATABASES`` every read stays on the primary.
+
+A client that made a write is pinned to the primary for ``PLEDGES_REPLICA_LAG`` seconds by
+``PrimaryPinningMiddleware``, so it reads its own writes even while the replica lags behind.
+Within a request, reads also go to the primary once the request made a write.
+"""
+import asyncio
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PIN_COOKIE = "pledges_primary"
+REPLICATED_APPS = {"auth", "contenttypes", "pledges"}
+
+_use_replica = contextvars.ContextVar("pledges_use_replica", default=False)
+# Inside a request, a dict whose "pinned" item says whether reads must stay on the primary.
+_primary = contextvars.ContextVar("pledges_primary", default=None)
+
+
+def replica_alias():
+    """Return the alias of the replica, or ``None`` if no replica is configured."""
+    alias = getattr(settings, "PLEDGES_REPLICA", "replica")
+    return alias if alias in connections.databases else None
+
+
+@contextmanager
+def replica():
+    """Send the reads made inside the block to the replica."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def pinned_to_primary(pinned=True):
+    """Track the writes made inside the block and keep later reads on the primary.
+
+    :param pinned: Whether reads stay on the primary from the start of the block, even
+        inside ``replica``.
+    :ptype pinned: bool.
+    """
+    token = _primary.set({"pinned": pinned})
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def use_replica(view):
+    """Send the reads of a sync or async view to the replica."""
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            with replica():
+                return await view(*args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with replica():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send reads inside ``replica`` to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        primary = _primary.get()
+        if (
+            _use_replica.get()
+            and not (primary and primary["pinned"])
+            and model._meta.app_label in REPLICATED_APPS
+        ):
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        primary = _primary.get()
+        if primary is not None and model._meta.app_label in REPLICATED_APPS:
+            # Once a request writes, its later reads must see the write.
+            primary["pinned"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class PrimaryPinningMiddleware:
+    """Pin clients that made a write to the primary until the replica caught up.
+
+    Any request with an unsafe method is treated as a write. Its response sets a cookie that
+    keeps the reads of the client's requests on the primary for ``PLEDGES_REPLICA_LAG``
+    seconds.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Let Django see the middleware as a coroutine function, like MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        writes = self.writes(request)
+        with pinned_to_primary(writes or PIN_COOKIE in request.COOKIES):
+            response = self.get_response(request)
+        return self.pin(response, writes)
+
+    async def __acall__(self, request):
+        writes = self.writes(request)
+        with pinned_to_primary(writes or PIN_COOKIE in request.COOKIES):
+            response = await self.get_response(request)
+        return self.pin(response, writes)
+
+    def writes(self, request):
+        """Return whether a request is treated as a write."""
+        return request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+
+    def pin(self, response, writes):
+        """Set the pinning cookie on the response to a write."""
+        if writes:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "PLEDGES_REPLICA_LAG", 5),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,173 @@
+"""Maintenance of the stored savings in ``PledgeSavings``.
+
+The savings of a pledge only depend on its action's formulas and on its answers, or the
+answers its action shares if it has none. Refreshing therefore evaluates the formulas once
+per action and set of answers and writes the result to every affected pledge with bulk
+queries.
+
+The aggregates built on top of the stored savings, ``PledgeTotals``, ``SavingsRollup`` and
+``UserSavings``, are maintained incrementally: the stored savings of the affected pledges
+are removed from the aggregates before they are refreshed and added back afterwards.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import TruncDate
+
+from .formulas import FormulaError
+from .models import (
+    SAVINGS_FORMULAS,
+    SAVINGS_TOTALS,
+    Action,
+    Answer,
+    Pledge,
+    PledgeSavings,
+    PledgeTotals,
+    SavingsRollup,
+    UserSavings,
+)
+
+
+def calculate_action_savings(action, answers=None):
+    """Calculate the savings of one pledge towards an action.
+
+    :param action: The action the pledge is towards.
+    :ptype action: class:`pledges.models.Action`.
+    :param answers: The answers of the pledge, by default the answers the action shares.
+    :ptype answers: dict.
+
+    :return: The ``co2_saving``, ``water_saving`` and ``waste_saving`` of one pledge. The
+        savings are ``None`` if there are no answers or the formulas cannot be evaluated.
+    :rtype: dict.
+    """
+    if answers is None:
+        answers = action.shared_answers()
+    if answers is None:
+        return dict.fromkeys(SAVINGS_FORMULAS)
+    try:
+        return action.calculate_savings(answers)
+    except (FormulaError, ArithmeticError):
+        return dict.fromkeys(SAVINGS_FORMULAS)
+
+
+def contribute(pledges, sign=1):
+    """Add the stored savings of some pledges to the aggregates, or remove them.
+
+    :param pledges: The pledges to add or remove. Pledges without stored savings are ignored.
+    :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+    :param sign: ``1`` to add the pledges, ``-1`` to remove them.
+    :ptype sign: int.
+    """
+    PledgeTotals.objects.contribute(pledges.stored_savings(), sign)
+    SavingsRollup.objects.contribute(pledges, sign)
+    UserSavings.objects.contribute(pledges, sign)
+
+
+def remove_savings(pledges):
+    """Remove the stored savings of some pledges, e.g. because they are about to be deleted.
+
+    :param pledges: The pledges whose savings are removed.
+    :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+    """
+    with transaction.atomic():
+        contribute(pledges, -1)
+        PledgeSavings.objects.filter(pledge__in=pledges).delete()
+
+
+def load_contributions(pledges):
+    """Load the stored savings of some pledges as they are counted in the aggregates.
+
+    :param pledges: The pledges, e.g. one that is about to change.
+    :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+
+    :return: The savings summed per action, user and day, for ``remove_contributions``.
+    :rtype: list.
+    """
+    return list(pledges.stored_savings_by("action_id", "user_id", day=TruncDate("created")))
+
+
+def remove_contributions(pledges, rows):
+    """Remove savings loaded before the pledges changed from the aggregates.
+
+    The stored savings of the pledges are deleted as well, so ``refresh_savings`` adds them
+    to the aggregates of the changed pledges again.
+
+    :param pledges: The pledges the savings were loaded for.
+    :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+    :param rows: The savings returned by ``load_contributions``.
+    :ptype rows: list.
+    """
+    totals = Counter()
+    for row in rows:
+        totals.update({key: row[key] or 0 for key in SAVINGS_TOTALS})
+    with transaction.atomic():
+        PledgeTotals.objects.contribute({key: totals[key] for key in SAVINGS_TOTALS}, -1)
+        SavingsRollup.objects.contribute_rows(rows, -1)
+        UserSavings.objects.contribute_rows(rows, -1)
+        PledgeSavings.objects.filter(pledge__in=pledges).delete()
+
+
+def refresh_savings(pledges, create=True):
+    """Recalculate and store the savings of some pledges.
+
+    The answers of the pledges and the answers their actions share are loaded with a single
+    query. The formulas are then evaluated once per action and distinct set of answers, and
+    the pledges with the same savings are updated together.
+
+    :param pledges: The pledges to refresh.
+    :ptype pledges: class:`pledges.models.PledgeQuerySet`.
+    :param create: Whether to store savings for pledges that have none yet. Otherwise only
+        existing savings are updated.
+    :ptype create: bool.
+    """
+    actions = list(Action.objects.filter(pledge__in=pledges).distinct())
+    shared = {action.answers_pledge_id for action in actions} - {None}
+    rows = Answer.objects.filter(Q(pledge__in=pledges) | Q(pledge__in=shared)).values_list(
+        "pledge_id", "pledge__action_id", "question", "value"
+    )
+    answers = {}
+    own = {}
+    for pledge_id, action_id, question, value in rows:
+        answers.setdefault(pledge_id, {})[question] = value
+        own.setdefault(action_id, set()).add(pledge_id)
+
+    with transaction.atomic():
+        contribute(pledges, -1)
+        for action in actions:
+            action_pledges = pledges.filter(action=action)
+            own_pledges = own.get(action.pk, set())
+            values = calculate_action_savings(action, answers.get(action.answers_pledge_id))
+            _store_savings(action_pledges.exclude(pk__in=own_pledges), values, create)
+
+            groups = {}
+            for pledge_id in own_pledges:
+                key = frozenset(answers[pledge_id].items())
+                groups.setdefault(key, []).append(pledge_id)
+            for key, pledge_ids in groups.items():
+                values = calculate_action_savings(action, dict(key))
+                _store_savings(action_pledges.filter(pk__in=pledge_ids), values, create)
+        contribute(pledges)
+
+
+def _store_savings(pledges, values, create):
+    """Store the same savings for some pledges."""
+    PledgeSavings.objects.filter(pledge__in=pledges).update(**values)
+    if create:
+        missing = pledges.filter(savings__isnull=True).values_list("pk", flat=True)
+        PledgeSavings.objects.bulk_create(
+            PledgeSavings(pledge_id=pk, **values) for pk in missing.iterator()
+        )
+
+
+def refresh_action_savings(actions, create=True):
+    """Recalculate and store the savings of every pledge towards some actions.
+
+    :param actions: The actions whose formulas or answers changed.
+    :ptype actions: iterable of class:`pledges.models.Action`.
+    :param create: Whether to store savings for pledges that have none yet.
+    :ptype create: bool.
+    """
+    refresh_savings(
+        Pledge.objects.filter(action__in=[action.pk for action in actions]), create=create
+    )
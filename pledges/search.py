@@ -0,0 +1,107 @@
+"""Prefix and typo tolerant search for usernames.
+
+Prefix matches are found with a range scan on the unique index of ``auth_user.username``.
+Typo tolerant matches are found through ``UsernameTrigram``, which stores the trigrams of
+every username. The usernames sharing the most trigrams with the query are then ranked by
+their similarity to the query, which also tolerates swapped letters.
+"""
+from difflib import SequenceMatcher
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+
+from .models import UsernameTrigram
+
+SIMILARITY_THRESHOLD = 0.6
+
+
+def trigrams(text):
+    """Return the trigrams of a piece of text.
+
+    Like PostgreSQL's ``pg_trgm``, the text is lowercased and padded with two spaces at the
+    start and one space at the end, so short words and word starts still produce trigrams.
+
+    :param text: The text to split.
+    :ptype text: str.
+
+    :return: The distinct trigrams of the text.
+    :rtype: set.
+    """
+    padded = f"  {text.lower()} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(first, second):
+    """Return the similarity of two pieces of text, between ``0`` and ``1``."""
+    return SequenceMatcher(None, first.lower(), second.lower()).ratio()
+
+
+def index_username(user):
+    """Store the trigrams of a user's username, replacing any stored before.
+
+    :param user: The user to index.
+    :ptype user: class:`django.contrib.auth.models.User`.
+    """
+    with transaction.atomic():
+        UsernameTrigram.objects.filter(user=user).delete()
+        UsernameTrigram.objects.bulk_create(
+            UsernameTrigram(user=user, trigram=trigram) for trigram in trigrams(user.username)
+        )
+
+
+def index_usernames(users):
+    """Store the trigrams of many users at once, e.g. after they were bulk created.
+
+    :param users: The users to index.
+    :ptype users: list of class:`django.contrib.auth.models.User`.
+    """
+    with transaction.atomic():
+        UsernameTrigram.objects.filter(user__in=[user.pk for user in users]).delete()
+        UsernameTrigram.objects.bulk_create(
+            UsernameTrigram(user=user, trigram=trigram)
+            for user in users
+            for trigram in trigrams(user.username)
+        )
+
+
+def search_usernames(query, limit=10):
+    """Find the usernames that start with or resemble the query.
+
+    :param query: The (partial) username to search for.
+    :ptype query: str.
+    :param limit: The maximum number of usernames to return.
+    :ptype limit: int.
+
+    :return: The matching usernames, prefix matches first and then the most similar ones.
+    :rtype: list.
+    """
+    if not query:
+        return []
+
+    matches = list(
+        User.objects.filter(username__gte=query, username__lt=query + "\U0010ffff")
+        .order_by("username")
+        .values_list("username", flat=True)[:limit]
+    )
+    if len(matches) == limit:
+        return matches
+
+    candidates = (
+        UsernameTrigram.objects.filter(trigram__in=trigrams(query))
+        .values("user__username")
+        .annotate(shared=Count("id"))
+        .order_by("-shared")[:limit * 5]
+    )
+    ranked = sorted(
+        (
+            (similarity(query, username), username)
+            for username in (candidate["user__username"] for candidate in candidates)
+            if username not in matches
+        ),
+        key=lambda match: (-match[0], match[1]),
+    )
+    matches.extend(
+        username for score, username in ranked if score >= SIMILARITY_THRESHOLD
+    )
+    return matches[:limit]
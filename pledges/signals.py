@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import formulas
+from .cache import data_changed
+from .jobs import enqueue_recompute
+from .models import Action, Answer, EnergyPledge, FoodPledge, Pledge
+from .answers import sync_legacy_answers
+from .search import index_username
+from .savings import (
+    load_contributions,
+    refresh_action_savings,
+    refresh_savings,
+    remove_contributions,
+    remove_savings,
+)
+
+ANSWER_MODELS = (FoodPledge, EnergyPledge)
+
+
+@receiver(post_save, sender=Action)
+@receiver(post_delete, sender=Action)
+def invalidate_compiled_formulas(sender, instance, **kwargs):
+    """Drop the cached compiled formulas of an action that was changed or deleted."""
+    formulas.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Action)
+def copy_shared_answers(sender, instance, raw=False, **kwargs):
+    """Copy the answers of the object a saved action points to, before its savings are
+    recalculated by the next receiver.
+    """
+    if raw or instance.answers_pledge_id is None:
+        return
+    legacy = instance.content_object
+    if hasattr(legacy, "answers"):
+        Answer.objects.replace(instance.answers_pledge_id, legacy.answers)
+
+
+@receiver(post_save, sender=Action)
+def refresh_savings_for_action(sender, instance, created, raw=False, **kwargs):
+    """Recalculate the stored savings of the pledges towards a changed action.
+
+    With ``PLEDGES_BACKGROUND_RECOMPUTE`` enabled the recalculation is queued instead.
+    """
+    if created or raw:
+        return
+    if getattr(settings, "PLEDGES_BACKGROUND_RECOMPUTE", False):
+        enqueue_recompute(instance)
+    else:
+        refresh_action_savings([instance], create=False)
+
+
+@receiver(pre_save, sender=Pledge)
+def load_changed_pledge_savings(sender, instance, raw=False, **kwargs):
+    """Load the savings a pledge that is about to change is counted with in the aggregates.
+
+    The pledge may move to another action, user or day, so once it has been saved its
+    savings have to be removed from the aggregates it was counted in. Nothing is written
+    yet, so the aggregates are left alone if the save fails.
+    """
+    instance._contributions = None
+    if not raw and instance.pk is not None and not instance._state.adding:
+        instance._contributions = load_contributions(Pledge.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Pledge)
+def refresh_savings_for_pledge(sender, instance, raw=False, **kwargs):
+    """Move the savings of a changed pledge to its new aggregates, or add a new pledge."""
+    contributions = instance.__dict__.pop("_contributions", None)
+    if raw:
+        return
+    pledges = Pledge.objects.filter(pk=instance.pk)
+    with transaction.atomic():
+        if contributions is not None:
+            remove_contributions(pledges, contributions)
+        refresh_savings(pledges)
+
+
+@receiver(pre_delete, sender=Action)
+@receiver(pre_delete, sender=User)
+def remove_pledges_from_aggregates(sender, instance, **kwargs):
+    """Remove the savings of the pledges of an action or user that is about to be deleted.
+
+    The pledges are deleted in the same cascade, so their savings are removed from the
+    aggregates with one query per aggregate rather than with several per pledge. The
+    savings are deleted straight away so that answers deleted in the same cascade do not
+    refresh them again.
+    """
+    field = "action" if sender is Action else "user"
+    remove_savings(Pledge.objects.filter(**{field: instance}))
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the trigrams of a username up to date for the user search."""
+    if not raw and (update_fields is None or "username" in update_fields):
+        index_username(instance)
+
+
+def sync_answers(sender, instance, raw=False, **kwargs):
+    """Copy changed answers to the ``Answer`` table and recalculate the savings using them."""
+    if not raw:
+        sync_legacy_answers(instance)
+
+
+def delete_answers(sender, instance, **kwargs):
+    """Delete the copies of deleted answers and recalculate the savings that used them."""
+    sync_legacy_answers(instance, deleted=True)
+
+
+for model in ANSWER_MODELS:
+    post_save.connect(sync_answers, sender=model)
+    post_delete.connect(delete_answers, sender=model)
+
+
+def bump_version(sender, **kwargs):
+    """Make the cached data derived from the pledges unreachable and publish the home page.
+
+    This is connected last so the version is only bumped after the stored savings and the
+    totals have been refreshed.
+    """
+    data_changed()
+
+
+for model in (Action, Pledge, *ANSWER_MODELS):
+    post_save.connect(bump_version, sender=model)
+    post_delete.connect(bump_version, sender=model)
+
+
+@receiver(post_save, sender=User)
+def bump_version_for_username(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Bump the version when a username may have changed, as the cached pages and the API
+    show the usernames.
+    """
+    if not created and not raw and (update_fields is None or "username" in update_fields):
+        bump_version(sender)
@@ -0,0 +1,250 @@
+"""Pre-rendered snapshot of the home page.
+
+The home page is the same for every visitor, so with ``PLEDGES_STATIC_HOME`` enabled it is
+rendered in a background thread shortly after the totals change, once for all the changes
+made within ``PLEDGES_SNAPSHOT_DELAY`` seconds. It is written to ``PLEDGES_SNAPSHOT_DIR``
+together with a gzip and, if the ``brotli`` package is installed, a brotli compressed
+variant. The files can be served by the web server in front of Django, or by
+``home_snapshot_view``, which picks the variant the client accepts and answers conditional
+requests with ``304 Not Modified``.
+
+``home.json`` records the data version the snapshot was rendered at, so a snapshot that
+missed a change, e.g. one made by another process, is rendered again on the next request.
+The data version is kept in the ``PLEDGES_CACHE``, so with more than one process that cache
+must be shared by them.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from .cache import cached, data_version_bumped, get_data_version
+from .routers import use_replica
+from .views import home_context
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_NAME = "home.html"
+MANIFEST_NAME = "home.json"
+
+# The compressed variants in the order they are preferred, with their file suffix.
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# Seconds to wait after a change before publishing, unless ``PLEDGES_SNAPSHOT_DELAY`` is set.
+PUBLISH_DELAY = 1.0
+
+_publish_lock = threading.Lock()
+_timer_lock = threading.Lock()
+_publish_timer = None
+
+
+def snapshot_dir():
+    """Return the directory the snapshot is written to."""
+    return Path(getattr(settings, "PLEDGES_SNAPSHOT_DIR", Path(settings.BASE_DIR) / "snapshots"))
+
+
+def _compress(encoding, content):
+    """Return the content compressed with an encoding, ``None`` if it is not available."""
+    if encoding == "gzip":
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(content, mode=brotli.MODE_TEXT)
+    return None
+
+
+def _write(path, content):
+    """Write a file by replacing it, so it is never read half written."""
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def publish_home():
+    """Render the home page and write it and its compressed variants to the snapshot directory.
+
+    :return: The manifest of the snapshot, with the data version it was rendered at, its
+        ``etag``, when it was ``published`` and the available ``encodings``.
+    :rtype: dict.
+    """
+    version = get_data_version()
+    content = render_to_string("home_page.html", cached("home", home_context)).encode()
+    directory = snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    encodings = []
+    for encoding, suffix in ENCODINGS.items():
+        variant = directory / f"{SNAPSHOT_NAME}{suffix}"
+        compressed = _compress(encoding, content)
+        if compressed is None:
+            variant.unlink(missing_ok=True)
+            continue
+        _write(variant, compressed)
+        encodings.append(encoding)
+    _write(directory / SNAPSHOT_NAME, content)
+
+    manifest = {
+        "version": version,
+        "etag": hashlib.sha256(content).hexdigest()[:32],
+        "published": int(datetime.now(timezone.utc).timestamp()),
+        "encodings": encodings,
+    }
+    _write(directory / MANIFEST_NAME, json.dumps(manifest).encode())
+    return manifest
+
+
+def load_manifest():
+    """Return the manifest of the published snapshot, ``None`` if there is none."""
+    try:
+        return json.loads((snapshot_dir() / MANIFEST_NAME).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def current_manifest():
+    """Return the manifest of an up to date snapshot, publishing the snapshot if needed.
+
+    :return: The manifest of the snapshot.
+    :rtype: dict.
+    """
+    manifest = load_manifest()
+    if manifest is None or manifest["version"] != get_data_version():
+        with _publish_lock:
+            manifest = load_manifest()
+            if manifest is None or manifest["version"] != get_data_version():
+                manifest = publish_home()
+    return manifest
+
+
+def _publish_later():
+    """Publish the snapshot in the timer thread, closing the thread's database connection."""
+    global _publish_timer
+    with _timer_lock:
+        _publish_timer = None
+    try:
+        current_manifest()
+    finally:
+        connection.close()
+
+
+def _start_timer():
+    """Start the timer publishing the snapshot, unless it is already waiting."""
+    global _publish_timer
+    with _timer_lock:
+        if _publish_timer is None:
+            delay = getattr(settings, "PLEDGES_SNAPSHOT_DELAY", PUBLISH_DELAY)
+            _publish_timer = threading.Timer(delay, _publish_later)
+            _publish_timer.start()
+
+
+@receiver(data_version_bumped)
+def schedule_publish(**kwargs):
+    """Publish the snapshot in the background once the current transaction is committed.
+
+    Does nothing unless ``PLEDGES_STATIC_HOME`` is enabled. The snapshot is published by a
+    timer thread after ``PLEDGES_SNAPSHOT_DELAY`` seconds, so the change does not wait for
+    the rendering and compression, and the changes committed while the timer waits are
+    published together.
+    """
+    if getattr(settings, "PLEDGES_STATIC_HOME", False):
+        transaction.on_commit(_start_timer)
+
+
+def _parse_accept_encoding(header):
+    """Return the quality of every coding in an ``Accept-Encoding`` header by coding."""
+    qualities = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities
+
+
+def _accepted_encoding(request, manifest):
+    """Return the preferred encoding of the snapshot the client accepts, ``None`` for none.
+
+    Encodings the client gives a higher quality value are preferred, and ones it gives a
+    quality of ``0`` are never used.
+    """
+    qualities = _parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    available = [
+        (qualities.get(encoding, qualities.get("*", 0)), encoding)
+        for encoding in ENCODINGS
+        if encoding in manifest["encodings"]
+    ]
+    quality, encoding = max(available, key=lambda pair: pair[0], default=(0, None))
+    return encoding if quality > 0 else None
+
+
+def _snapshot(request):
+    """Return the manifest and the encoding to serve, reading them once per request."""
+    if not hasattr(request, "_home_snapshot"):
+        manifest = current_manifest()
+        request._home_snapshot = (manifest, _accepted_encoding(request, manifest))
+    return request._home_snapshot
+
+
+def _etag(request, *args, **kwargs):
+    """Return the ETag of the variant of the snapshot that is served."""
+    manifest, encoding = _snapshot(request)
+    return f"{manifest['etag']}-{encoding}" if encoding else manifest["etag"]
+
+
+def _last_modified(request, *args, **kwargs):
+    """Return when the snapshot was published."""
+    manifest, _ = _snapshot(request)
+    return datetime.fromtimestamp(manifest["published"], timezone.utc)
+
+
+def _home_snapshot_view(request):
+    """Serve the pre-rendered home page.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+
+    :return: HttpResponse object.
+    :rtype: class:`django.http.response.HttpResponse`.
+    """
+    _, encoding = _snapshot(request)
+    name = f"{SNAPSHOT_NAME}{ENCODINGS[encoding]}" if encoding else SNAPSHOT_NAME
+    response = HttpResponse(
+        (snapshot_dir() / name).read_bytes(), content_type="text/html; charset=utf-8"
+    )
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+home_snapshot_view = require_safe(
+    use_replica(condition(etag_func=_etag, last_modified_func=_last_modified)(_home_snapshot_view))
+)
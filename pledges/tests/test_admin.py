@@ -0,0 +1,55 @@
+import pytest
+
+from django.contrib.auth.models import User
+
+from pledges import admin
+from pledges.models import Action, Pledge, PledgeSavings
+
+
+@pytest.mark.django_db
+class TestPledgeAdmin:
+    """Tests for the admin of the pledges."""
+
+    @pytest.fixture
+    def many_pledges(self, pledge):
+        """Add pledges by several users, one of them without stored savings."""
+        pledge = pledge(True)
+        for index in range(20):
+            Pledge.objects.create(
+                action=pledge.action, user=User.objects.create(username=f"user_{index}")
+            )
+        PledgeSavings.objects.filter(pledge=pledge).delete()
+        return pledge
+
+    def test_changelist_queries(self, admin_client, many_pledges, django_assert_max_num_queries):
+        """Test that the queries of the changelist do not grow with the pledges on the page."""
+        with django_assert_max_num_queries(8):
+            response = admin_client.get("/admin/pledges/pledge/")
+
+        assert response.status_code == 200
+        assert len(response.context["cl"].result_list) == 21
+        assert b"13.5" in response.content
+
+    def test_change_form_widgets(self, admin_client, many_pledges):
+        """Test that the users and actions are not rendered as dropdowns."""
+        response = admin_client.get(f"/admin/pledges/pledge/{many_pledges.pk}/change/")
+
+        assert response.status_code == 200
+        assert b"user_19</option>" not in response.content
+        assert b"admin-autocomplete" in response.content
+
+    def test_estimated_count(self, admin_client, many_pledges, monkeypatch):
+        """Test that large unfiltered tables are not counted."""
+        monkeypatch.setattr(admin, "ESTIMATE_THRESHOLD", 10)
+        Pledge.objects.exclude(pk=Pledge.objects.order_by("pk").last().pk).first().delete()
+
+        response = admin_client.get("/admin/pledges/pledge/")
+        assert response.context["cl"].result_count == 21
+
+        response = admin_client.get("/admin/pledges/pledge/?q=user_1")
+        assert response.context["cl"].result_count == 11
+
+    def test_estimate_count(self, many_pledges):
+        """Test ``estimate_count``."""
+        assert admin.estimate_count(Pledge) == Pledge.objects.order_by("pk").last().pk
+        assert admin.estimate_count(Action) == many_pledges.action.pk
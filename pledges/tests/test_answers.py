@@ -0,0 +1,170 @@
+import json
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError
+
+from pledges import answers
+from pledges.answers import Question, clean_answers, get_questions, save_answers
+from pledges.models import (
+    Action,
+    Answer,
+    EnergyPledge,
+    FoodPledge,
+    Pledge,
+    PledgeSavings,
+    load_answers,
+)
+
+
+@pytest.fixture
+def food_action(monkeypatch):
+    """Add a food action whose answers are stored in the ``Answer`` table."""
+    monkeypatch.setitem(answers._registry, "food", answers._registry[FoodPledge])
+    return Action.objects.create(
+        action="food",
+        question_text="How many meals do you eat a week?",
+        co2_formula="0.8 * vegetarian_meals * 0.5",
+        water_formula="0.4 * current_meals",
+        waste_formula="0.9 * current_meals * vegetarian_meals",
+        version="version 1.0",
+    )
+
+
+class TestQuestion:
+    """Tests for ``Question``."""
+
+    def test_to_python(self):
+        """Test that answers are converted to the type of their question."""
+        assert Question("people", int).to_python("3") == 3
+        assert Question("supplier", choices=[0.5, 0.0]).to_python("0.50") == Decimal("0.5")
+
+    def test_invalid_answer(self):
+        """Test that answers which are not numbers or not a choice are rejected."""
+        with pytest.raises(ValidationError, match="not a number"):
+            Question("people", int).to_python("many")
+        with pytest.raises(ValidationError, match="not a valid choice"):
+            Question("supplier", choices=[0.5, 0.0]).to_python("0.3")
+
+
+@pytest.mark.django_db
+class TestAnswers:
+    """Tests for the answers stored in the ``Answer`` table."""
+
+    def test_clean_answers(self, food_action):
+        """Test that the answers are validated against the registered questions."""
+        assert clean_answers(food_action, {"current_meals": "4"}) == {"current_meals": 4}
+        with pytest.raises(ValidationError) as error:
+            clean_answers(food_action, {"vegetarian_meals": "4", "dessert": "1"})
+        assert set(error.value.message_dict) == {"vegetarian_meals", "dessert"}
+
+    def test_questions_by_model(self, pledge):
+        """Test that the questions of an action follow the model its content type points to."""
+        action = Action.objects.get(pk=pledge(True).action.pk)
+        assert action.action == "test action"
+        assert set(get_questions(action)) == {"current_meals", "vegetarian_meals"}
+
+        action.content_type = ContentType.objects.get_for_model(EnergyPledge)
+        assert "heating_source" in get_questions(action)
+
+    def test_save_answers(self, food_action, user):
+        """Test that every pledge uses its own answers."""
+        pledge = Pledge.objects.create(action=food_action, user=user)
+        second = Pledge.objects.create(
+            action=food_action, user=User.objects.create(username="second_user")
+        )
+        assert PledgeSavings.objects.get(pledge=pledge).co2_saving is None
+
+        save_answers(pledge, {"current_meals": 5, "vegetarian_meals": "3"})
+        save_answers(second, {"current_meals": 10, "vegetarian_meals": "2.5"})
+
+        assert PledgeSavings.objects.get(pledge=pledge).water_saving == 2.0
+        assert PledgeSavings.objects.get(pledge=second).water_saving == 4.0
+        assert PledgeSavings.objects.get(pledge=second).co2_saving == 1.0
+
+    def test_legacy_answers_copied(self, pledge):
+        """Test that the answers of a ``FoodPledge`` an action points to are copied."""
+        pledge = pledge(True)
+        assert Answer.objects.by_pledge([pledge.pk]) == {
+            pledge.pk: {"current_meals": Decimal("5"), "vegetarian_meals": Decimal("3")}
+        }
+        assert Action.objects.get(pk=pledge.action.pk).answers_pledge == pledge
+
+        FoodPledge.objects.get(pledge_id=pledge).delete()
+        assert not Answer.objects.exists()
+
+    def test_load_answers(self, pledge, food_action, django_assert_num_queries):
+        """Test that the answers of pledges towards any actions are loaded with one query."""
+        legacy = pledge(True)
+        second_user = User.objects.create(username="second_user")
+        Pledge.objects.create(action=legacy.action, user=second_user)
+        own = Pledge.objects.create(action=food_action, user=legacy.user)
+        save_answers(own, {"current_meals": 7})
+        pledges = list(Pledge.objects.select_related("action").order_by("pk"))
+
+        with django_assert_num_queries(1):
+            load_answers(pledges)
+
+        assert [pledge.get_answers()["current_meals"] for pledge in pledges] == [5, 5, 7]
+        assert pledges[1].get_answers() == pledges[0].get_answers()
+
+    def test_import_answers(self, food_action, tmp_path):
+        """Test that imported answers are validated and stored in the ``Answer`` table."""
+        rows = [
+            {
+                "username": "new_user",
+                "action": "food",
+                "version": "version 1.0",
+                "answers": {"current_meals": 5, "vegetarian_meals": "3"},
+            },
+        ]
+        path = tmp_path / "pledges.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows))
+
+        call_command("import_pledges", str(path), stdout=StringIO())
+
+        savings = PledgeSavings.objects.get(pledge__user__username="new_user")
+        assert savings.waste_saving == 13.5
+
+        path.write_text(json.dumps({**rows[0], "answers": {"vegetarian_meals": "1"}}))
+        with pytest.raises(CommandError, match="Row 1: .*vegetarian_meals"):
+            call_command("import_pledges", str(path), stdout=StringIO())
+
+    def test_export_answers(self, food_action, user, tmp_path):
+        """Test that pledges are exported with the savings of their own answers."""
+        pledge = Pledge.objects.create(action=food_action, user=user)
+        save_answers(pledge, {"current_meals": 10, "vegetarian_meals": "2.5"})
+        path = tmp_path / "pledges.csv"
+
+        call_command("export_pledges", str(path), workers=0, stderr=StringIO())
+
+        assert path.read_text().splitlines()[1] == "1,test_user,food,version 1.0,1.0,4.0,22.5"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failed_action_save(user):
+    """Test that the answers are not copied when an action cannot be saved."""
+    action = Action.objects.create(action="food", question_text="Meals?", version="1.0")
+    answers = FoodPledge.objects.create(
+        question_id="food pledge",
+        pledge_id=Pledge.objects.create(action=action, user=user),
+        current_meals=5,
+        vegetarian_meals=3,
+    )
+    action.content_object = answers
+    action.save()
+    FoodPledge.objects.update(current_meals=10)
+
+    duplicate = Action.objects.get(pk=action.pk)
+    duplicate.pk = None
+    with pytest.raises(IntegrityError):
+        duplicate.save()
+
+    assert Answer.objects.get(question="current_meals").value == 5
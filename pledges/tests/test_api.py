@@ -0,0 +1,140 @@
+import pytest
+
+from django.test import Client
+
+from pledges.models import SavingsRollup
+
+
+@pytest.mark.django_db
+class TestApi:
+    """Tests for the JSON API."""
+    client = Client()
+
+    def test_totals(self, pledge):
+        """Test the totals endpoint."""
+        pledge(True)
+        response = self.client.get("/api/totals/")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "amount_of_pledges": 1,
+            "co2_saving": 1.2,
+            "water_saving": 2.0,
+            "waste_saving": 13.5,
+        }
+        assert response["ETag"]
+        assert not response.has_header("Last-Modified")
+        assert "max-age=60" in response["Cache-Control"]
+
+    def test_actions(self, pledge):
+        """Test the per action endpoint."""
+        pledge(True)
+        response = self.client.get("/api/actions/")
+
+        assert response.json() == {
+            "actions": [
+                {
+                    "action": "test action",
+                    "version": "version 1.0",
+                    "amount_of_pledges": 1,
+                    "co2_saving": 1.2,
+                    "water_saving": 2.0,
+                    "waste_saving": 13.5,
+                }
+            ]
+        }
+
+    def test_actions_from_rollups(self, pledge):
+        """Test that the per action endpoint sums the monthly rollups."""
+        pledge(True)
+        SavingsRollup.objects.compact()
+        SavingsRollup.objects.filter(period="month").update(amount_of_pledges=7)
+        response = self.client.get("/api/actions/")
+
+        assert response.json()["actions"][0]["amount_of_pledges"] == 7
+
+    def test_trends(self, pledge):
+        """Test the trends endpoint."""
+        pledge = pledge(True)
+        response = self.client.get("/api/trends/", {"period": "day", "action": pledge.action.pk})
+
+        assert response.json() == {
+            "period": "day",
+            "trend": [
+                {
+                    "start": pledge.created.date().isoformat(),
+                    "amount_of_pledges": 1,
+                    "co2_saving": 1.2,
+                    "water_saving": 2.0,
+                    "waste_saving": 13.5,
+                }
+            ],
+        }
+        assert self.client.get("/api/trends/", {"period": "year"}).status_code == 400
+        assert self.client.get("/api/trends/", {"since": "yesterday"}).status_code == 400
+
+    def test_user_pledges(self, pledge):
+        """Test the endpoint for the pledges of a user."""
+        pledge(True)
+        response = self.client.get("/api/users/test_user/pledges/")
+
+        assert response.json() == {
+            "pledges": [
+                {
+                    "username": "test_user",
+                    "action": "test action",
+                    "version": "version 1.0",
+                    "co2_saving": 1.2,
+                    "water_saving": 2.0,
+                    "waste_saving": 13.5,
+                }
+            ],
+            "next": None,
+        }
+
+    def test_not_modified(self, pledge, django_assert_num_queries):
+        """Test that conditional requests are answered without reading the pledges."""
+        pledge(True)
+        response = self.client.get("/api/totals/")
+
+        with django_assert_num_queries(1):
+            not_modified = self.client.get(
+                "/api/totals/", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        assert not_modified.status_code == 304
+
+    def test_modified(self, pledge):
+        """Test that the ETag changes when the savings change."""
+        pledge = pledge(True)
+        response = self.client.get("/api/totals/")
+
+        pledge.action.co2_formula = "2 * vegetarian_meals"
+        pledge.action.save()
+
+        modified = self.client.get("/api/totals/", HTTP_IF_NONE_MATCH=response["ETag"])
+        assert modified.status_code == 200
+        assert modified.json()["co2_saving"] == 6.0
+
+    def test_renamed(self, pledge):
+        """Test that the ETag changes when a username or an action changes."""
+        pledge = pledge(True)
+        response = self.client.get("/api/users/renamed/pledges/")
+
+        pledge.user.username = "renamed"
+        pledge.user.save()
+        renamed = self.client.get(
+            "/api/users/renamed/pledges/", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        assert renamed.status_code == 200
+        assert renamed.json()["pledges"][0]["action"] == "test action"
+
+        pledge.action.action = "new name"
+        pledge.action.save()
+        renamed = self.client.get(
+            "/api/users/renamed/pledges/", HTTP_IF_NONE_MATCH=renamed["ETag"]
+        )
+        assert renamed.json()["pledges"][0]["action"] == "new name"
+
+    def test_read_only(self):
+        """Test that the API rejects writes."""
+        assert self.client.post("/api/totals/").status_code == 405
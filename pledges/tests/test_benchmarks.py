@@ -0,0 +1,54 @@
+import pytest
+
+from pledges.benchmarks import check_thresholds, run_benchmarks, seed
+from pledges.models import Pledge, PledgeTotals
+
+
+@pytest.mark.django_db
+class TestBenchmarks:
+    """Tests for the benchmark helpers."""
+
+    def test_seed(self):
+        """Test that the seeded pledges are stored with their savings and totals."""
+        username = seed(101)
+
+        # The seeded pledges and the pledge that owns the answers.
+        assert Pledge.objects.count() == 102
+        assert Pledge.objects.filter(user__username=username).count() == 10
+        assert Pledge.objects.filter(savings__isnull=True).count() == 0
+        assert PledgeTotals.objects.get_totals() == Pledge.objects.total_savings()
+
+    def test_run_benchmarks(self):
+        """Test that the benchmarks report the latency and queries of the views."""
+        username = seed(10)
+        results = run_benchmarks(username, repeat=2, sample=5)
+
+        assert results["home_view_uncached"]["queries"] == 2
+        assert results["home_view_cached"]["queries"] == 0
+        assert results["search_view"]["queries"] == 1
+        assert results["calculate_savings"]["evaluations"] == 15
+
+
+class TestCheckThresholds:
+    """Tests for ``check_thresholds``."""
+
+    def test_check_thresholds(self):
+        """Test that maximums, minimums and size specific thresholds are checked."""
+        results = {
+            "1000": {
+                "home_view": {"median_ms": 5, "queries": 2},
+                "calculate_savings": {"per_second": 100},
+            },
+            "100000": {"home_view": {"median_ms": 50, "queries": 1}},
+        }
+        thresholds = {
+            "*.home_view.queries": 1,
+            "*.home_view.median_ms": 10,
+            "100000.home_view.median_ms": 60,
+            "*.calculate_savings.per_second": 1000,
+        }
+
+        assert check_thresholds(results, thresholds) == [
+            "1000 home_view queries: 2 > 1",
+            "1000 calculate_savings per_second: 100 < 1000",
+        ]
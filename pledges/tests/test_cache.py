@@ -0,0 +1,112 @@
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from pledges.cache import bump_data_version, cache_stats, cached, get_data_version
+from pledges.checks import check_shared_cache
+from pledges.models import PledgeTotals
+
+
+@pytest.fixture(params=["locmem", "filebased", "db"])
+def cache_backend(request, settings, tmp_path):
+    """Run a test with each of the supported cache backends."""
+    backends = {
+        "locmem": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "filebased": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path),
+        },
+        "db": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "test_cache_table",
+        },
+    }
+    settings.CACHES = {**settings.CACHES, "pledges": backends[request.param]}
+    settings.PLEDGES_CACHE = "pledges"
+    if request.param == "db":
+        call_command("createcachetable", database="default")
+    return request.param
+
+
+@pytest.mark.django_db
+class TestCache:
+    """Tests for the versioned cache."""
+
+    def test_cached(self, cache_backend):
+        """Test that values are computed once per data version."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"value": len(calls)}
+
+        assert cached("test", compute) == {"value": 1}
+        assert cached("test", compute) == {"value": 1}
+        assert cache_stats() == {"hits": 1, "misses": 1}
+
+        version = get_data_version()
+        bump_data_version()
+        assert get_data_version() > version
+        assert cached("test", compute) == {"value": 2}
+        assert cache_stats() == {"hits": 1, "misses": 2}
+
+    def test_home_view_cached(self, cache_backend, pledge):
+        """Test that the home page is served from the cache until the data changes."""
+        pledge = pledge(True)
+        client = Client()
+        client.get("/")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/")
+        assert response.context["total_co2_savings"] == 1.2
+        assert not [query for query in queries if "pledges_" in query["sql"]]
+
+        pledge.action.co2_formula = "2 * vegetarian_meals"
+        pledge.action.save()
+
+        response = client.get("/")
+        assert response.context["total_co2_savings"] == 6.0
+
+    def test_rebuild_commands_bump_version(self, pledge):
+        """Test that the commands rewriting the aggregates make the cached pages unreachable."""
+        pledge(True)
+        client = Client()
+        PledgeTotals.objects.all().delete()
+        PledgeTotals.objects.create(pk=1, amount_of_pledges=1, co2_saving=3996.0)
+        bump_data_version()
+        assert client.get("/").context["total_co2_savings"] == 3996.0
+
+        call_command("rebuild_totals", stdout=StringIO())
+
+        assert client.get("/").context["total_co2_savings"] == 1.2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_version_bumped_on_commit():
+    """Test that the version is bumped again once the transaction is committed."""
+    version = get_data_version()
+    with transaction.atomic():
+        bump_data_version()
+        during = get_data_version()
+        assert during > version
+
+    assert get_data_version() > during
+
+
+def test_shared_cache_check(settings, tmp_path):
+    """Test that a cache local to every process is reported."""
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    assert [warning.id for warning in check_shared_cache(None)] == ["pledges.W001"]
+
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path),
+        }
+    }
+    assert check_shared_cache(None) == []
@@ -0,0 +1,172 @@
+import gzip
+import json
+from datetime import date, datetime, timezone
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from pledges.models import (
+    Answer,
+    FoodPledge,
+    Pledge,
+    PledgeSavings,
+    PledgeTotals,
+    SavingsRollup,
+)
+from pledges.search import search_usernames
+
+
+@pytest.mark.django_db
+class TestImportPledges:
+    """Tests for the ``import_pledges`` command."""
+
+    def test_import_jsonl(self, pledge, tmp_path):
+        """Test importing new and existing users and pledges from a JSON lines file."""
+        pledge(True)
+        rows = [
+            {"username": "test_user", "action": "test action", "version": "version 1.0"},
+            {
+                "username": "new_user",
+                "action": "test action",
+                "version": "version 1.0",
+                "answers": {"current_meals": 4, "vegetarian_meals": "2.5"},
+            },
+            {"username": "other_user", "action": "test action", "version": "version 1.0"},
+        ]
+        path = tmp_path / "pledges.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows))
+
+        out = StringIO()
+        call_command("import_pledges", str(path), chunk_size=2, stdout=out)
+
+        assert "Imported 3 rows." in out.getvalue()
+        assert "rows/sec" in out.getvalue()
+        assert Pledge.objects.count() == 3
+        assert not FoodPledge.objects.filter(pledge_id__user__username="new_user").exists()
+        new_savings = PledgeSavings.objects.get(pledge__user__username="new_user")
+        assert (new_savings.co2_saving, new_savings.water_saving) == (1.0, 1.6)
+        assert PledgeTotals.objects.get_totals() == {
+            "amount_of_pledges": 3,
+            "co2_saving": 3.4,
+            "water_saving": 5.6,
+            "waste_saving": 36.0,
+        }
+        assert not User.objects.get(username="new_user").has_usable_password()
+        assert search_usernames("new_usr")[0] == "new_user"
+
+    def test_import_csv(self, pledge, tmp_path):
+        """Test importing from a CSV file with answer columns."""
+        pledge(True)
+        path = tmp_path / "pledges.csv"
+        path.write_text(
+            "username,action,version,current_meals,vegetarian_meals\n"
+            "csv_user,test action,version 1.0,6,3\n"
+        )
+
+        call_command("import_pledges", str(path), stdout=StringIO())
+
+        pledge = Pledge.objects.get(user__username="csv_user")
+        assert Answer.objects.by_pledge([pledge.pk])[pledge.pk] == {
+            "current_meals": 6, "vegetarian_meals": 3
+        }
+        assert PledgeSavings.objects.get(pledge=pledge).water_saving == 2.4
+
+    def test_import_created(self, pledge, tmp_path):
+        """Test that new pledges are created at the date of their row."""
+        pledge(True)
+        path = tmp_path / "pledges.csv"
+        path.write_text(
+            "username,action,version,created\n"
+            "old_user,test action,version 1.0,2024-02-29T10:00:00+00:00\n"
+            "test_user,test action,version 1.0,2024-02-29T10:00:00\n"
+        )
+
+        call_command("import_pledges", str(path), stdout=StringIO())
+
+        created = Pledge.objects.get(user__username="old_user").created
+        assert created == datetime(2024, 2, 29, 10, tzinfo=timezone.utc)
+        assert Pledge.objects.get(user__username="test_user").created.year != 2024
+        assert SavingsRollup.objects.filter(period="day", start=date(2024, 2, 29)).exists()
+
+    def test_invalid_created(self, pledge, tmp_path):
+        """Test that a row with an invalid date stops the import."""
+        pledge(True)
+        path = tmp_path / "pledges.jsonl"
+        path.write_text(json.dumps({
+            "username": "a", "action": "test action", "version": "version 1.0", "created": "soon"
+        }))
+
+        with pytest.raises(CommandError, match="Row 1: invalid created 'soon'"):
+            call_command("import_pledges", str(path), stdout=StringIO())
+
+    @pytest.mark.parametrize(
+        "answers, message",
+        [
+            ({"cycling": "3"}, "Row 2: cycling: test action has no question 'cycling'."),
+            ({"current_meals": "many"}, "Row 2: current_meals: 'many' is not a number."),
+            ({"vegetarian_meals": "4"}, "Row 2: vegetarian_meals: 4 is not a valid choice."),
+        ],
+    )
+    def test_invalid_answers(self, pledge, tmp_path, answers, message):
+        """Test that a row with an answer its action does not accept stops the import."""
+        pledge(True)
+        rows = [
+            {"username": "a", "action": "test action", "version": "version 1.0"},
+            {"username": "b", "action": "test action", "version": "version 1.0", **answers},
+        ]
+        path = tmp_path / "pledges.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows))
+
+        with pytest.raises(CommandError) as error:
+            call_command("import_pledges", str(path), stdout=StringIO())
+        assert str(error.value) == message
+        assert not User.objects.filter(username="b").exists()
+
+    def test_unknown_action(self, pledge, tmp_path):
+        """Test that a row with an unknown action stops the import."""
+        pledge(True)
+        path = tmp_path / "pledges.jsonl"
+        path.write_text(json.dumps({"username": "a", "action": "x", "version": "1"}))
+
+        with pytest.raises(CommandError, match="Row 1: unknown action 'x'"):
+            call_command("import_pledges", str(path), stdout=StringIO())
+        assert not User.objects.filter(username="a").exists()
+
+
+@pytest.mark.django_db
+class TestExportPledges:
+    """Tests for the ``export_pledges`` command."""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_export(self, pledge, tmp_path, workers):
+        """Test exporting pledges in several chunks, in this process and in worker processes."""
+        pledge = pledge(True)
+        for username in ("second_user", "third_user"):
+            user = User.objects.create(username=username)
+            Pledge.objects.create(action=pledge.action, user=user)
+        path = tmp_path / "pledges.csv"
+
+        call_command(
+            "export_pledges", str(path), chunk_size=2, workers=workers, stderr=StringIO()
+        )
+
+        assert path.read_text().splitlines() == [
+            "pledge_id,username,action,version,co2_saving,water_saving,waste_saving",
+            "1,test_user,test action,version 1.0,1.2,2.0,13.5",
+            "2,second_user,test action,version 1.0,1.2,2.0,13.5",
+            "3,third_user,test action,version 1.0,1.2,2.0,13.5",
+        ]
+
+    def test_export_compressed(self, pledge, tmp_path):
+        """Test that files ending in .gz are compressed."""
+        pledge(True)
+        path = tmp_path / "pledges.csv.gz"
+
+        call_command("export_pledges", str(path), workers=0, stderr=StringIO())
+
+        with gzip.open(path, "rt") as export:
+            assert len(export.read().splitlines()) == 2
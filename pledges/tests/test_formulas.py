@@ -0,0 +1,79 @@
+import pytest
+
+from django.core.exceptions import ValidationError
+
+from pledges import formulas
+from pledges.formulas import FormulaError, compile_formula, get_compiled_formula
+from pledges.models import Action
+
+
+class TestCompileFormula:
+    """Tests for ``compile_formula``."""
+
+    @pytest.mark.parametrize(
+        "formula, expected_result",
+        [
+            ("0.8 * 6", 4.8),
+            ("0.8 / 6", 0.133),
+            ("0.2 + 5 * 2", 10.2),
+            ("6 / 3 * 2", 1),
+            ("10 / 5 / 0.1", 0.2),
+            ("0.8 - 0.1 - 0.3", 1.0),
+            ("0.2 - 0.5 / 2", -0.05),
+            ("0.8", 0.8),
+        ],
+    )
+    def test_evaluate_constants(self, formula, expected_result):
+        """Test that compiled formulas evaluate the same way as ``execute_formula``."""
+        assert compile_formula(formula).evaluate({}) == expected_result
+
+    def test_evaluate_variables(self):
+        """Test that question names are replaced by the answers."""
+        compiled = compile_formula("0.9 * current_meals * vegetarian_meals")
+        assert compiled.variables == {"current_meals", "vegetarian_meals"}
+        assert compiled.evaluate({"current_meals": 5, "vegetarian_meals": 3}) == 13.5
+
+    def test_missing_answer(self):
+        """Test that a missing answer raises a ``FormulaError``."""
+        with pytest.raises(FormulaError, match="current_meals"):
+            compile_formula("0.4 * current_meals").evaluate({})
+
+    @pytest.mark.parametrize("formula", ["0.4 *", "0.4 x 2", "0.4 * 2$", "* 0.4 2"])
+    def test_invalid_formula(self, formula):
+        """Test that malformed formulas are rejected."""
+        with pytest.raises(FormulaError):
+            compile_formula(formula)
+
+
+@pytest.mark.django_db
+class TestFormulaCache:
+    """Tests for the compiled formula cache."""
+
+    def test_cached(self, action):
+        """Test that a formula is only compiled once per action."""
+        action = action(real_data=True)
+        compiled = get_compiled_formula(action, "co2_formula")
+        assert get_compiled_formula(action, "co2_formula") is compiled
+
+    def test_invalidated_on_save(self, action):
+        """Test that saving an action drops its compiled formulas."""
+        action = action(real_data=True)
+        compiled = get_compiled_formula(action, "co2_formula")
+
+        action.co2_formula = "0.5 * vegetarian_meals"
+        action.save()
+
+        assert (action.pk, action.version, "co2_formula") not in formulas._cache
+        recompiled = get_compiled_formula(action, "co2_formula")
+        assert recompiled is not compiled
+        assert recompiled.source == "0.5 * vegetarian_meals"
+
+    def test_invalid_formula_not_saved(self, action):
+        """Test that an action with an invalid formula cannot be saved."""
+        action = action(real_data=True)
+        action.water_formula = "0.4 * * current_meals"
+        with pytest.raises(ValidationError) as error:
+            action.save()
+
+        assert "water_formula" in error.value.message_dict
+        assert Action.objects.get(pk=action.pk).water_formula == "0.4 * current_meals"
@@ -0,0 +1,161 @@
+import time
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from pledges import jobs
+from pledges.jobs import STALE_AFTER, claim_job, enqueue_recompute, run_job
+from pledges.models import Action, Answer, Pledge, PledgeSavings, PledgeTotals, RecomputeJob
+
+
+@pytest.fixture
+def pledges(pledge):
+    """Add five pledges towards the test action."""
+    pledge = pledge(True)
+    for index in range(4):
+        Pledge.objects.create(action=pledge.action, user=User.objects.create(username=f"u{index}"))
+    return Pledge.objects.order_by("pk")
+
+
+@pytest.mark.django_db
+class TestRecomputeJobs:
+    """Tests for the background recalculation of the savings."""
+
+    def test_formula_change_queued(self, pledges, settings):
+        """Test that changing a formula queues a job which recalculates the savings."""
+        settings.PLEDGES_BACKGROUND_RECOMPUTE = True
+        action = pledges[0].action
+        action.co2_formula = "2 * vegetarian_meals"
+        action.save()
+        action.save()
+
+        job = RecomputeJob.objects.get()
+        assert job.status == RecomputeJob.PENDING
+        assert PledgeSavings.objects.filter(co2_saving=1.2).count() == 5
+
+        out = StringIO()
+        call_command("recompute_savings", workers=0, chunk_size=2, stdout=out)
+
+        job.refresh_from_db()
+        assert (job.status, job.processed, job.total, job.progress) == ("done", 5, 5, 100)
+        assert job.last_pledge == pledges.last().pk
+        assert PledgeSavings.objects.filter(co2_saving=6.0).count() == 5
+        assert PledgeTotals.objects.get_totals()["co2_saving"] == 30.0
+        assert "2/5 pledges (40%)" in out.getvalue()
+        assert "5/5 pledges (100%)" in out.getvalue()
+
+    def test_resume(self, pledges):
+        """Test that an interrupted job continues after the last chunk it finished."""
+        action = pledges[0].action
+        job = enqueue_recompute(action)
+        RecomputeJob.objects.filter(pk=job.pk).update(
+            status=RecomputeJob.RUNNING,
+            processed=3,
+            last_pledge=pledges[2].pk,
+            updated=timezone.now() - STALE_AFTER * 2,
+        )
+        PledgeSavings.objects.update(co2_saving=0)
+
+        assert claim_job() is None
+        job = claim_job(resume=True)
+        run_job(job, workers=0, chunk_size=10)
+
+        assert list(pledges.values_list("savings__co2_saving", flat=True)) == [0, 0, 0, 1.2, 1.2]
+        job.refresh_from_db()
+        assert (job.status, job.processed, job.total) == ("done", 5, 5)
+        assert claim_job(resume=True) is None
+
+    def test_running_job_not_resumed(self, pledges):
+        """Test that a running job whose worker still makes progress is not taken over."""
+        job = enqueue_recompute(pledges[0].action)
+        RecomputeJob.objects.filter(pk=job.pk).update(status=RecomputeJob.RUNNING)
+
+        assert claim_job(resume=True) is None
+        assert claim_job(resume=True, stale_after=timedelta(0)).pk == job.pk
+
+    def test_enqueue_command(self, pledges):
+        """Test that jobs can be queued from the command line."""
+        action = pledges[0].action
+        call_command("recompute_savings", enqueue=[action.pk], workers=0, stdout=StringIO())
+
+        assert RecomputeJob.objects.get().status == RecomputeJob.DONE
+
+    def test_failed_job(self, pledges, monkeypatch):
+        """Test that a failing job is marked as failed and the other jobs still run."""
+        broken = enqueue_recompute(pledges[0].action)
+        other = Action.objects.create(action="other", question_text="Other?", version="1.0")
+        Pledge.objects.create(action=other, user=pledges[0].user)
+        job = enqueue_recompute(other)
+        recompute_chunk = jobs._recompute_chunk
+
+        def fail(action, after, last):
+            if action == broken.action:
+                raise RuntimeError("broken formula")
+            return recompute_chunk(action, after, last)
+
+        monkeypatch.setattr(jobs, "_recompute_chunk", fail)
+        err = StringIO()
+        with pytest.raises(CommandError, match="1 jobs failed"):
+            call_command(
+                "recompute_savings", workers=0, resume=True, stdout=StringIO(), stderr=err
+            )
+
+        broken.refresh_from_db()
+        assert (broken.status, broken.error) == ("failed", "RuntimeError('broken formula')")
+        assert "broken formula" in err.getvalue()
+        assert RecomputeJob.objects.get(pk=job.pk).status == RecomputeJob.DONE
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_job_in_threads():
+    """Test that the chunks of a job are recalculated by a pool of threads."""
+    action = Action.objects.create(
+        action="threads", question_text="Threads?", version="1.0", co2_formula="3 * meals"
+    )
+    for index in range(5):
+        user = User.objects.create(username=f"t{index}")
+        Answer.objects.create(
+            pledge=Pledge.objects.create(action=action, user=user), question="meals", value=1
+        )
+    assert not PledgeSavings.objects.filter(co2_saving=3.0).exists()
+    job = enqueue_recompute(action)
+    updated = job.updated
+
+    reported = []
+    run_job(claim_job(), workers=2, chunk_size=2, progress=lambda j: reported.append(j.processed))
+
+    job.refresh_from_db()
+    assert (job.status, job.processed, job.total) == ("done", 5, 5)
+    assert job.updated > updated
+    assert reported == [2, 4, 5]
+    assert list(PledgeSavings.objects.values_list("co2_saving", flat=True)) == [3.0] * 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_heartbeat(monkeypatch):
+    """Test that a running job is kept fresh while a chunk takes longer than the heartbeat."""
+    action = Action.objects.create(action="slow", question_text="Slow?", version="1.0")
+    Pledge.objects.create(action=action, user=User.objects.create(username="slow"))
+    enqueue_recompute(action)
+    job = claim_job()
+    recompute_chunk = jobs._recompute_chunk
+    updated = []
+
+    def slow(action, after, last):
+        updated.append(RecomputeJob.objects.get(pk=job.pk).updated)
+        time.sleep(0.3)
+        updated.append(RecomputeJob.objects.get(pk=job.pk).updated)
+        return recompute_chunk(action, after, last)
+
+    monkeypatch.setattr(jobs, "HEARTBEAT_INTERVAL", timedelta(seconds=0.05))
+    monkeypatch.setattr(jobs, "_recompute_chunk", slow)
+    run_job(job, workers=0)
+
+    assert updated[1] > updated[0]
+    assert RecomputeJob.objects.get(pk=job.pk).status == RecomputeJob.DONE
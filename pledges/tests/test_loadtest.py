@@ -0,0 +1,110 @@
+import json
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from pledges.loadtest import (
+    Sample,
+    parse_mix,
+    percentile,
+    request_paths,
+    server_timing_queries,
+    summarize,
+)
+from pledges.management.commands import loadtest
+from pledges.models import Action, Pledge
+
+
+class TestLoadtestHelpers:
+    """Tests for the load generator helpers."""
+
+    def test_parse_mix(self):
+        """Test that the weights of the requests are parsed and checked."""
+        assert parse_mix("home=4, search=1") == {"home": 4.0, "search": 1.0}
+        with pytest.raises(ValueError, match="Unknown request"):
+            parse_mix("admin=1")
+        with pytest.raises(ValueError, match="positive weight"):
+            parse_mix("home=0")
+
+    def test_request_paths(self):
+        """Test that the requests follow the mix and search for the users in turn."""
+        requests = request_paths({"search": 1}, ["a b", "c"], 3)
+        assert requests == [
+            ("search", "/search/?user=a%20b"),
+            ("search", "/search/?user=c"),
+            ("search", "/search/?user=a%20b"),
+        ]
+        assert request_paths({"home": 1, "search": 1}, ["a"], 50) == request_paths(
+            {"home": 1, "search": 1}, ["a"], 50
+        )
+
+    def test_server_timing_queries(self):
+        """Test that the number of queries is read from the ``Server-Timing`` header."""
+        header = 'db;dur=1.20;desc="3 queries", savings;dur=0.00;desc="0 savings calculations"'
+        assert server_timing_queries(header) == 3
+        assert server_timing_queries("") is None
+
+    def test_summarize(self):
+        """Test the percentiles, errors and queries of a run."""
+        samples = [Sample("home", 200, float(ms), 0) for ms in range(1, 101)]
+        samples.append(Sample("search", 500, 1000.0, 4))
+        summary = summarize(samples, 2)
+
+        assert summary["home"]["p50_ms"] == 50
+        assert summary["home"]["p95_ms"] == 95
+        assert summary["home"]["p99_ms"] == 99
+        assert summary["home"]["throughput_rps"] == 50
+        assert summary["all"]["errors"] == 1
+        assert summary["all"]["max_queries"] == 4
+        assert percentile([], 50) is None
+
+
+@pytest.mark.django_db
+class TestLoadtestCommand:
+    """Tests for the ``loadtest`` command."""
+
+    @pytest.mark.django_db(transaction=True)
+    def test_loadtest(self, user, tmp_path):
+        """Test that the requests are sent through the test client and reported."""
+        action = Action.objects.create(action="food", question_text="Meals?", version="1.0")
+        Pledge.objects.create(action=action, user=user)
+        path = tmp_path / "loadtest.json"
+        stdout = StringIO()
+
+        call_command(
+            "loadtest", requests=20, concurrency=2, output=str(path), stdout=stdout
+        )
+
+        results = json.loads(path.read_text())
+        assert results["all"]["requests"] == 20
+        assert results["all"]["errors"] == 0
+        assert results["search"]["max_queries"] == 1
+        assert "p99_ms" in stdout.getvalue()
+
+    def test_journal_mode_restored(self):
+        """Test that the journal mode of the database is restored after the requests."""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            before = cursor.fetchone()[0]
+
+        command = loadtest.Command(stdout=StringIO())
+        original = command.set_journal_mode("off")
+        assert original == {"default": before}
+        command.restore_journal_mode(original)
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            assert cursor.fetchone()[0] == before
+        assert command.journal_mode_receiver not in [
+            receiver() for _, receiver in connection_created.receivers
+        ]
+
+    def test_no_users(self):
+        """Test that a search needs users to search for."""
+        with pytest.raises(CommandError, match="No users"):
+            call_command("loadtest", requests=1, stdout=StringIO())
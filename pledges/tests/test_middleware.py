@@ -0,0 +1,65 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+
+from pledges.middleware import ServerTimingMiddleware
+from pledges.models import Pledge, PledgeSavings
+
+
+@pytest.mark.django_db
+class TestServerTimingMiddleware:
+    """Tests for ``ServerTimingMiddleware``."""
+    client = Client()
+
+    def test_server_timing(self, pledge):
+        """Test that the queries, savings calculations and templates are reported."""
+        pledge(True)
+        PledgeSavings.objects.all().delete()
+        response = self.client.get("/search/?user=test_user")
+
+        timings = {
+            metric.split(";")[0]: metric for metric in response["Server-Timing"].split(", ")
+        }
+        assert set(timings) == {"db", "savings", "template", "total"}
+        assert 'desc="2 queries"' in timings["db"]
+        assert 'desc="3 savings calculations"' in timings["savings"]
+        assert 'desc="1 templates"' in timings["template"]
+
+    def test_timing_log(self, pledge, settings, caplog):
+        """Test that the timings are logged as JSON when enabled."""
+        settings.PLEDGES_TIMING_LOG = True
+        pledge(True)
+        with caplog.at_level(logging.INFO, logger="pledges.timing"):
+            self.client.get("/")
+
+        line = json.loads(caplog.records[-1].getMessage())
+        assert line["path"] == "/"
+        assert line["status"] == 200
+        assert line["db_count"] == 2
+        assert line["template_count"] == 1
+
+    def test_async_server_timing(self, pledge, monkeypatch):
+        """Test that the queries made through ``sync_to_async`` are reported under ASGI."""
+        pledge(True)
+
+        async def view(request):
+            count = await sync_to_async(Pledge.objects.count)()
+            return HttpResponse(str(count))
+
+        middleware = ServerTimingMiddleware(view)
+        assert asyncio.iscoroutinefunction(middleware)
+
+        monkeypatch.setattr(connection, "execute_wrappers", [])
+        connection_created.send(sender=type(connection), connection=connection)
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+
+        assert response.content == b"1"
+        assert 'desc="1 queries"' in response["Server-Timing"]
@@ -166,6 +166,32 @@ class TestPledge:
             pledge(True)
 
 
+@pytest.mark.django_db
+class TestPledgeQuerySet:
+    """Tests for the batch operations of ``Pledge.objects``."""
+
+    def test_total_savings(self, pledge):
+        """Test that the totals match the sum of the individual pledges."""
+        pledge(True)
+        totals = Pledge.objects.total_savings()
+
+        assert totals == {
+            "amount_of_pledges": 1,
+            "co2_saving": 1.2,
+            "water_saving": 2.0,
+            "waste_saving": 13.5,
+        }
+
+    def test_total_savings_without_pledges(self):
+        """Test the totals when there are no pledges."""
+        assert Pledge.objects.total_savings() == {
+            "amount_of_pledges": 0,
+            "co2_saving": 0,
+            "water_saving": 0,
+            "waste_saving": 0,
+        }
+
+
 @pytest.mark.django_db
 class TestFoodPledge:
     """Tests for the ``FoodPledge`` model."""
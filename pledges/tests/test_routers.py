@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+
+from pledges import routers
+from pledges.models import Pledge
+from pledges.routers import (
+    PIN_COOKIE,
+    PrimaryPinningMiddleware,
+    ReplicaRouter,
+    _primary,
+    pinned_to_primary,
+    replica,
+)
+
+
+@pytest.fixture
+def replica_configured(monkeypatch):
+    """Pretend that a replica is configured."""
+    monkeypatch.setattr(routers, "replica_alias", lambda: "replica")
+
+
+class TestReplicaRouter:
+    """Tests for ``ReplicaRouter``."""
+    router = ReplicaRouter()
+
+    def test_reads_outside_replica(self, replica_configured):
+        """Test that reads go to the primary by default."""
+        assert self.router.db_for_read(Pledge) is None
+
+    def test_reads_inside_replica(self, replica_configured):
+        """Test that reads inside ``replica`` go to the replica."""
+        with replica():
+            assert self.router.db_for_read(Pledge) == "replica"
+
+    def test_reads_when_pinned(self, replica_configured):
+        """Test that pinned reads stay on the primary."""
+        with replica(), pinned_to_primary():
+            assert self.router.db_for_read(Pledge) is None
+
+    def test_read_your_own_writes(self, replica_configured):
+        """Test that reads after a write go to the primary."""
+        with replica(), pinned_to_primary(False):
+            assert self.router.db_for_write(Pledge) == "default"
+            assert self.router.db_for_read(Pledge) is None
+
+    def test_without_replica(self):
+        """Test that every read goes to the primary when no replica is configured."""
+        with replica():
+            assert self.router.db_for_read(Pledge) is None
+
+
+@pytest.mark.django_db
+class TestPrimaryPinningMiddleware:
+    """Tests for ``PrimaryPinningMiddleware``."""
+
+    def test_writes_pin_to_primary(self, settings):
+        """Test that a write sets the pinning cookie for the replica lag."""
+        settings.PLEDGES_REPLICA_LAG = 7
+        response = Client().post("/search/")
+
+        assert response.cookies[PIN_COOKIE]["max-age"] == 7
+
+    def test_reads_do_not_pin(self):
+        """Test that reads do not set the pinning cookie."""
+        response = Client().get("/")
+
+        assert PIN_COOKIE not in response.cookies
+
+    def test_async_writes_pin_to_primary(self):
+        """Test that writes served asynchronously set the pinning cookie and stay pinned."""
+        async def view(request):
+            return HttpResponse(str(_primary.get()["pinned"]))
+
+        middleware = PrimaryPinningMiddleware(view)
+        assert asyncio.iscoroutinefunction(middleware)
+
+        response = async_to_sync(middleware)(RequestFactory().post("/search/"))
+        assert response.content == b"True"
+        assert PIN_COOKIE in response.cookies
+
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+        assert response.content == b"False"
+        assert PIN_COOKIE not in response.cookies
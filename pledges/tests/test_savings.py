@@ -0,0 +1,437 @@
+from datetime import date, datetime, timezone
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.db.models import QuerySet, Sum
+from django.test.utils import CaptureQueriesContext
+
+from pledges import models
+from pledges.models import (
+    Action,
+    Answer,
+    FoodPledge,
+    Pledge,
+    PledgeSavings,
+    PledgeTotals,
+    SavingsRollup,
+    UserSavings,
+)
+from pledges.savings import refresh_savings
+
+
+@pytest.mark.django_db
+class TestStoredSavings:
+    """Tests for the stored savings of pledges."""
+
+    def test_savings_stored(self, pledge):
+        """Test that the savings are stored once the answers are saved."""
+        pledge = pledge(True)
+        savings = PledgeSavings.objects.get(pledge=pledge)
+
+        assert savings.co2_saving == 1.2
+        assert savings.water_saving == 2.0
+        assert savings.waste_saving == 13.5
+
+    def test_savings_without_answers(self, pledge):
+        """Test that savings which cannot be calculated are stored as ``None``."""
+        pledge = pledge(False)
+        savings = PledgeSavings.objects.get(pledge=pledge)
+
+        assert savings.co2_saving is None
+        assert savings.water_saving is None
+        assert savings.waste_saving is None
+
+    def test_answers_changed(self, pledge):
+        """Test that changing the answers refreshes the savings."""
+        pledge = pledge(True)
+        food_pledge = FoodPledge.objects.get(pledge_id=pledge)
+        food_pledge.current_meals = 10
+        food_pledge.save()
+
+        assert PledgeSavings.objects.get(pledge=pledge).water_saving == 4.0
+
+    def test_answers_deleted(self, pledge):
+        """Test that deleting the answers clears the savings."""
+        pledge = pledge(True)
+        FoodPledge.objects.get(pledge_id=pledge).delete()
+
+        assert PledgeSavings.objects.get(pledge=pledge).co2_saving is None
+
+    def test_formula_changed(self, pledge):
+        """Test that changing an action's formula refreshes the savings."""
+        pledge = pledge(True)
+        pledge.action.co2_formula = "2 * vegetarian_meals"
+        pledge.action.save()
+
+        assert PledgeSavings.objects.get(pledge=pledge).co2_saving == 6.0
+
+    def test_refresh_savings_command(self, pledge):
+        """Test that the ``refresh_savings`` command recreates missing savings."""
+        pledge = pledge(True)
+        PledgeSavings.objects.all().delete()
+
+        call_command("refresh_savings", stdout=StringIO())
+
+        savings = PledgeSavings.objects.get(pledge=pledge)
+        assert savings.waste_saving == 13.5
+        assert savings.co2_saving == 1.2
+
+
+@pytest.mark.django_db
+class TestPledgeTotals:
+    """Tests for the incrementally maintained ``PledgeTotals``."""
+
+    def test_totals_follow_pledges(self, pledge):
+        """Test that the totals are updated when pledges are added and their answers change."""
+        pledge = pledge(True)
+        assert PledgeTotals.objects.get_totals() == {
+            "amount_of_pledges": 1,
+            "co2_saving": 1.2,
+            "water_saving": 2.0,
+            "waste_saving": 13.5,
+        }
+
+        second = Pledge.objects.create(
+            action=pledge.action, user=User.objects.create(username="second_user")
+        )
+        food_pledge = FoodPledge.objects.get(pledge_id=pledge)
+        food_pledge.current_meals = 10
+        food_pledge.save()
+
+        assert PledgeTotals.objects.get_totals() == {
+            "amount_of_pledges": 2,
+            "co2_saving": 2.4,
+            "water_saving": 8.0,
+            "waste_saving": 54.0,
+        }
+
+        second.delete()
+        assert PledgeTotals.objects.get_totals()["amount_of_pledges"] == 1
+        assert PledgeTotals.objects.get_totals()["water_saving"] == 4.0
+
+    def test_totals_on_cascade(self, pledge):
+        """Test that pledges deleted through their user are removed from the totals."""
+        pledge = pledge(True)
+        pledge.user.delete()
+
+        assert PledgeTotals.objects.get_totals() == {
+            "amount_of_pledges": 0,
+            "co2_saving": 0,
+            "water_saving": 0,
+            "waste_saving": 0,
+        }
+
+    def test_cascade_removes_savings_once(self, pledge):
+        """Test that the savings of the pledges deleted with their user or in bulk are summed
+        once per aggregate rather than once per pledge."""
+        pledge = pledge(True)
+        actions = [
+            Action.objects.create(action=f"action {index}", question_text="?", version="1.0")
+            for index in range(6)
+        ]
+        user = User.objects.create(username="six")
+        for action in actions:
+            Pledge.objects.create(action=action, user=user)
+
+        with CaptureQueriesContext(connection) as queries:
+            user.delete()
+        sums = [query for query in queries if 'COUNT("pledges_pledgesavings"' in query["sql"]]
+        assert len(sums) == 3
+
+        for action in actions:
+            Pledge.objects.create(action=action, user=pledge.user)
+        Pledge.objects.filter(action__in=actions[:3]).delete()
+        assert PledgeTotals.objects.get_totals()["amount_of_pledges"] == 4
+        assert UserSavings.objects.get().amount_of_pledges == 4
+        assert PledgeTotals.objects.get_totals() == Pledge.objects.total_savings()
+
+    def test_rebuild_totals_command(self, pledge):
+        """Test that ``rebuild_totals`` detects and repairs drift."""
+        pledge(True)
+        PledgeTotals.objects.update(amount_of_pledges=5, co2_saving=0)
+
+        with pytest.raises(CommandError, match="amount_of_pledges"):
+            call_command("rebuild_totals", check=True, stdout=StringIO())
+
+        call_command("rebuild_totals", stdout=StringIO())
+        call_command("rebuild_totals", check=True, stdout=StringIO())
+        assert PledgeTotals.objects.get_totals()["co2_saving"] == 1.2
+
+    def test_check_without_stored_savings(self, pledge):
+        """Test that pledges without stored savings are not reported as drift after a rebuild."""
+        pledge = pledge(True)
+        PledgeSavings.objects.filter(pledge=pledge).delete()
+        call_command("rebuild_totals", stdout=StringIO())
+
+        stdout = StringIO()
+        call_command("rebuild_totals", check=True, stdout=stdout)
+        assert "correct" in stdout.getvalue()
+
+    def test_sharded_totals(self, pledge, settings):
+        """Test that the totals are spread over the shards and summed when read."""
+        settings.PLEDGES_TOTALS_SHARDS = 4
+        pledge = pledge(True)
+        for index in range(30):
+            Pledge.objects.create(
+                action=pledge.action, user=User.objects.create(username=f"user_{index}")
+            )
+
+        assert 1 < PledgeTotals.objects.count() <= 4
+        assert PledgeTotals.objects.get_totals() == Pledge.objects.total_savings()
+
+    def test_compact_totals_command(self, pledge, settings):
+        """Test that ``compact_totals`` folds the shards into one without changing the totals."""
+        settings.PLEDGES_TOTALS_SHARDS = 4
+        pledge = pledge(True)
+        for index in range(30):
+            Pledge.objects.create(
+                action=pledge.action, user=User.objects.create(username=f"user_{index}")
+            )
+        updated = PledgeTotals.objects.last_updated()
+
+        call_command("compact_totals", stdout=StringIO())
+
+        assert list(PledgeTotals.objects.values_list("pk", flat=True)) == [1]
+        assert PledgeTotals.objects.get_totals() == Pledge.objects.total_savings()
+        assert PledgeTotals.objects.last_updated() == updated
+
+
+@pytest.mark.django_db
+class TestSavingsRollup:
+    """Tests for the incrementally maintained ``SavingsRollup``."""
+
+    def rollups(self):
+        """Return the rollups with pledges, their shards summed, as
+        ``{(period, start): (amount_of_pledges, water_saving)}``."""
+        rows = SavingsRollup.objects.values("period", "start").annotate(
+            amount=Sum("amount_of_pledges"), water=Sum("water_saving")
+        )
+        return {
+            (row["period"], row["start"]): (row["amount"], round(row["water"], 3))
+            for row in rows
+            if row["amount"]
+        }
+
+    def test_rollups_follow_pledges(self, pledge):
+        """Test that pledges are added to the day, week and month they were made in."""
+        pledge = pledge(True)
+        Pledge.objects.filter(pk=pledge.pk).update(
+            created=datetime(2026, 10, 17, 12, tzinfo=timezone.utc)
+        )
+        SavingsRollup.objects.rebuild()
+
+        second = Pledge.objects.create(
+            action=pledge.action,
+            user=User.objects.create(username="second_user"),
+            created=datetime(2026, 10, 1, tzinfo=timezone.utc),
+        )
+        assert self.rollups() == {
+            ("day", date(2026, 10, 17)): (1, 2.0),
+            ("day", date(2026, 10, 1)): (1, 2.0),
+            ("week", date(2026, 10, 12)): (1, 2.0),
+            ("week", date(2026, 9, 28)): (1, 2.0),
+            ("month", date(2026, 10, 1)): (2, 4.0),
+        }
+
+        food_pledge = FoodPledge.objects.get(pledge_id=pledge)
+        food_pledge.current_meals = 10
+        food_pledge.save()
+        second.delete()
+        assert self.rollups() == {
+            ("day", date(2026, 10, 17)): (1, 4.0),
+            ("week", date(2026, 10, 12)): (1, 4.0),
+            ("month", date(2026, 10, 1)): (1, 4.0),
+        }
+
+    def test_pledge_moved(self, pledge):
+        """Test that a pledge whose date changes is moved to its new rollups."""
+        pledge = pledge(True)
+        pledge.created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        pledge.save()
+
+        assert self.rollups() == {
+            ("day", date(2025, 1, 1)): (1, 2.0),
+            ("week", date(2024, 12, 30)): (1, 2.0),
+            ("month", date(2025, 1, 1)): (1, 2.0),
+        }
+
+    def test_concurrent_first_contribution(self, pledge, monkeypatch):
+        """Test that savings are added to a rollup another transaction created meanwhile."""
+        pledge = pledge(True)
+        SavingsRollup.objects.compact()
+        rollup = SavingsRollup.objects.get(period="month")
+        update = QuerySet.update
+        calls = []
+
+        def lost_race(queryset, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        monkeypatch.setattr(QuerySet, "update", lost_race)
+        lookup = {
+            "action_id": rollup.action_id,
+            "period": "month",
+            "start": rollup.start,
+            "shard": rollup.shard,
+        }
+        savings = dict.fromkeys(models.SAVINGS_TOTALS, 1)
+        models._add_savings(SavingsRollup.objects, [(lookup, savings)], 1)
+
+        assert len(calls) == 2
+        assert SavingsRollup.objects.get(pk=rollup.pk).amount_of_pledges == 2
+
+    def test_trend(self, pledge):
+        """Test that the trend sums the rollups of every action per period."""
+        pledge = pledge(True)
+        start = pledge.created.date().replace(day=1)
+
+        trend = list(SavingsRollup.objects.trend("month"))
+        assert trend == [
+            {
+                "start": start,
+                "amount_of_pledges": 1,
+                "co2_saving": 1.2,
+                "water_saving": 2.0,
+                "waste_saving": 13.5,
+            }
+        ]
+        assert not SavingsRollup.objects.trend("month", since=date(2100, 1, 1)).exists()
+
+    def test_rebuild_rollups_command(self, pledge):
+        """Test that ``rebuild_rollups`` recreates the rollups."""
+        pledge(True)
+        expected = self.rollups()
+        SavingsRollup.objects.update(amount_of_pledges=5)
+
+        call_command("rebuild_rollups", stdout=StringIO())
+        assert self.rollups() == expected
+
+    def test_failed_rebuild(self, pledge, monkeypatch):
+        """Test that the rollups and user savings are kept when their rebuild fails."""
+        pledge(True)
+        expected = self.rollups()
+
+        def fail(manager, pledges, *args, **kwargs):
+            raise RuntimeError("rebuild failed")
+
+        for manager in (SavingsRollup.objects, UserSavings.objects):
+            monkeypatch.setattr(type(manager), "contribute", fail)
+            with pytest.raises(RuntimeError):
+                manager.rebuild()
+        assert self.rollups() == expected
+        assert UserSavings.objects.get().amount_of_pledges == 1
+
+    def test_sharded_rollups(self, pledge, settings):
+        """Test that the rollups are spread over the shards and folded by ``compact_totals``."""
+        settings.PLEDGES_ROLLUP_SHARDS = 4
+        pledge = pledge(True)
+        users = [User.objects.create(username=f"user_{index}") for index in range(30)]
+        for user in users:
+            Pledge.objects.create(action=pledge.action, user=user)
+        Pledge.objects.filter(user__in=users[:10]).delete()
+        expected = self.rollups()
+        assert expected[("month", pledge.created.date().replace(day=1))] == (21, 42.0)
+        assert SavingsRollup.objects.filter(period="month").count() > 1
+        assert SavingsRollup.objects.by_action()[0]["amount_of_pledges"] == 21
+
+        call_command("compact_totals", stdout=StringIO())
+
+        assert set(SavingsRollup.objects.values_list("shard", flat=True)) == {1}
+        assert SavingsRollup.objects.count() == 3
+        assert self.rollups() == expected
+
+        Pledge.objects.all().delete()
+        call_command("compact_totals", stdout=StringIO())
+        assert not SavingsRollup.objects.exists()
+        assert SavingsRollup.objects.by_action() == []
+
+
+@pytest.mark.django_db
+class TestUserSavings:
+    """Tests for the incrementally maintained ``UserSavings`` of the leaderboard."""
+
+    def leaderboard(self, saving):
+        """Return the usernames and savings of the top users."""
+        return [
+            (summary.user.username, getattr(summary, saving))
+            for summary in UserSavings.objects.top(saving)
+        ]
+
+    def test_user_savings_follow_pledges(self, pledge):
+        """Test that the savings of users follow their pledges and answers."""
+        pledge = pledge(True)
+        second = Pledge.objects.create(
+            action=pledge.action, user=User.objects.create(username="second_user")
+        )
+        assert self.leaderboard("water_saving") == [("test_user", 2.0), ("second_user", 2.0)]
+
+        food_pledge = FoodPledge.objects.get(pledge_id=pledge)
+        food_pledge.current_meals = 10
+        food_pledge.save()
+        action = Action.objects.get(pk=pledge.action.pk)
+        action.pk = None
+        action.version = "version 2.0"
+        action.save()
+        second.user = pledge.user
+        second.action = action
+        second.save()
+        assert self.leaderboard("water_saving") == [("test_user", 8.0)]
+        assert UserSavings.objects.get(user=pledge.user).amount_of_pledges == 2
+
+    def test_formula_version_changed(self, pledge):
+        """Test that the savings of users are updated when an action's formula changes."""
+        pledge = pledge(True)
+        pledge.action.co2_formula = "2 * vegetarian_meals"
+        pledge.action.version = "version 2.0"
+        pledge.action.save()
+
+        assert self.leaderboard("co2_saving") == [("test_user", 6.0)]
+
+    def test_user_without_pledges_removed(self, pledge):
+        """Test that users whose pledges are all deleted leave the leaderboard."""
+        pledge = pledge(True)
+        second = Pledge.objects.create(
+            action=pledge.action, user=User.objects.create(username="second_user")
+        )
+        second.delete()
+
+        assert self.leaderboard("co2_saving") == [("test_user", 1.2)]
+
+    def test_rebuild_leaderboard_command(self, pledge):
+        """Test that ``rebuild_leaderboard`` recreates the savings of the users."""
+        pledge(True)
+        UserSavings.objects.all().delete()
+
+        call_command("rebuild_leaderboard", stdout=StringIO())
+        assert self.leaderboard("waste_saving") == [("test_user", 13.5)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failed_pledge_change():
+    """Test that the aggregates are left alone when saving a changed pledge fails."""
+    user = User.objects.create(username="mover")
+    pledges = []
+    for name in ("first", "second"):
+        action = Action.objects.create(
+            action=name, question_text="?", version="1.0", co2_formula="3 * meals"
+        )
+        pledges.append(Pledge.objects.create(action=action, user=user))
+        Answer.objects.create(pledge=pledges[-1], question="meals", value=1)
+    refresh_savings(Pledge.objects.all())
+    totals = PledgeTotals.objects.get_totals()
+    rollups = list(SavingsRollup.objects.by_action())
+
+    pledges[1].action = pledges[0].action
+    with pytest.raises(IntegrityError):
+        pledges[1].save()
+
+    assert PledgeTotals.objects.get_totals() == totals == {
+        "amount_of_pledges": 2, "co2_saving": 6.0, "water_saving": 0, "waste_saving": 0
+    }
+    assert list(SavingsRollup.objects.by_action()) == rollups
+    assert UserSavings.objects.get().co2_saving == 6.0
@@ -0,0 +1,62 @@
+import pytest
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from pledges.models import UsernameTrigram
+from pledges.search import search_usernames, similarity, trigrams
+
+
+class TestTrigrams:
+    """Tests for the trigram helpers."""
+
+    def test_trigrams(self):
+        """Test that text is lowercased and padded before it is split."""
+        assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+
+    def test_similarity(self):
+        """Test the similarity of identical, similar and different text."""
+        assert similarity("alice", "alice") == 1
+        assert 0 < similarity("alice", "alcie") < 1
+        assert similarity("alice", "bob") == 0
+
+
+@pytest.mark.django_db
+class TestSearchUsernames:
+    """Tests for ``search_usernames``."""
+
+    @pytest.fixture
+    def users(self):
+        """Add a few users."""
+        for username in ("alice", "alicia", "alfred", "bob", "robert"):
+            User.objects.create(username=username)
+
+    def test_index_kept_in_sync(self, users):
+        """Test that renaming a user replaces the stored trigrams."""
+        user = User.objects.get(username="bob")
+        user.username = "bobby"
+        user.save()
+
+        stored = set(UsernameTrigram.objects.filter(user=user).values_list("trigram", flat=True))
+        assert stored == trigrams("bobby")
+
+    def test_prefix(self, users):
+        """Test that usernames starting with the query come first."""
+        assert search_usernames("ali", limit=2) == ["alice", "alicia"]
+
+    def test_typo(self, users):
+        """Test that usernames resembling the query are found."""
+        assert search_usernames("alcie")[0] == "alice"
+        assert "robert" in search_usernames("robret")
+
+    def test_no_match(self, users):
+        """Test that unrelated queries find nothing."""
+        assert search_usernames("zzz") == []
+        assert search_usernames("") == []
+
+    def test_search_view_suggestions(self, users):
+        """Test that ``search_view`` suggests usernames when there are no pledges."""
+        response = Client().get("/search/?user=alcie")
+
+        assert not response.context["pledges"]
+        assert response.context["matches"][0] == "alice"
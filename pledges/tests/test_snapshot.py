@@ -0,0 +1,118 @@
+import gzip
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import RequestFactory
+
+from pledges import snapshot
+from pledges.models import Action, Pledge
+from pledges.snapshot import home_snapshot_view, load_manifest, publish_home
+
+
+@pytest.fixture
+def snapshot_dir(settings, tmp_path):
+    """Write the snapshot of the home page to a temporary directory."""
+    settings.PLEDGES_SNAPSHOT_DIR = tmp_path
+    return tmp_path
+
+
+@pytest.mark.django_db
+class TestSnapshot:
+    """Tests for the pre-rendered snapshot of the home page."""
+    factory = RequestFactory()
+
+    def test_publish_home(self, pledge, snapshot_dir):
+        """Test that the home page is written with a gzip compressed variant."""
+        pledge(True)
+        manifest = publish_home()
+
+        content = (snapshot_dir / "home.html").read_bytes()
+        assert b"version 1.0" in content
+        assert gzip.decompress((snapshot_dir / "home.html.gz").read_bytes()) == content
+        assert "gzip" in manifest["encodings"]
+        assert load_manifest() == manifest
+
+    def test_serve_snapshot(self, pledge, snapshot_dir):
+        """Test that the accepted variant is served with validators."""
+        pledge(True)
+
+        response = home_snapshot_view(self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        assert response.status_code == 200
+        assert response["Content-Encoding"] == "gzip"
+        assert response["Vary"] == "Accept-Encoding"
+        assert b"version 1.0" in gzip.decompress(response.content)
+
+        plain = home_snapshot_view(self.factory.get("/"))
+        assert not plain.has_header("Content-Encoding")
+        assert plain["ETag"] != response["ETag"]
+
+        not_modified = home_snapshot_view(
+            self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        )
+        assert not_modified.status_code == 304
+
+    def test_stale_snapshot(self, pledge, snapshot_dir):
+        """Test that a snapshot that missed a change is published again when it is served."""
+        pledge = pledge(True)
+        first = home_snapshot_view(self.factory.get("/"))
+        Pledge.objects.create(action=pledge.action, user=User.objects.create(username="second"))
+
+        response = home_snapshot_view(
+            self.factory.get("/", HTTP_IF_NONE_MATCH=first["ETag"])
+        )
+        assert response.status_code == 200
+        assert response["ETag"] != first["ETag"]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_published_on_change(self, snapshot_dir, settings, user, monkeypatch):
+        """Test that the snapshot is published once in the background after the totals
+        change."""
+        settings.PLEDGES_STATIC_HOME = True
+        settings.PLEDGES_SNAPSHOT_DELAY = 0.2
+        published = []
+        monkeypatch.setattr(
+            snapshot, "publish_home", lambda: published.append(1) or publish_home()
+        )
+        action = Action.objects.create(action="food", question_text="Meals?", version="1.0")
+        Pledge.objects.create(action=action, user=user)
+        timer = snapshot._publish_timer
+        Pledge.objects.create(action=action, user=User.objects.create(username="second"))
+
+        assert not published
+        assert snapshot._publish_timer is timer
+        timer.join()
+        assert published == [1]
+        assert b"<td>2</td>" in (snapshot_dir / "home.html").read_bytes()
+
+    def test_accepted_encoding(self, pledge, snapshot_dir):
+        """Test that the quality values of the accepted encodings are respected."""
+        pledge(True)
+
+        for accepted, encoding in [
+            ("gzip;q=0", None),
+            ("gzip; q=0.0, identity", None),
+            ("deflate, *;q=0.5", "gzip"),
+            ("br;q=0, gzip;q=0.8", "gzip"),
+            ("GZIP", "gzip"),
+            ("x-gzip", None),
+        ]:
+            response = home_snapshot_view(self.factory.get("/", HTTP_ACCEPT_ENCODING=accepted))
+            assert response.get("Content-Encoding") == encoding, accepted
+
+    def test_publish_home_command(self, snapshot_dir):
+        """Test ``publish_home``."""
+        stdout = StringIO()
+        call_command("publish_home", stdout=stdout)
+
+        assert (snapshot_dir / "home.html").exists()
+        assert "gzip" in stdout.getvalue()
+
+
+def test_cached_template_loader():
+    """Test that the templates are compiled once and kept in memory."""
+    assert isinstance(engines["django"].engine.template_loaders[0], CachedLoader)
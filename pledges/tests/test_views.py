@@ -1,6 +1,12 @@
 import pytest
 
-from django.test import Client
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import Client, RequestFactory
+
+from pledges import routers, views
+
+from pledges.models import Action, Pledge, PledgeSavings
 
 
 @pytest.mark.django_db
@@ -18,6 +24,17 @@ class TestViews:
         assert response.context["total_co2_savings"] == 1.2
         assert response.context["total_water_savings"] == 2.0
         assert response.context["total_waste_savings"] == 13.5
+        assert response.context["actions"] == [
+            {
+                "action": "test action",
+                "version": "version 1.0",
+                "amount_of_pledges": 1,
+                "co2_saving": 1.2,
+                "water_saving": 2.0,
+                "waste_saving": 13.5,
+            }
+        ]
+        assert b"version 1.0" in response.content
 
     def test_search_view_existing_user(self, pledge):
         """Test ``search_view`` with an existing user."""
@@ -37,3 +54,155 @@ class TestViews:
         assert response.status_code == 200
 
         assert not response.context["pledges"]
+
+
+@pytest.mark.django_db
+class TestViewQueries:
+    """Tests for the number of queries the views make."""
+    client = Client()
+
+    @pytest.fixture
+    def many_pledges(self, pledge):
+        """Add pledges by the test user towards several versions of the test action."""
+        pledge = pledge(True)
+        for version in range(2, 22):
+            action = Action.objects.get(pk=pledge.action.pk)
+            action.pk = None
+            action.version = f"version {version}.0"
+            action.save()
+            Pledge.objects.create(action=action, user=pledge.user)
+
+    def test_search_view_stored_savings(self, many_pledges, django_assert_num_queries):
+        """Test that the stored savings of every pledge are loaded with a single query."""
+        with django_assert_num_queries(1):
+            response = self.client.get("/search/?user=test_user")
+
+        assert len(response.context["pledges"]) == 21
+        assert all(pledge["co2_saving"] == 1.2 for pledge in response.context["pledges"])
+
+    def test_search_view_calculated_savings(self, many_pledges, django_assert_num_queries):
+        """Test that the answers of pledges without stored savings are loaded in bulk."""
+        PledgeSavings.objects.all().delete()
+        with django_assert_num_queries(2):
+            response = self.client.get("/search/?user=test_user")
+
+        assert len(response.context["pledges"]) == 21
+        assert all(pledge["waste_saving"] == 13.5 for pledge in response.context["pledges"])
+
+    def test_home_view(self, many_pledges, django_assert_num_queries):
+        """Test that the home page reads the totals and the totals per action with a query
+        each, whatever the number of actions.
+        """
+        with django_assert_num_queries(2):
+            response = self.client.get("/")
+
+        assert response.context["amount_of_pledges"] == 21
+        assert len(response.context["actions"]) == 21
+        assert all(action["amount_of_pledges"] == 1 for action in response.context["actions"])
+
+    def test_leaderboard_view(self, many_pledges, django_assert_num_queries):
+        """Test that the leaderboard reads the top users with a query per saving."""
+        Pledge.objects.create(
+            action=Action.objects.first(), user=User.objects.create(username="second_user")
+        )
+        with django_assert_num_queries(3):
+            response = self.client.get("/leaderboard/")
+
+        assert response.context["leaderboards"]["co2_saving"] == [
+            {"username": "test_user", "amount_of_pledges": 21, "saving": 25.2},
+            {"username": "second_user", "amount_of_pledges": 1, "saving": 1.2},
+        ]
+        assert response.context["leaderboards"]["waste_saving"][1]["saving"] == 13.5
+
+
+@pytest.mark.django_db
+class TestSearchPagination:
+    """Tests for the cursor pagination and streaming of ``search_view``."""
+    client = Client()
+
+    @pytest.fixture
+    def pledges(self, pledge):
+        """Add pledges by the test user towards five versions of the test action."""
+        pledge = pledge(True)
+        for version in range(2, 6):
+            action = Action.objects.get(pk=pledge.action.pk)
+            action.pk = None
+            action.version = f"version {version}.0"
+            action.save()
+            Pledge.objects.create(action=action, user=pledge.user)
+        return list(Pledge.objects.order_by("pk").values_list("pk", flat=True))
+
+    def test_pages(self, pledges, monkeypatch):
+        """Test that the cursor leads through every page."""
+        monkeypatch.setattr(views, "SEARCH_PAGE_SIZE", 2)
+
+        response = self.client.get("/search/?user=test_user")
+        assert len(response.context["pledges"]) == 2
+        assert response.context["next_cursor"] == pledges[1]
+
+        response = self.client.get(f"/search/?user=test_user&after={pledges[3]}")
+        assert len(response.context["pledges"]) == 1
+        assert response.context["next_cursor"] is None
+
+    def test_stream_csv(self, pledges, monkeypatch):
+        """Test that every pledge is streamed when the chunks are smaller than the results."""
+        monkeypatch.setattr(views, "STREAM_CHUNK_SIZE", 2)
+
+        response = self.client.get("/search/?user=test_user&format=csv")
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv"
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[0] == "username,action,co2_saving,water_saving,waste_saving"
+        assert lines[1:] == ["test_user,test action,1.2,2.0,13.5"] * 5
+
+    def test_stream_csv_database(self, pledges, monkeypatch):
+        """Test that the stream reads from the database chosen when the response was built."""
+        monkeypatch.setattr(views, "STREAM_CHUNK_SIZE", 2)
+        monkeypatch.setattr(routers, "replica_alias", lambda: "default")
+        PledgeSavings.objects.all().delete()
+        request = RequestFactory().get("/search/", {"user": "test_user", "format": "csv"})
+        response = views.search_view(request)
+
+        # The view returned, so reads routed from here on would no longer use the replica.
+        monkeypatch.setattr(routers.ReplicaRouter, "db_for_read", lambda *args, **hints: "missing")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[1:] == ["test_user,test action,1.2,2.0,13.5"] * 5
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    """Tests for the async views."""
+
+    def test_async_home_view(self, pledge):
+        """Test ``async_home_view``."""
+        pledge(True)
+        response = async_to_sync(views.async_home_view)(RequestFactory().get("/"))
+
+        assert response.status_code == 200
+        assert b"<td>1.2</td>" in response.content
+        assert b"<td>13.5</td>" in response.content
+
+    def test_async_search_view(self, pledge):
+        """Test ``async_search_view``."""
+        pledge(True)
+        request = RequestFactory().get("/search/", {"user": "test_user"})
+        response = async_to_sync(views.async_search_view)(request)
+
+        assert response.status_code == 200
+        assert b"<td>test_user</td>" in response.content
+        assert b"<td>2.0</td>" in response.content
+
+    def test_async_search_view_csv(self, pledge, monkeypatch):
+        """Test that ``async_search_view`` serves every pledge as a CSV file."""
+        monkeypatch.setattr(views, "CSV_SPOOL_SIZE", 10)
+        pledge(True)
+        request = RequestFactory().get("/search/", {"user": "test_user", "format": "csv"})
+        response = async_to_sync(views.async_search_view)(request)
+
+        assert response["Content-Type"] == "text/csv"
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines == [
+            "username,action,co2_saving,water_saving,waste_saving",
+            "test_user,test action,1.2,2.0,13.5",
+        ]
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from django.test import Client
+
+from pledges import formulas, warmup
+
+
+@pytest.fixture
+def cold_worker(monkeypatch, settings):
+    """Start a test with warmup enabled on a worker that has not been warmed up."""
+    settings.PLEDGES_WARMUP = True
+    monkeypatch.setattr(warmup, "_ready", threading.Event())
+    formulas.clear_cache()
+
+
+@pytest.mark.django_db
+class TestWarmup:
+    """Tests for the warmup of a worker."""
+    client = Client()
+
+    def test_warmup(self, cold_worker, action, caplog):
+        """Test that the formulas are compiled and the time the warmup took is logged."""
+        action = action(True)
+        with caplog.at_level(logging.INFO, logger="pledges.warmup"):
+            assert warmup.warmup()
+
+        assert (action.pk, action.version, "co2_formula") in formulas._cache
+        assert "Warmup took" in caplog.text
+        assert "formulas" in caplog.text
+
+    def test_readiness(self, cold_worker):
+        """Test that the worker is only ready once it is warmed up."""
+        assert not warmup.is_ready()
+
+        response = self.client.get("/ready/")
+        assert response.status_code == 200
+        assert response.json()["ready"]
+        assert set(response.json()["warmup_ms"]) == {
+            "urls", "templates", "database", "formulas", "total"
+        }
+        assert warmup.is_ready()
+
+    def test_failed_warmup(self, cold_worker, monkeypatch):
+        """Test that a worker whose warmup failed is not ready."""
+        def fail():
+            raise RuntimeError("database is down")
+
+        monkeypatch.setattr(warmup, "STEPS", [("database", fail)])
+        response = self.client.get("/ready/")
+
+        assert response.status_code == 503
+        assert not warmup.is_ready()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_warmup_on_load(self, cold_worker, monkeypatch):
+        """Test that the warmup succeeds in an event loop and closes its connections."""
+        closed = []
+        close_all = warmup.connections.close_all
+        monkeypatch.setattr(
+            warmup.connections,
+            "close_all",
+            lambda: closed.append(threading.current_thread().name) or close_all(),
+        )
+
+        async def load():
+            return warmup.warmup_on_load()
+
+        assert asyncio.run(load())
+        assert warmup.is_ready()
+        assert closed == ["pledges-warmup"]
+
+    def test_warmup_disabled(self, settings, monkeypatch):
+        """Test that a worker without a warmup phase is always ready."""
+        settings.PLEDGES_WARMUP = False
+        monkeypatch.setattr(warmup, "_ready", threading.Event())
+
+        assert warmup.is_ready()
@@ -1,9 +1,38 @@
+from django.conf import settings
 from django.urls import path
 
-from . views import home_view, search_view
+from . views import (
+    async_home_view,
+    async_leaderboard_view,
+    async_search_view,
+    home_view,
+    leaderboard_view,
+    search_view,
+)
+from . snapshot import home_snapshot_view
+from . warmup import readiness_view
+from . api import actions_api_view, totals_api_view, trends_api_view, user_pledges_api_view
 
 
+ASYNC_VIEWS = getattr(settings, "PLEDGES_ASYNC_VIEWS", False)
+STATIC_HOME = getattr(settings, "PLEDGES_STATIC_HOME", False)
+
+if STATIC_HOME:
+    home_page_view = home_snapshot_view
+else:
+    home_page_view = async_home_view if ASYNC_VIEWS else home_view
+
 urlpatterns = [
-    path('', home_view, name="home_page"),
-    path('search/', search_view, name="search")
-]
\ No newline at end of file
+    path('', home_page_view, name="home_page"),
+    path('search/', async_search_view if ASYNC_VIEWS else search_view, name="search"),
+    path(
+        'leaderboard/',
+        async_leaderboard_view if ASYNC_VIEWS else leaderboard_view,
+        name="leaderboard",
+    ),
+    path('ready/', readiness_view, name="ready"),
+    path('api/totals/', totals_api_view, name="api_totals"),
+    path('api/actions/', actions_api_view, name="api_actions"),
+    path('api/trends/', trends_api_view, name="api_trends"),
+    path('api/users/<str:username>/pledges/', user_pledges_api_view, name="api_user_pledges"),
+]
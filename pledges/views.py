@@ -1,41 +1,72 @@
+import csv
+import io
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.db import router
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import render
 
-from .models import Pledge
+from .cache import cached
+from .instrumentation import timed
+from .models import (
+    SAVINGS_FORMULAS,
+    Pledge,
+    PledgeTotals,
+    SavingsRollup,
+    UserSavings,
+    prefetch_answers,
+)
+from .routers import use_replica
+from .search import search_usernames
+
+SEARCH_PAGE_SIZE = 50
+STREAM_CHUNK_SIZE = 2000
+CSV_SPOOL_SIZE = 1024 * 1024
+LEADERBOARD_SIZE = 10
 
 
+@use_replica
 def home_view(request):
     """Home page view.
 
+    Shows the totals and the totals per action and version. The context is cached until the
+    pledges, actions or answers change.
+
     :param request: The ``GET`` request object.
     :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
 
     :return: HttpResponse object.
     :rtype: class:`django.http.response.HttpResponse`.
     """
-    pledges = Pledge.objects.all()
-
-    total_co2_savings = 0
-    total_water_savings = 0
-    total_waste_savings = 0
-
-    for pledge in pledges:
-        total_co2_savings += pledge.co2_saving if pledge.co2_saving else 0
-        total_water_savings += pledge.water_saving if pledge.water_saving else 0
-        total_waste_savings += pledge.waste_saving if pledge.waste_saving else 0
-
-    context = {
-        "amount_of_pledges": len(pledges),
-        "total_co2_savings": round(total_co2_savings, 3),
-        "total_water_savings": round(total_water_savings, 3),
-        "total_waste_savings": round(total_waste_savings, 3),
-    }
+    context = cached("home", home_context)
+    with timed("template"):
+        return render(request, "home_page.html", context=context)
 
-    return render(request, "home_page.html", context=context)
 
+def home_context():
+    """Return the context of the home page."""
+    totals = PledgeTotals.objects.get_totals()
 
+    return {
+        "amount_of_pledges": totals["amount_of_pledges"],
+        "total_co2_savings": totals["co2_saving"],
+        "total_water_savings": totals["water_saving"],
+        "total_waste_savings": totals["waste_saving"],
+        "actions": SavingsRollup.objects.by_action(),
+    }
+
+
+@use_replica
 def search_view(request):
     """Search for specific users.
 
+    The results are paginated with a cursor: the ``after`` parameter holds the id of the last
+    pledge on the previous page. If the user has no pledges, the usernames that start with or
+    resemble the search are suggested instead. With ``format=csv`` every pledge of the user is
+    streamed as CSV instead, in chunks of ``STREAM_CHUNK_SIZE`` pledges. The stream is read
+after the view returned, so its queries are bound to the database chosen for the request.
+
     :param request: The ``GET`` request object.
     :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
 
@@ -43,18 +74,191 @@ def search_view(request):
     :rtype: class:`django.http.response.HttpResponse`.
     """
     user = request.GET.get("user")
-    pledges = Pledge.objects.filter(user__username=user)
 
-    user_pledges = []
+    if request.GET.get("format") == "csv":
+        writer = csv.writer(_Echo())
+        pledges = _user_pledges(user).using(router.db_for_read(Pledge))
+        rows = (writer.writerow(row) for row in _csv_rows(pledges))
+        response = StreamingHttpResponse(rows, content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="pledges.csv"'
+        return response
+
+    context = _search_context(user, _cursor(request))
+    with timed("template"):
+        return render(request, "search_results.html", context=context)
+
+
+@use_replica
+async def async_home_view(request):
+    """Home page view for the ASGI deployment.
+
+    The cache and database are read in the thread that runs the synchronous code, so waiting
+    for them does not block the event loop.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.asgi.ASGIRequest`.
+
+    :return: HttpResponse object.
+    :rtype: class:`django.http.response.HttpResponse`.
+    """
+    context = await sync_to_async(cached)("home", home_context)
+    with timed("template"):
+        return render(request, "home_page.html", context=context)
+
+
+@use_replica
+async def async_search_view(request):
+    """Search for specific users, for the ASGI deployment.
+
+    Behaves like ``search_view``. Django cannot read the database while an ASGI response is
+    streamed, so with ``format=csv`` the CSV is first written in the synchronous thread to a
+    temporary file, which spills to disk once it grows, and the file is then streamed.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.asgi.ASGIRequest`.
+
+    :return: HttpResponse object.
+    :rtype: class:`django.http.response.HttpResponse`.
+    """
+    user = request.GET.get("user")
+
+    if request.GET.get("format") == "csv":
+        csv_file = await sync_to_async(_spool_csv)(_user_pledges(user))
+        return FileResponse(
+            csv_file, as_attachment=True, filename="pledges.csv", content_type="text/csv"
+        )
+
+    context = await sync_to_async(_search_context)(user, _cursor(request))
+    with timed("template"):
+        return render(request, "search_results.html", context=context)
+
+
+@use_replica
+def leaderboard_view(request):
+    """The users that saved the most CO2, water and waste.
+
+    The context is cached until the pledges, actions or answers change.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+
+    :return: HttpResponse object.
+    :rtype: class:`django.http.response.HttpResponse`.
+    """
+    context = cached("leaderboard", _leaderboard_context)
+    with timed("template"):
+        return render(request, "leaderboard.html", context=context)
+
+
+@use_replica
+async def async_leaderboard_view(request):
+    """The leaderboard view for the ASGI deployment.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.asgi.ASGIRequest`.
+
+    :return: HttpResponse object.
+    :rtype: class:`django.http.response.HttpResponse`.
+    """
+    context = await sync_to_async(cached)("leaderboard", _leaderboard_context)
+    with timed("template"):
+        return render(request, "leaderboard.html", context=context)
+
+
+def _leaderboard_context():
+    """Return the context of the leaderboard, with the top users for every saving."""
+    leaderboards = {}
+    for saving in SAVINGS_FORMULAS:
+        leaderboards[saving] = [
+            {
+                "username": summary.user.username,
+                "amount_of_pledges": summary.amount_of_pledges,
+                "saving": round(getattr(summary, saving), 3),
+            }
+            for summary in UserSavings.objects.top(saving, LEADERBOARD_SIZE)
+        ]
+    return {"leaderboards": leaderboards}
+
+
+def _cursor(request):
+    """Return the id of the last pledge on the previous page, ``0`` for the first page."""
+    try:
+        return int(request.GET.get("after", 0))
+    except ValueError:
+        return 0
+
+
+def _user_pledges(user):
+    """Return the pledges of a user, ordered by id and with their savings selected."""
+    return Pledge.objects.filter(user__username=user).with_savings().order_by("pk")
+
+
+def _search_context(user, after):
+    """Return the context of a page of search results."""
+    page = list(_user_pledges(user).filter(pk__gt=after)[:SEARCH_PAGE_SIZE + 1])
+    next_cursor = page[SEARCH_PAGE_SIZE - 1].pk if len(page) > SEARCH_PAGE_SIZE else None
+    page = page[:SEARCH_PAGE_SIZE]
+    prefetch_answers(page)
+
+    return {
+        "user": user,
+        "pledges": [pledge_row(pledge) for pledge in page],
+        "next_cursor": next_cursor,
+        "matches": [] if page or after else search_usernames(user),
+    }
+
+
+def pledge_row(pledge):
+    """Return the data shown for a pledge.
+
+    :param pledge: A pledge loaded with ``PledgeQuerySet.with_savings``.
+    :ptype pledge: class:`pledges.models.Pledge`.
+
+    :return: The username, action and savings of the pledge.
+    :rtype: dict.
+    """
+    return {
+        "username": pledge.user.username,
+        "action": pledge.action.action,
+        **pledge.get_savings(),
+    }
+
+
+def _iter_chunks(pledges, chunk_size):
+    """Yield the pledges in chunks, paginating on their id so memory use stays bounded."""
+    after = 0
+    while True:
+        chunk = list(pledges.filter(pk__gt=after)[:chunk_size])
+        if not chunk:
+            return
+        prefetch_answers(chunk)
+        yield chunk
+        after = chunk[-1].pk
+
+
+def _csv_rows(pledges):
+    """Yield the CSV header and a CSV row for every pledge."""
+    columns = ["username", "action", *SAVINGS_FORMULAS]
+    yield columns
+    for chunk in _iter_chunks(pledges, STREAM_CHUNK_SIZE):
+        for pledge in chunk:
+            row = pledge_row(pledge)
+            yield [row[column] for column in columns]
+
+
+class _Echo:
+    """A file-like object that returns what is written to it instead of storing it."""
+
+    def write(self, value):
+        return value
 
-    for pledge in pledges:
-        user_data = {
-            "username": pledge.user.username,
-            "action": pledge.action.action,
-            "co2_saving": pledge.co2_saving if pledge.co2_saving else 0,
-            "water_saving": pledge.water_saving if pledge.water_saving else 0,
-            "waste_saving": pledge.waste_saving if pledge.waste_saving else 0,
-        }
-        user_pledges.append(user_data)
 
-    return render(request, "search_results.html", context={"pledges": user_pledges})
+def _spool_csv(pledges):
+    """Write pledges as CSV to a temporary file that only stays in memory while it is small."""
+    csv_file = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_SIZE)
+    text = io.TextIOWrapper(csv_file, encoding="utf-8", newline="")
+    csv.writer(text).writerows(_csv_rows(pledges))
+    text.flush()
+    text.detach()
+    csv_file.seek(0)
+    return csv_file
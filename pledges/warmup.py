@@ -0,0 +1,153 @@
+"""Warmup of a worker before it receives traffic.
+
+The first requests to a new worker pay for populating the URL resolver, compiling the
+templates, filling the ``ContentType`` cache and parsing the formulas of the actions. With
+``PLEDGES_WARMUP`` enabled, ``do_nation/wsgi.py`` and ``do_nation/asgi.py`` do that work
+with ``warmup_on_load`` when the application is loaded, and ``readiness_view`` only reports
+the worker as ready once it is done, so a load balancer checking it only sends traffic to
+warm workers.
+
+The time every step took is logged to the ``pledges.warmup`` logger.
+"""
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.http import JsonResponse
+from django.template.loader import get_template
+from django.urls import resolve, reverse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+from .formulas import FORMULA_FIELDS, get_compiled_formula
+from .models import Action
+
+logger = logging.getLogger("pledges.warmup")
+
+TEMPLATES = ["base.html", "home_page.html", "search_results.html", "leaderboard.html"]
+
+_ready = threading.Event()
+_lock = threading.Lock()
+_durations = {}
+
+
+def _urls():
+    """Populate the URL resolver and resolve the home page."""
+    reverse("home_page")
+    resolve("/")
+
+
+def _templates():
+    """Compile the templates of the pages, which the cached template loader keeps."""
+    for name in TEMPLATES:
+        get_template(name)
+
+
+def _database():
+    """Connect to the databases and fill the ``ContentType`` cache."""
+    for connection in connections.all():
+        connection.ensure_connection()
+    ContentType.objects.get_for_models(*apps.get_models())
+
+
+def _formulas():
+    """Compile the formulas of every action."""
+    for action in Action.objects.all():
+        for field in FORMULA_FIELDS:
+            get_compiled_formula(action, field)
+
+
+STEPS = [
+    ("urls", _urls),
+    ("templates", _templates),
+    ("database", _database),
+    ("formulas", _formulas),
+]
+
+
+def warmup():
+    """Do the work the first requests to a worker would otherwise do, then mark it ready.
+
+    A worker that is already ready is not warmed up again. A failed step is logged and leaves
+    the worker not ready, so the warmup is tried again by the next readiness check.
+
+    :return: Whether the worker is ready.
+    :rtype: bool.
+    """
+    with _lock:
+        if _ready.is_set():
+            return True
+        begin = time.perf_counter()
+        durations = {}
+        for name, step in STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.exception("Warmup failed at %s.", name)
+                return False
+            durations[name] = round((time.perf_counter() - start) * 1000, 2)
+        durations["total"] = round((time.perf_counter() - begin) * 1000, 2)
+
+        _durations.clear()
+        _durations.update(durations)
+        _ready.set()
+    steps = ", ".join(f"{name} {durations[name]}ms" for name, _ in STEPS)
+    logger.info("Warmup took %sms (%s).", durations["total"], steps)
+    return True
+
+
+def warmup_on_load():
+    """Warm up the worker while the application is loaded.
+
+    The warmup runs in a thread of its own, because an ASGI server imports the application
+    inside its event loop, where Django refuses to query the database. The connections the
+    warmup opened are closed once it is done, so a server loading the application before
+    forking its workers does not share them between the workers.
+
+    :return: Whether the worker is ready.
+    :rtype: bool.
+    """
+    result = []
+
+    def run():
+        try:
+            result.append(warmup())
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name="pledges-warmup")
+    thread.start()
+    thread.join()
+    return bool(result and result[0])
+
+
+def is_ready():
+    """Return whether the worker is ready to receive traffic.
+
+    :return: ``True`` once the worker is warmed up, or always if ``PLEDGES_WARMUP`` is off.
+    :rtype: bool.
+    """
+    return _ready.is_set() or not getattr(settings, "PLEDGES_WARMUP", False)
+
+
+@require_safe
+@never_cache
+def readiness_view(request):
+    """Report whether the worker is ready, for load balancer health checks.
+
+    A worker whose warmup failed tries it again before answering.
+
+    :param request: The ``GET`` request object.
+    :ptype request: class:`django.core.handlers.wsgi.WSGIRequest`.
+
+    :return: ``200`` with the warmup durations when ready, ``503`` otherwise.
+    :rtype: class:`django.http.response.JsonResponse`.
+    """
+    if is_ready() or warmup():
+        return JsonResponse({"ready": True, "warmup_ms": dict(_durations)})
+    return JsonResponse({"ready": False}, status=503)